@@ -0,0 +1,69 @@
+"""Cold-start and per-miss cost of the response cache as it grows.
+
+Usage: python -m benchmarks.bench_cache [--sizes 1000 10000 50000]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+
+def run_cache(entries: int) -> dict:
+    """Fill a fresh cache with `entries` responses and time reads and writes at that size."""
+    from scripts import cache_utils
+    from scripts.constants import CACHE_DIR
+
+    content = {"object": "card", "name": "Bench Card", "type_line": "Creature — Test", "oracle_text": "x" * 600}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            for i in range(entries):
+                cache_utils.put_in_cache(f"https://api.scryfall.com/cards/tst/{i}", None, 200, content)
+
+            # A new thread-local connection stands in for a fresh process opening the cache
+            cache_utils.__local__.connections = {}
+            start = time.perf_counter()
+            cache_utils.get_cached("https://api.scryfall.com/cards/tst/0")
+            cold_start = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for i in range(100):
+                cache_utils.put_in_cache(f"https://api.scryfall.com/cards/new/{i}", None, 200, content)
+            write = (time.perf_counter() - start) / 100
+
+            start = time.perf_counter()
+            for i in range(0, entries, max(1, entries // 100)):
+                cache_utils.get_cached(f"https://api.scryfall.com/cards/tst/{i}")
+            read = (time.perf_counter() - start) / min(entries, 100)
+        finally:
+            cache_utils.__local__.connections = {}
+            os.chdir(cwd)
+
+    return {
+        "entries": entries,
+        "cold_start_ms": round(cold_start * 1000, 3),
+        "write_ms": round(write * 1000, 3),
+        "read_ms": round(read * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the response cache store.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000], help="Cache sizes to measure.")
+    args = parser.parse_args()
+
+    results = []
+    for entries in args.sizes:
+        result = run_cache(entries)
+        results.append(result)
+        print(f"entries={entries:6d} cold_start={result['cold_start_ms']:.2f}ms write={result['write_ms']:.3f}ms read={result['read_ms']:.3f}ms")
+
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Wall time of fetch_cards versus deck size against a local fake Scryfall server.
+
+With --tokens N, half of the cards create one of N tokens and the deck is
+resolved with its tokens, so the request count shows tokens being looked up
+once each rather than once per card creating them.
+
+Usage: python -m benchmarks.bench_fetch_cards [--sizes 10 25 50 100] [--latency 0.15] [--tokens 3]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.fake_scryfall import FakeScryfallServer
+
+
+def run_fetch(deck_size: int, workers: int, rate: float, find_tokens: bool = False) -> dict:
+    """Resolve a synthetic deck in a fresh working directory and return its timings."""
+    from scripts import http_utils
+    from scripts.cards_api import fetch_cards
+    from scripts.card_class import Card
+    from scripts.constants import CACHE_DIR
+    from scripts.tokenbucket_class import TokenBucket
+
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            os.makedirs("custom_cards", exist_ok=True)
+            http_utils.__rate_limiter__ = TokenBucket(rate, 1)
+
+            cards = [Card(name=f"Bench Card {i}") for i in range(deck_size)]
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                fetch_cards(cards, find_tokens, workers=workers)
+            elapsed = time.perf_counter() - start
+            tokens = cards[deck_size:]
+        finally:
+            os.chdir(cwd)
+
+    return {"deck_size": deck_size, "workers": workers, "seconds": round(elapsed, 3),
+            "tokens": len(tokens), "token_copies": sum(token.quantity for token in tokens)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fetch_cards against a fake Scryfall server.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 25, 50, 100], help="Deck sizes to resolve.")
+    parser.add_argument("--latency", type=float, default=0.15, help="Simulated server latency in seconds.")
+    parser.add_argument("--rate", type=float, default=10, help="Requests per second allowed by the rate limiter.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8], help="Worker counts to compare.")
+    parser.add_argument("--tokens", type=int, default=0, help="Distinct tokens created by the deck's cards; also resolves tokens.")
+    args = parser.parse_args()
+
+    server = FakeScryfallServer(latency=args.latency, tokens=args.tokens).start()
+    os.environ["SCRYFALL_API_URL"] = server.base_url
+
+    results = []
+    try:
+        for deck_size in args.sizes:
+            for workers in args.workers:
+                server.request_count = 0
+                result = run_fetch(deck_size, workers, args.rate, args.tokens > 0)
+                result["requests"] = server.request_count
+                results.append(result)
+                print(f"cards={deck_size:4d} workers={workers:2d} requests={result['requests']:4d} wall={result['seconds']:.2f}s "
+                      f"tokens={result['tokens']} ({result['token_copies']} copies)")
+    finally:
+        server.stop()
+
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Startup cost of the CLI entry point and its modules, measured with `python -X importtime`.
+
+Each module is imported in a fresh interpreter. The cumulative import time is
+the best of --repeat runs. The benchmark fails (exit status 1) when an entry
+point loads a heavy backend it should leave to a later stage, when it exceeds
+--max-ms or when it fails to import, so it can guard against import-time
+regressions. Other modules that fail to import, e.g. for a missing optional
+dependency, are reported as failed without failing the benchmark.
+
+Usage: python -m benchmarks.bench_import [--modules start scripts.cards_api] [--repeat 3] [--max-ms 500]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Only the stages that upscale, score or render images may load these
+HEAVY_BACKENDS = ("torch", "basicsr", "realesrgan", "cv2", "reportlab", "colorthief", "skimage")
+ENTRY_POINTS = ("start", "scripts.cards_api")
+
+
+def import_times(module: str, workdir: str) -> dict:
+    """Cumulative import time in microseconds of every top-level package loaded by importing module.
+
+    Raises subprocess.CalledProcessError when the module fails to import.
+    """
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [repo_root, os.environ.get("PYTHONPATH")])))
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=workdir, env=env, check=True, capture_output=True, text=True).stderr
+
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = times.get(name.strip(), 0) + int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark module import time.")
+    parser.add_argument("--modules", nargs="+", default=["start", "scripts.cards_api", "scripts.image_utils",
+                                                         "scripts.pdf_utils", "scripts.upscale_utils"], help="Modules to import.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per module; the fastest is reported.")
+    parser.add_argument("--max-ms", type=float, default=500, help="Import time budget of the entry points.")
+    parser.add_argument("--top", type=int, default=5, help="Slowest packages listed per module.")
+    args = parser.parse_args()
+
+    results, failures = [], []
+    # start.py creates its output folders on import, so it runs in a scratch directory
+    with tempfile.TemporaryDirectory() as workdir:
+        for module in args.modules:
+            try:
+                runs = [import_times(module, workdir) for _ in range(args.repeat)]
+            except subprocess.CalledProcessError as e:
+                error = (e.stderr.strip().splitlines() or [f"exit status {e.returncode}"])[-1]
+                results.append({"module": module, "error": error})
+                print(f"{module:>24}: failed to import: {error}")
+                if module in ENTRY_POINTS:
+                    failures.append(f"{module} fails to import: {error}")
+                continue
+            times = min(runs, key=lambda run: run.get(module, 0))
+            total_ms = times.get(module, 0) / 1000
+            heavy = sorted(name for name in times if name.split(".")[0] in HEAVY_BACKENDS and "." not in name)
+            slowest = sorted(((name, us / 1000) for name, us in times.items() if name != module and "." not in name),
+                             key=lambda item: item[1], reverse=True)[:args.top]
+
+            results.append({"module": module, "import_ms": round(total_ms, 1), "heavy_backends": heavy,
+                            "slowest": [[name, round(ms, 1)] for name, ms in slowest]})
+            print(f"{module:>24}: {total_ms:8.1f} ms  heavy: {', '.join(heavy) or '-'}  "
+                  f"slowest: {', '.join(f'{name} {ms:.0f}ms' for name, ms in slowest)}")
+
+            if module in ENTRY_POINTS:
+                if heavy:
+                    failures.append(f"{module} imports {', '.join(heavy)}")
+                if total_ms > args.max_ms:
+                    failures.append(f"{module} takes {total_ms:.0f} ms to import (budget {args.max_ms:.0f} ms)")
+
+    print(json.dumps(results, indent=4))
+    for failure in failures:
+        print(f"$ERROR: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Peak memory of compositing a PNG page on a full canvas versus in strips under a memory cap.
+
+Each mode renders the same page, built from synthetic upscaled cards on disk, in
+its own process. It reports how much the process's peak RSS grew while
+rendering. The benchmark fails (exit status 1) when strip rendering grows peak
+RSS beyond --cap-mb, or when the two modes do not produce the same pixels.
+
+Usage: python -m benchmarks.bench_page_memory [--page-size A3] [--cap-mb 160]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def __proc_status_mb__(field: str) -> float:
+    with open("/proc/self/status", "r") as f:
+        for line in f:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) / 1024
+    raise OSError(f"{field} missing from /proc/self/status")
+
+
+def reset_peak_rss() -> float:
+    """Reset the peak RSS to the current RSS where Linux allows it and return the current RSS in MB.
+
+    Without that, the peak left by importing torch, OpenCV and the like would hide the render's own peak.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return __proc_status_mb__("VmRSS")
+    except OSError:
+        # ru_maxrss is in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def peak_rss_mb() -> float:
+    try:
+        return __proc_status_mb__("VmHWM")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(config: dict) -> dict:
+    """Render one page in this process and return the growth of its peak RSS."""
+    import contextlib
+    import io
+    from scripts.pagesizeenum_class import PageSizeEnum
+    from scripts.render_utils import compute_page_layout, render_pages
+    from start import __tile_key__, load_card_tile
+    # Loaded lazily by the first tile otherwise, and importing OpenCV is not part of rendering
+    import scripts.image_utils
+
+    layout = compute_page_layout(PageSizeEnum[config["page_size"]])
+    keys = [__tile_key__(path) for path in config["cards"]][:layout.cards_per_page]
+    max_memory = int(config["cap_mb"] * 1024 * 1024) if config["strips"] else None
+
+    before = reset_peak_rss()
+    started_at = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        render_pages([keys], load_card_tile, layout, [config["output"]], 1, max_memory)
+    return {"mode": "strips" if config["strips"] else "full canvas", "seconds": round(time.perf_counter() - started_at, 2),
+            "peak_rss_growth_mb": round(peak_rss_mb() - before, 1), "page_bytes": os.path.getsize(config["output"]),
+            "canvas_mb": round(layout.page_width * layout.page_height * 3 / 1024 ** 2, 1)}
+
+
+def synthetic_cards(workdir: str, count: int) -> list:
+    """Upscaled-size cards with gradient art and light noise, so pages compress like real ones."""
+    from PIL import Image
+    from scripts.constants import CARD_HEIGHT, CARD_WIDTH
+
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:CARD_HEIGHT, 0:CARD_WIDTH]
+    paths = []
+    for i in range(count):
+        pixels = np.stack([(x * 255 // CARD_WIDTH + i * 40) % 256, y * 255 // CARD_HEIGHT, (x + y) % 256], axis=-1).astype(np.uint8)
+        pixels += rng.integers(0, 12, pixels.shape, dtype=np.uint8)
+        pixels[:40], pixels[-40:], pixels[:, :40], pixels[:, -40:] = 20, 20, 20, 20
+        paths.append(os.path.join(workdir, f"card{i}.png"))
+        Image.fromarray(pixels).save(paths[-1], compress_level=1)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the peak memory of page compositing.")
+    parser.add_argument("--page-size", choices=["A4", "A3"], default="A3", help="Page size to render.")
+    parser.add_argument("--cap-mb", type=float, default=160, help="Memory cap of strip rendering, checked against peak RSS growth.")
+    parser.add_argument("--unique-cards", type=int, default=6, help="Distinct cards on the page.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_mode(json.loads(args.child))))
+        return
+
+    from PIL import Image
+
+    results, failures = [], []
+    with tempfile.TemporaryDirectory() as workdir:
+        cards = synthetic_cards(workdir, args.unique_cards)
+        cards = [cards[i % len(cards)] for i in range(18)]
+        outputs = []
+        for strips in (False, True):
+            output = os.path.join(workdir, f"page_{int(strips)}.png")
+            config = {"page_size": args.page_size, "cap_mb": args.cap_mb, "strips": strips, "cards": cards, "output": output}
+            # Fresh processes, so the second mode's peak is not hidden under the first one's
+            stdout = subprocess.run([sys.executable, "-m", "benchmarks.bench_page_memory", "--child", json.dumps(config)],
+                                    cwd=workdir, check=True, capture_output=True, text=True,
+                                    env=dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [
+                                        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), os.environ.get("PYTHONPATH")])))).stdout
+            result = json.loads(stdout.strip().splitlines()[-1])
+            results.append(result)
+            outputs.append(output)
+            print(f"{result['mode']:>12}: peak RSS +{result['peak_rss_growth_mb']:7.1f} MB "
+                  f"(canvas {result['canvas_mb']:.0f} MB)  {result['seconds']:6.2f}s  {result['page_bytes'] / 1024 ** 2:6.1f} MB PNG")
+
+        if results[1]["peak_rss_growth_mb"] > args.cap_mb:
+            failures.append(f"strip rendering grew peak RSS by {results[1]['peak_rss_growth_mb']:.0f} MB, over the {args.cap_mb:.0f} MB cap")
+        with Image.open(outputs[0]) as full, Image.open(outputs[1]) as strips:
+            if not np.array_equal(np.asarray(full), np.asarray(strips)):
+                failures.append("strip rendering changed the page's pixels")
+
+    print(json.dumps(results, indent=4))
+    for failure in failures:
+        print(f"$ERROR: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
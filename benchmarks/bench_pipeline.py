@@ -0,0 +1,215 @@
+"""End-to-end wall time of every stage, offline, from a 60-card deck up to a 540-card cube.
+
+A local fake Scryfall server answers the card lookups and serves a distinct
+synthetic PNG per card. Each deck size runs in its own process and working
+directory, starting from empty caches; with --warm the same build runs a
+second time to measure the cached path. The stages are fetch_cards,
+download_images, score_cards, upscale_image (CPU, a tiny random RRDBNet),
+generate_collages straight to PDF, generate_collages through PNG pages, and
+convert_images_to_pdf over those pages. The size of the PDF each way is
+recorded too.
+
+Results go to --output as JSON with the commit they were measured on, and
+--compare prints the change per stage against an earlier result file, exiting
+with status 1 when a stage got slower than --tolerance.
+
+Usage: python -m benchmarks.bench_pipeline [--sizes 60 180 540] [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.fake_scryfall import FakeScryfallServer
+
+STAGES = ("fetch_cards", "download_images", "score_cards", "upscale_image", "generate_collages",
+          "generate_collages_png", "convert_images_to_pdf")
+
+
+def __git_commit__() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def __upscaler__(scale: int):
+    """A tiny random RRDBNet on the CPU, or None when torch or basicsr are not installed."""
+    try:
+        from benchmarks.bench_upscale import tiny_model
+        from scripts.upscale_utils import Upscaler
+        return Upscaler(model=tiny_model(scale), device="cpu", tile=0)
+    except ImportError as e:
+        print(f"!WARNING: Upscaling model unavailable, cards are resized instead: {e}", file=sys.stderr)
+        return None
+
+
+def run_build(config: dict) -> dict:
+    """Build one synthetic deck stage by stage in the current directory and return per-stage timings."""
+    from scripts import http_utils
+    from scripts.card_class import Card
+    from scripts.cards_api import download_images, fetch_cards
+    from scripts.constants import CACHE_DIR, OUTPUT_DIR, SCALE
+    from scripts.image_utils import upscale_image
+    from scripts.metrics_utils import reset_metrics
+    from scripts.pagesizeenum_class import PageSizeEnum
+    from scripts.pdf_utils import convert_images_to_pdf
+    from scripts.score_img import score_cards
+    from scripts.tokenbucket_class import TokenBucket
+    from scripts.upscalepolicy_class import RESIZE, UpscalePolicy
+    from start import generate_collages
+
+    class ResizeOnly(UpscalePolicy):
+        def choose(self, width, height, score, image_quality="unknown"):
+            return RESIZE
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    os.makedirs("custom_cards", exist_ok=True)
+    http_utils.__rate_limiter__ = TokenBucket(config["rate"], config["rate"])
+    page_size = PageSizeEnum[config["page_size"]]
+    upscaler = __upscaler__(SCALE) if config["model"] else None
+    policy = UpscalePolicy("always") if upscaler else ResizeOnly()
+
+    results = []
+    for run in (["cold", "warm"] if config["warm"] else ["cold"]):
+        metrics = reset_metrics()
+        timings = {}
+        cards = [Card(name=f"Bench Card {i}") for i in range(config["cards"])]
+        deck_name = "bench"
+        output_dir = os.path.join(OUTPUT_DIR, deck_name)
+        os.makedirs(output_dir, exist_ok=True)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            with metrics.stage("fetch_cards", timings):
+                fetch_cards(cards)
+            with metrics.stage("download_images", timings):
+                download_images(cards)
+            with metrics.stage("score_cards", timings):
+                score_cards(cards)
+            with metrics.stage("upscale_image", timings):
+                upscale_image(cards, device="cpu", batch_size=config["upscale_batch"], workers=1, tile=0,
+                              upscaler=upscaler, policy=policy)
+            with metrics.stage("generate_collages", timings):
+                generate_collages(cards, page_size, deck_name, config["jobs"], False, output_dir=output_dir)
+            with metrics.stage("generate_collages_png", timings):
+                generate_collages(cards, page_size, f"{deck_name}_png", config["jobs"], True, output_dir=output_dir)
+            png_files = sorted((f for f in os.listdir(output_dir) if f.startswith(f"{deck_name}_png") and f.endswith(".png")),
+                               key=lambda f: int(f[len(f"{deck_name}_png"):-len(".png")]))
+            with metrics.stage("convert_images_to_pdf", timings):
+                convert_images_to_pdf([os.path.join(output_dir, f) for f in png_files],
+                                      os.path.join(output_dir, f"{deck_name}_converted.pdf"), page_size)
+
+        snapshot = metrics.snapshot()
+        results.append({
+            "run": run,
+            "cards": config["cards"],
+            "pages": len(png_files),
+            "model": upscaler.identity.split(":")[0] if upscaler else None,
+            "seconds": {stage: round(timings.get(stage, 0.0), 3) for stage in STAGES},
+            "cpu_seconds": {stage: snapshot["timings"].get(f"stage.{stage}", {}).get("cpu_seconds", 0.0) for stage in STAGES},
+            "total_seconds": round(sum(timings.values()), 3),
+            "pdf_mb": {"direct": round(os.path.getsize(os.path.join(output_dir, f"{deck_name}_{page_size}.pdf")) / 1e6, 2),
+                       "converted": round(os.path.getsize(os.path.join(output_dir, f"{deck_name}_converted.pdf")) / 1e6, 2)},
+            "counters": snapshot["counters"],
+            "peak_rss_mb": snapshot["peak_rss_mb"],
+            "peak_children_rss_mb": snapshot["peak_children_rss_mb"],
+        })
+    return results
+
+
+def compare(results: list, baseline_file: str, tolerance: float) -> list:
+    """Print the change of every stage against a baseline result file and return the regressions."""
+    with open(baseline_file, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {(result["run"], result["cards"]): result for result in baseline["results"]}
+
+    print(f"Compared with {baseline['commit']} ({baseline['timestamp']}):")
+    regressions = []
+    for result in results:
+        before = previous.get((result["run"], result["cards"]))
+        if not before:
+            continue
+        for stage in STAGES + ("total",):
+            old = before["total_seconds"] if stage == "total" else before["seconds"].get(stage, 0.0)
+            new = result["total_seconds"] if stage == "total" else result["seconds"][stage]
+            change = (new - old) / old if old > 0.05 else 0.0
+            flag = "  SLOWER" if change > tolerance else ""
+            print(f"  {result['run']:>4} cards={result['cards']:4d} {stage:>22}: {old:8.2f}s -> {new:8.2f}s ({change:+.0%}){flag}")
+            if flag:
+                regressions.append(f"{stage} at {result['cards']} cards ({result['run']}) is {change:.0%} slower")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage end to end against a fake Scryfall server.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[60, 180, 540], help="Deck sizes, in unique cards.")
+    parser.add_argument("--page-size", choices=["A4", "A3"], default="A4", help="Page size of the collages.")
+    parser.add_argument("--image-size", type=int, nargs=2, default=[372, 520], metavar=("WIDTH", "HEIGHT"),
+                        help="Size of the served card images; the model upscales them.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated server latency in seconds.")
+    parser.add_argument("--rate", type=float, default=100, help="Requests per second allowed by the rate limiter.")
+    parser.add_argument("--jobs", type=int, default=2, help="Processes used to render PNG pages.")
+    parser.add_argument("--upscale-batch", type=int, default=4, help="Same-sized cards per forward pass.")
+    parser.add_argument("--no-model", dest="model", action="store_false", help="Resize cards instead of running the tiny model.")
+    parser.add_argument("--warm", action="store_true", help="Build every deck a second time on warm caches.")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", metavar="BASELINE_JSON", help="Results of an earlier run to compare with.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Slowdown of a stage reported as a regression (default: 20%%).")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_build(json.loads(args.child))))
+        return
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    server = FakeScryfallServer(latency=args.latency, image_size=tuple(args.image_size),
+                                image_variants=max(args.sizes)).start()
+    results = []
+    try:
+        for cards in args.sizes:
+            config = {"cards": cards, "page_size": args.page_size, "rate": args.rate, "jobs": args.jobs,
+                      "upscale_batch": args.upscale_batch, "model": args.model, "warm": args.warm}
+            # Every size starts from empty caches in its own directory; start.py writes relative to it
+            with tempfile.TemporaryDirectory() as workdir:
+                env = dict(os.environ, SCRYFALL_API_URL=server.base_url,
+                           PYTHONPATH=os.pathsep.join(filter(None, [repo_root, os.environ.get("PYTHONPATH")])))
+                output = subprocess.run([sys.executable, "-m", "benchmarks.bench_pipeline", "--child", json.dumps(config)],
+                                        cwd=workdir, env=env, check=True, stdout=subprocess.PIPE, text=True).stdout
+            for result in json.loads(output.strip().splitlines()[-1]):
+                results.append(result)
+                print(f"{result['run']:>4} cards={cards:4d} pages={result['pages']:3d} total={result['total_seconds']:7.2f}s  "
+                      + "  ".join(f"{stage}={seconds:.2f}" for stage, seconds in result["seconds"].items())
+                      + f"  pdf={result['pdf_mb']['direct']:.1f}MB converted={result['pdf_mb']['converted']:.1f}MB")
+    finally:
+        server.stop()
+
+    report = {
+        "commit": __git_commit__(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("child", "output", "compare")},
+        "results": results,
+    }
+    print(json.dumps(report, indent=4))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    regressions = compare(results, args.compare, args.tolerance) if args.compare else []
+    for regression in regressions:
+        print(f"$ERROR: {regression}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Per-card latency of the fused NumPy preprocessing against the PIL functions it replaces.
+
+Two stages are timed: the fixes applied before upscaling (alpha flatten and
+border repaint) and the tile preparation before layout (bleed and resize).
+Decoding the PNG costs the same either way, so it is also timed on its own and
+subtracted to show the processing cost of each path.
+
+Usage: python -m benchmarks.bench_preprocess [--cards 20] [--size 745 1040] [--upscaled-size 1490 2080]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+
+def synthetic_card(path: str, width: int, height: int, seed: int, alpha: bool):
+    """A gradient card with light noise, a dark frame and, optionally, transparent rounded-corner pixels."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.zeros((height, width, 4 if alpha else 3), dtype=np.uint8)
+    pixels[:, :, 0] = x * 255 // width
+    pixels[:, :, 1] = y * 255 // height
+    pixels[:, :, 2] = (x + y) % 256
+    pixels[:, :, :3] += rng.integers(0, 8, (height, width, 3), dtype=np.uint8)
+    pixels[:30, :, :3] = pixels[-30:, :, :3] = pixels[:, :30, :3] = pixels[:, -30:, :3] = 20
+    if alpha:
+        pixels[:, :, 3] = 255
+        pixels[:12, :12, 3] = pixels[:12, -12:, 3] = pixels[-12:, :12, 3] = pixels[-12:, -12:, 3] = 0
+    Image.fromarray(pixels).save(path)
+
+
+def time_per_card(paths, function) -> tuple:
+    start = time.perf_counter()
+    results = [function(path) for path in paths]
+    elapsed = (time.perf_counter() - start) / len(paths)
+    return elapsed, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark card preprocessing.")
+    parser.add_argument("--cards", type=int, default=20, help="Synthetic cards per stage.")
+    parser.add_argument("--size", type=int, nargs=2, default=[745, 1040], metavar=("WIDTH", "HEIGHT"), help="Downloaded card size.")
+    parser.add_argument("--upscaled-size", type=int, nargs=2, default=[1490, 2080], metavar=("WIDTH", "HEIGHT"), help="Upscaled card size.")
+    args = parser.parse_args()
+
+    from scripts.constants import BLEED, CARD_HEIGHT, CARD_WIDTH
+    from scripts.image_utils import (PREPROCESSING, bleed_card_borders, fix_card_borders, get_rgb_image,
+                                     prepare_card_array)
+
+    border_width = PREPROCESSING["border_width"]
+    tile_size = (CARD_WIDTH + BLEED * 2, CARD_HEIGHT + BLEED * 2)
+
+    def pil_fixes(path):
+        return np.asarray(fix_card_borders(get_rgb_image(path), border_width))
+
+    def pil_tile(path):
+        with Image.open(path) as img:
+            img.load()
+            return np.asarray(bleed_card_borders(img, BLEED).resize(tile_size, Image.DEFAULT_STRATEGY))
+
+    stages = {
+        "fixes": (args.size, True, pil_fixes, lambda path: prepare_card_array(path, border_width=border_width)),
+        "tile": (args.upscaled_size, False, pil_tile, lambda path: prepare_card_array(path, bleed=BLEED, size=tile_size)),
+    }
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for stage, ((width, height), alpha, pil_function, fused_function) in stages.items():
+            paths = [os.path.join(workdir, f"{stage}{i}.png") for i in range(args.cards)]
+            for i, path in enumerate(paths):
+                synthetic_card(path, width, height, i, alpha)
+
+            decode_seconds, _ = time_per_card(paths, lambda path: Image.open(path).load())
+            pil_seconds, pil_results = time_per_card(paths, pil_function)
+            fused_seconds, fused_results = time_per_card(paths, fused_function)
+            # Resizing differs on purpose (area averaging instead of nearest), so only the fixes are compared exactly
+            max_diff = max(int(np.abs(a.astype(np.int16) - b).max()) for a, b in zip(pil_results, fused_results))
+
+            results.append({"stage": stage, "size": [width, height], "cards": args.cards,
+                            "decode_ms": round(decode_seconds * 1000, 2),
+                            "pil_ms": round(pil_seconds * 1000, 2), "fused_ms": round(fused_seconds * 1000, 2),
+                            "speedup": round(pil_seconds / fused_seconds, 2),
+                            "pil_processing_ms": round((pil_seconds - decode_seconds) * 1000, 2),
+                            "fused_processing_ms": round((fused_seconds - decode_seconds) * 1000, 2),
+                            "max_pixel_diff": max_diff})
+            print(f"{stage:>5} {width}x{height}: decode {decode_seconds * 1000:6.2f} ms, "
+                  f"PIL {pil_seconds * 1000:7.2f} ms/card, fused {fused_seconds * 1000:7.2f} ms/card "
+                  f"({pil_seconds / fused_seconds:.1f}x), max diff {max_diff}")
+
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
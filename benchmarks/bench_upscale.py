@@ -0,0 +1,102 @@
+"""Cards per minute and peak RSS of the Real-ESRGAN engine for each CPU configuration.
+
+Every configuration runs in its own process so peak RSS is not shared between them.
+Without --weights a tiny randomly initialised RRDBNet is used, which keeps the
+benchmark fast while still exercising batching, tiling and the process pool.
+
+Usage: python -m benchmarks.bench_upscale [--cards 8] [--batch-sizes 1 4] [--workers 1 2] [--tiles auto 0]
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def tiny_model(scale: int):
+    from basicsr.archs.rrdbnet_arch import RRDBNet
+    return RRDBNet(num_in_ch=3, num_out_ch=3, num_feat=16, num_block=1, num_grow_ch=8, scale=scale)
+
+
+def run_config(config: dict) -> dict:
+    """Upscale synthetic cards with one configuration and measure throughput and memory."""
+    import numpy as np
+    from PIL import Image
+    from scripts.constants import SCALE
+    from scripts.upscale_utils import Upscaler, batch_by_size, run_batches, run_batches_in_pool
+
+    rng = np.random.default_rng(0)
+    width, height = config["size"]
+    tile = None if config["tile"] == "auto" else int(config["tile"])
+    model = None if config["weights"] else tiny_model(SCALE)
+    upscaler_kwargs = {"device": "cpu", "tile": tile, "model": model}
+    if config["weights"]:
+        upscaler_kwargs["model_path"] = config["weights"]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Sources are files, as in the pipeline, so decoding each batch is part of the measurement
+        jobs = []
+        for i in range(config["cards"]):
+            source = os.path.join(workdir, f"source_{i}.png")
+            Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8)).save(source, compress_level=1)
+            jobs.append((source, os.path.join(workdir, f"{i}.png"), (width, height)))
+        batches = batch_by_size(jobs, config["batch_size"])
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            started_at = time.perf_counter()
+            if config["workers"] > 1:
+                run_batches_in_pool(batches, config["workers"], **upscaler_kwargs)
+            else:
+                run_batches(Upscaler(**upscaler_kwargs), batches)
+            elapsed = time.perf_counter() - started_at
+
+    # ru_maxrss is in KiB on Linux; pool workers are reported as children
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {
+        **{k: config[k] for k in ("batch_size", "workers", "tile")},
+        "cards": config["cards"],
+        "seconds": round(elapsed, 2),
+        "cards_per_minute": round(config["cards"] / elapsed * 60, 1),
+        "peak_rss_mb": round(self_rss / 1024, 1),
+        "peak_worker_rss_mb": round(children_rss / 1024, 1) if config["workers"] > 1 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CPU upscaling configurations.")
+    parser.add_argument("--cards", type=int, default=8, help="Synthetic cards per configuration.")
+    parser.add_argument("--size", type=int, nargs=2, default=[745, 1040], metavar=("WIDTH", "HEIGHT"), help="Source card size.")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4], help="Images per forward pass.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2], help="Process pool sizes.")
+    parser.add_argument("--tiles", nargs="+", default=["auto", "0"], help="Tile sizes; 'auto' sizes tiles to free RAM, 0 disables tiling.")
+    parser.add_argument("--weights", help="Real-ESRGAN weights; defaults to a tiny random model.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_config(json.loads(args.child))))
+        return
+
+    results = []
+    for batch_size, workers, tile in itertools.product(args.batch_sizes, args.workers, args.tiles):
+        config = {"cards": args.cards, "size": args.size, "batch_size": batch_size, "workers": workers,
+                  "tile": tile, "weights": args.weights}
+        output = subprocess.run([sys.executable, "-m", "benchmarks.bench_upscale", "--child", json.dumps(config)],
+                                check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        results.append(result)
+        print(f"batch={batch_size} workers={workers} tile={tile:>4}: {result['cards_per_minute']:7.1f} cards/min, "
+              f"peak RSS {result['peak_rss_mb']:.0f} MB (workers {result['peak_worker_rss_mb']:.0f} MB)")
+
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
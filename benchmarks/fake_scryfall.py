@@ -0,0 +1,232 @@
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+
+
+def synthetic_card_png(width: int, height: int, seed: int = 0) -> bytes:
+    """Return a PNG that looks enough like a card scan: black border, noisy art box."""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    pixels = np.full((height, width, 3), 20, dtype=np.uint8)
+    margin = width // 20
+    pixels[margin:height - margin, margin:width - margin] = rng.integers(
+        0, 256, (height - 2 * margin, width - 2 * margin, 3), dtype=np.uint8)
+
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def gradient_card_png(width: int, height: int, seed: int = 0) -> bytes:
+    """Return a cheap-to-encode PNG card: dark border, gradient art tinted and stamped by seed so every seed is unique."""
+    import numpy as np
+    from PIL import Image
+
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+    pixels[:, :, 0] = (x * 255 // width + seed * 37) % 256
+    pixels[:, :, 1] = (y * 255 // height + seed * 59) % 256
+    pixels[:, :, 2] = (x + y + seed * 83) % 256
+    margin = width // 20
+    pixels[:margin], pixels[-margin:], pixels[:, :margin], pixels[:, -margin:] = 20, 20, 20, 20
+    # The seed's bits as a row of squares, so equal tints still hash differently
+    for bit in range(24):
+        pixels[margin // 4:margin * 3 // 4, margin + bit * 8:margin + bit * 8 + 6] = 255 if seed >> bit & 1 else 60
+
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+def card_id(name: str) -> str:
+    """A stable, uuid-shaped Scryfall id for a card name."""
+    digest = hashlib.md5(f"id:{name.lower()}".encode("utf-8")).hexdigest()
+    return f"{digest[:8]}-{digest[8:12]}-{digest[12:16]}-{digest[16:20]}-{digest[20:32]}"
+
+
+class FakeScryfallHandler(BaseHTTPRequestHandler):
+    """Serves canned Scryfall responses with a configurable per-request latency."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def __send_json__(self, status: int, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def __send_image__(self):
+        body = self.server.image_for(self.path)
+        start = 0
+        match = re.match(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        if match:
+            start = int(match.group(1))
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        else:
+            self.send_response(200)
+
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body) - start))
+        self.end_headers()
+        self.wfile.write(body[start:])
+
+    def __card__(self, name: str, lang: str = "en"):
+        number = str(int(hashlib.md5(name.lower().encode("utf-8")).hexdigest()[:6], 16) % 100000 + 1)
+        with self.server.lock:
+            self.server.names_by_number.setdefault(number, name)
+        card = {
+            "object": "card",
+            "id": card_id(name),
+            "name": name,
+            "lang": lang,
+            "set": "tst",
+            "collector_number": number,
+            "type_line": "Creature — Test",
+            "image_status": "highres_scan",
+            "image_uris": {"png": f"{self.server.base_url}/images/tst/{number}/{lang}.png"},
+        }
+        if lang != "en":
+            card["printed_name"] = f"{name} ({lang})"
+        # With tokens, every other card creates one of them, so many cards share each token
+        if self.server.token_names and name not in self.server.token_names.values() and int(number) % 2 == 0:
+            token_id = list(self.server.token_names)[int(number) % len(self.server.token_names)]
+            card["all_parts"] = [
+                {"object": "related_card", "id": card["id"], "component": "combo_piece", "name": name,
+                 "type_line": card["type_line"], "uri": f"{self.server.base_url}/cards/{card['id']}"},
+                {"object": "related_card", "id": token_id, "component": "token", "name": self.server.token_names[token_id],
+                 "type_line": "Token Creature — Soldier", "uri": f"{self.server.base_url}/cards/{token_id}"},
+            ]
+        return card
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        self.server.count_request()
+
+        if self.path.startswith("/images/"):
+            self.__send_image__()
+            return
+
+        parsed = urlparse(self.path)
+        parts = [unquote(p) for p in parsed.path.strip("/").split("/")]
+        query = parse_qs(parsed.query)
+
+        if parts[:2] == ["cards", "named"] and "fuzzy" in query:
+            self.__send_json__(200, self.__card__(query["fuzzy"][0]))
+
+        elif parts == ["cards", "random"]:
+            self.__send_json__(200, self.__card__(f"Random Card {self.server.random_number()}"))
+
+        elif parts[0] == "cards" and len(parts) == 2 and parts[1] in self.server.token_names:
+            self.__send_json__(200, self.__card__(self.server.token_names[parts[1]]))
+
+        elif parts[0] == "cards" and len(parts) in (3, 4):
+            number = parts[2]
+            lang = parts[3] if len(parts) == 4 else "en"
+            # Roughly one card in three has no Portuguese printing, exercising the EN fallback
+            if lang == "pt" and int(number) % 3 == 0:
+                self.__send_json__(404, {"object": "error", "status": 404})
+                return
+            # A printing keeps the name of the card it was found for, like on Scryfall
+            with self.server.lock:
+                name = self.server.names_by_number.get(number, f"Card {number}")
+            card = self.__card__(name, lang)
+            card["collector_number"] = number
+            self.__send_json__(200, card)
+
+        else:
+            self.__send_json__(404, {"object": "error", "status": 404})
+
+
+    def do_POST(self):
+        time.sleep(self.server.latency)
+        self.server.count_request()
+
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+
+        if urlparse(self.path).path.strip("/") != "cards/collection":
+            self.__send_json__(404, {"object": "error", "status": 404})
+            return
+
+        data, not_found = [], []
+        for identifier in payload.get("identifiers", []):
+            # Names containing "fuzzy" only resolve through /cards/named, like misspelled names do
+            if "name" in identifier and "fuzzy" not in identifier["name"].lower():
+                data.append(self.__card__(identifier["name"]))
+            elif identifier.get("id") in self.server.token_names:
+                data.append(self.__card__(self.server.token_names[identifier["id"]]))
+            else:
+                not_found.append(identifier)
+        self.__send_json__(200, {"object": "list", "not_found": not_found, "data": data})
+
+
+class FakeScryfallServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0, image_size=(745, 1040),
+                 image_variants: int = 1, seed: int = 0, tokens: int = 0):
+        """With image_variants > 1, card numbers map onto that many distinct, pre-encoded images.
+
+        With tokens, half of the cards create one of that many tokens, listed in their all_parts.
+        """
+        super().__init__((host, port), FakeScryfallHandler)
+        self.latency = latency
+        if image_variants > 1:
+            self.images = [gradient_card_png(*image_size, seed=variant) for variant in range(image_variants)]
+        else:
+            self.images = [synthetic_card_png(*image_size)]
+        self.image_bytes = self.images[0]
+        self.base_url = f"http://{host}:{self.server_address[1]}"
+        self.request_count = 0
+        self.bytes_sent = 0
+        self.variants = {}
+        self.random = random.Random(seed)
+        self.token_names = {card_id(f"Soldier Token {i}"): f"Soldier Token {i}" for i in range(tokens)}
+        self.names_by_number = {}
+        self.lock = threading.Lock()
+
+    def count_request(self):
+        with self.lock:
+            self.request_count += 1
+
+    def image_for(self, path: str) -> bytes:
+        """The image served for /images/<set>/<number>/<lang>.png; numbers get variants in order of first request."""
+        match = re.match(r"/images/[^/]+/(\d+)/", path)
+        with self.lock:
+            number = match.group(1) if match else ""
+            variant = self.variants.setdefault(number, len(self.variants) % len(self.images))
+            body = self.images[variant]
+            self.bytes_sent += len(body)
+        return body
+
+    def random_number(self) -> int:
+        with self.lock:
+            return self.random.randint(1, 100000)
+
+    def start(self) -> "FakeScryfallServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -1,22 +1,66 @@
 import os
 import json
-from scripts.constants import CACHE_FILE
+import time
+import sqlite3
+from scripts.constants import CACHE_FILE, CACHE_DB_FILE, CACHE_TTL_SECONDS, CACHE_MAX_BYTES, CACHE_EVICTION_INTERVAL
 import hashlib
-import requests
+import threading
 from urllib.parse import urlencode
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Iterator, Tuple, Optional
+from scripts.http_utils import api_get
+from scripts.metrics_utils import get_metrics
 
 
-__response_cache__ = {}
-    
+# One connection per thread and database path; SQLite in WAL mode handles concurrent writers
+__local__ = threading.local()
+__migrated__ = set()
+__migrate_lock__ = threading.Lock()
+__writes__ = 0
+__writes_lock__ = threading.Lock()
+
+# Only these answers are worth keeping; rate limits and server errors are retried on the next run
+CACHEABLE_STATUS_CODES = (200, 404)
+
+# Reads only refresh accessed_at when it is older than this, to avoid a write per hit
+ACCESS_RESOLUTION_SECONDS = 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    params TEXT,
+    status_code INTEGER NOT NULL,
+    content TEXT,
+    border_color TEXT,
+    image_quality_score REAL,
+    image_quality TEXT,
+    created_at REAL NOT NULL,
+    expires_at REAL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS image_scores (
+    digest TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    score REAL,
+    scored_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS image_scores_path ON image_scores (path);
+"""
+
 class CacheEntry:
-    def __init__(self, 
-                 url: str, 
-                 params: Dict[str, Any], 
-                 status_code: int, 
-                 content: Any, 
-                 border_color: Tuple[int,int,int] = (0, 0, 0), 
-                 image_quality_score: int = -1, 
+    def __init__(self,
+                 url: str,
+                 params: Dict[str, Any],
+                 status_code: int,
+                 content: Any,
+                 border_color: Tuple[int,int,int] = (0, 0, 0),
+                 image_quality_score: int = -1,
                  image_quality: str = "unknown"):
         self.url = url
         self.params = params
@@ -34,22 +78,90 @@ class CacheEntry:
             "content": self.content,
             "border_color": self.border_color,
             "image_quality_score": self.image_quality_score,
-            "image_quality": self.image_quality            
-        }    
+            "image_quality": self.image_quality
+        }
+
+
+def __connect__() -> sqlite3.Connection:
+    """Return this thread's connection to the cache database, creating it on first use."""
+    db_path = os.path.abspath(CACHE_DB_FILE)
+    connections = getattr(__local__, "connections", None)
+    if connections is None:
+        connections = __local__.connections = {}
+
+    conn = connections.get(db_path)
+    if conn is None:
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        connections[db_path] = conn
+
+    with __migrate_lock__:
+        if db_path not in __migrated__:
+            __migrate_json_cache__(conn)
+            __migrated__.add(db_path)
+    return conn
+
+
+def __migrate_json_cache__(conn: sqlite3.Connection):
+    """Import the legacy whole-file JSON cache once, then move it aside."""
+    if not os.path.exists(CACHE_FILE):
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+            conn.execute("COMMIT")
+            return
 
-def __load_cache__() -> Dict[str, CacheEntry]:
-    global response_cache
-    if os.path.exists(CACHE_FILE):
         with open(CACHE_FILE, "r") as f:
             data = json.load(f)
-            __response_cache__ = {k: CacheEntry(**v) for k, v in data.items()}
-    else:
-        response_cache = {}
 
-def __save_cache__():
-    global response_cache
-    with open(CACHE_FILE, "w") as f:
-        json.dump({k: v.to_dict() for k, v in __response_cache__.items()}, f, indent=4)
+        now = time.time()
+        rows = [__to_row__(key, CacheEntry(**value), now, now + CACHE_TTL_SECONDS) for key, value in data.items()]
+        conn.executemany("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('json_migrated', ?)", (str(now),))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    os.replace(CACHE_FILE, f"{CACHE_FILE}.migrated")
+    print(f"-INFO: Migrated {len(rows)} cached responses from {CACHE_FILE}")
+
+
+def __to_row__(cache_key: str, entry: CacheEntry, now: float, expires_at: Optional[float]) -> tuple:
+    content = json.dumps(entry.content)
+    return (
+        cache_key,
+        entry.url,
+        json.dumps(entry.params),
+        entry.status_code,
+        content,
+        json.dumps(entry.border_color),
+        entry.image_quality_score,
+        entry.image_quality,
+        now,
+        expires_at,
+        now,
+        len(content) + len(entry.url),
+    )
+
+
+def __evict__(conn: sqlite3.Connection, max_bytes: int = CACHE_MAX_BYTES):
+    """Drop expired entries, then the least recently used ones until the cache fits in max_bytes."""
+    conn.execute("DELETE FROM responses WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    if total <= max_bytes:
+        return
+
+    for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall():
+        if total <= max_bytes:
+            break
+        conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        total -= size
 
 
 def generate_cache_key(url: str) -> str:
@@ -57,27 +169,139 @@ def generate_cache_key(url: str) -> str:
     return hashlib.md5(key_data).hexdigest()
 
 
-def get_with_cache(url, params=None):
-    global response_cache
-    if __response_cache__ == {}: 
-        __load_cache__()
+def __read_entry__(cache_key: str) -> Optional[CacheEntry]:
+    conn = __connect__()
+    row = conn.execute(
+        "SELECT url, params, status_code, content, border_color, image_quality_score, image_quality, expires_at, accessed_at "
+        "FROM responses WHERE key = ?", (cache_key,)).fetchone()
+    if row is None:
+        return None
+
+    url, params, status_code, content, border_color, image_quality_score, image_quality, expires_at, accessed_at = row
+    now = time.time()
+    if expires_at is not None and expires_at < now:
+        return None
+
+    if accessed_at < now - ACCESS_RESOLUTION_SECONDS:
+        conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, cache_key))
+
+    return CacheEntry(
+        url=url,
+        params=json.loads(params),
+        status_code=status_code,
+        content=json.loads(content),
+        border_color=tuple(json.loads(border_color)),
+        image_quality_score=image_quality_score,
+        image_quality=image_quality,
+    )
+
+
+def __write_entry__(cache_key: str, entry: CacheEntry, ttl: Optional[int] = CACHE_TTL_SECONDS):
+    global __writes__
+    conn = __connect__()
+    now = time.time()
+    expires_at = now + ttl if ttl else None
+    conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                 __to_row__(cache_key, entry, now, expires_at))
+
+    with __writes_lock__:
+        __writes__ += 1
+        evict = __writes__ % CACHE_EVICTION_INTERVAL == 0
+    if evict:
+        __evict__(conn)
 
+
+def get_with_cache(url, params=None, ttl: Optional[int] = CACHE_TTL_SECONDS):
     if params:
-        url = f"{url}?{urlencode(params)}"        
+        url = f"{url}?{urlencode(params)}"
 
     cache_key = generate_cache_key(url)
-    
-    if cache_key in __response_cache__:
+
+    cache_entry = __read_entry__(cache_key)
+    if cache_entry is not None:
         print("Returning cached response")
-        return __response_cache__[cache_key]
+        get_metrics().count("api_cache.hit")
+        return cache_entry
 
-    response = requests.get(url)
-    __response_cache__Entry = CacheEntry(
+    get_metrics().count("api_cache.miss")
+    response = api_get(url)
+    try:
+        content = response.json()
+    except ValueError:
+        # e.g. an HTML error page from a proxy in front of the API
+        content = {"object": "error", "status": response.status_code, "details": response.text[:200]}
+    cache_entry = CacheEntry(
         url=url,
         params=params,
         status_code=response.status_code,
-        content=response.json()
+        content=content
     )
-    __response_cache__[cache_key] = __response_cache__Entry
-    __save_cache__()
-    return __response_cache__Entry
\ No newline at end of file
+    if response.status_code in CACHEABLE_STATUS_CODES:
+        __write_entry__(cache_key, cache_entry, ttl)
+    else:
+        print(f"!WARNING: Scryfall answered {response.status_code} for {url}, not caching it")
+        get_metrics().count("api_cache.uncached_error")
+    return cache_entry
+
+
+def get_cached(url, params=None) -> Optional[CacheEntry]:
+    """Return the cached entry for a request without hitting the network."""
+    if params:
+        url = f"{url}?{urlencode(params)}"
+
+    return __read_entry__(generate_cache_key(url))
+
+
+def iter_cached_cards() -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield (url, card data) for every unexpired cached card response that carries images."""
+    rows = __connect__().execute(
+        "SELECT url, content FROM responses WHERE status_code = 200 AND (expires_at IS NULL OR expires_at >= ?) "
+        "AND content LIKE '%\"image_uris\"%'", (time.time(),)).fetchall()
+    for url, content in rows:
+        card_data = json.loads(content)
+        if card_data.get("object") == "card":
+            yield url, card_data
+
+
+def put_in_cache(url, params, status_code: int, content: Any, ttl: Optional[int] = CACHE_TTL_SECONDS) -> CacheEntry:
+    """Store a response fetched by other means (e.g. a batch) under its own request url."""
+    if params:
+        url = f"{url}?{urlencode(params)}"
+
+    entry = CacheEntry(url=url, params=params, status_code=status_code, content=content)
+    __write_entry__(generate_cache_key(url), entry, ttl)
+    return entry
+
+
+def get_image_scores(digests) -> Dict[str, Optional[float]]:
+    """Return the stored quality scores of the given image digests; unscored digests are left out."""
+    conn = __connect__()
+    scores = {}
+    digests = list(digests)
+    for i in range(0, len(digests), 500):
+        chunk = digests[i:i + 500]
+        rows = conn.execute(f"SELECT digest, score FROM image_scores WHERE digest IN ({','.join('?' * len(chunk))})", chunk)
+        scores.update(rows.fetchall())
+    return scores
+
+
+def put_image_scores(scores: Dict[str, Tuple[str, Optional[float]]]):
+    """Store {digest: (path, score)} quality scores; a None score marks an image that could not be read."""
+    conn = __connect__()
+    now = time.time()
+    conn.executemany("INSERT OR REPLACE INTO image_scores VALUES (?, ?, ?, ?)",
+                     [(digest, path, score, now) for digest, (path, score) in scores.items()])
+
+
+def set_image_quality_score(url: str, score: float):
+    """Record the quality score of a card's image on its cached response."""
+    __connect__().execute("UPDATE responses SET image_quality_score = ? WHERE key = ?", (score, generate_cache_key(url)))
+
+
+def get_meta(key: str) -> Optional[str]:
+    row = __connect__().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def set_meta(key: str, value: str):
+    __connect__().execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
@@ -12,7 +12,8 @@ class Card:
                  image_quality_score: int = -1,
                  version = None,
                  quantity = 1,
-                 scryfall_url = None):
+                 scryfall_url = None,
+                 collector_number = None):
         self.name = name
         self.lang = lang
         self.image_url = image_url
@@ -24,7 +25,9 @@ class Card:
         self.quantity = quantity
         self.version = version
         self.scryfall_url = scryfall_url
+        self.collector_number = collector_number
         self.sanitized_name = sanitize_filename(name.lower())
+        self.tokens: List["Card"] = []  # Token cards this card creates, filled by fetch_cards
 
 
 
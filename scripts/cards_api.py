@@ -1,41 +1,45 @@
 import os
-import requests
-from typing import List
-from scripts.cache_utils import get_with_cache
+import copy
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from scripts.cache_utils import CacheEntry, get_with_cache, get_cached, iter_cached_cards, put_in_cache
+from scripts.index_utils import get_card_index, is_offline
+from scripts.http_utils import api_post, get_image_session
+from scripts.download_utils import download_file, is_valid_image
+from scripts.metrics_utils import get_metrics
 from scripts.string_utils import sanitize_filename
-from scripts.constants import CACHE_DIR
+from scripts.constants import CACHE_DIR, COLLECTION_BATCH_SIZE, CUSTOM_CARDS_DIR, DOWNLOAD_WORKERS, FETCH_WORKERS, IMAGE_MIRROR_DIR, SCRYFALL_API_URL
 from enum import Enum
 from scripts.card_class import Card
+from scripts.directoryindex_class import DirectoryIndex
+from scripts.imagesourcechain_class import ImageSourceChain
+from scripts.deck_utils import token_counts
 from scripts.pagesizeenum_class import PageSizeEnum
-from shutil import copyfile
+from urllib.parse import urlparse
 
 
 
-def __fetch_card_lang__(card: Card, code: str, number: int):
-    """Fetch card in PT language."""
-    base_url_search = "https://api.scryfall.com/cards"
-    response_cards = {}
+def __get_card_data__(url: str, params: Dict[str, str] = None) -> CacheEntry:
+    """Answer a Scryfall request from the offline card index, falling back to the cached HTTP path."""
+    card_index = get_card_index()
+    if card_index is not None:
+        card_data = card_index.lookup(url, params)
+        if card_data is not None:
+            get_metrics().count("card_index.hit")
+            return CacheEntry(url=url, params=params, status_code=200, content=card_data)
 
-    # Step 2: Search for the card in Portuguese    
-    response_cards = get_with_cache(f"{base_url_search}/{number}/{code}/pt")
-    print(f"-INFO: {response_cards.url}")
+        get_metrics().count("card_index.miss")
 
-    if response_cards.status_code != 200:
-        print(f"!WARNING: Fallback to EN: {card.name}")
-        response_cards = get_with_cache(f"{base_url_search}/{number}/{code}")
-        print(f"-INFO: {response_cards.url}")
-    
-    #elif response_cards.json().get('image_status') == "placeholder":  
-    elif response_cards.content.get('image_status') in ("placeholder", "missing", "lowres"):
-        print(f"!WARNING: No valid Image found. Fallback to EN: {card.name}")
-        response_cards = get_with_cache(f"{base_url_search}/{number}/{code}")
-        print(f"-INFO: {response_cards.url}")
+    if is_offline():
+        return CacheEntry(url=url, params=params, status_code=404, content={"object": "error", "status": 404})
+
+    return get_with_cache(url, params=params)
 
-    if response_cards.status_code != 200:
-        print(f"$ERROR: Failed to fetch card lang: {card.name}")
-        return
 
-    card_data = response_cards.content
+def __fill_card__(card: Card, card_data: Dict, scryfall_url: str, image_quality_score: Optional[float] = None):
+    """Set a card's name, language, image and type from Scryfall card data."""
     if 'image_uris' in card_data: 
         name = card_data.get("printed_name", card_data["name"])
         card.name=name
@@ -44,9 +48,10 @@ def __fetch_card_lang__(card: Card, code: str, number: int):
         card.card_type=card_data["type_line"].split(" ")[0]
         card.border_color=(0,0,0)
         card.image_quality=card_data.get("image_status")
-        card.image_quality_score=-1
-        card.version=number
-        card.scryfall_url=response_cards.url
+        card.image_quality_score=image_quality_score if image_quality_score is not None else -1
+        card.version=card_data["set"]
+        card.collector_number=card_data.get("collector_number")
+        card.scryfall_url=scryfall_url
             
     elif 'card_faces' in card_data: 
         for card_face in card_data['card_faces']:
@@ -57,130 +62,447 @@ def __fetch_card_lang__(card: Card, code: str, number: int):
             card.card_type=card_face["type_line"].split(" ")[0]
             card.border_color=(0,0,0)
             card.image_quality=card_data.get("image_status")
-            card.image_quality_score=-1
-            card.version=number
-            card.scryfall_url=response_cards.url
+            card.image_quality_score=image_quality_score if image_quality_score is not None else -1
+            card.version=card_data["set"]
+            card.collector_number=card_data.get("collector_number")
+            card.scryfall_url=scryfall_url
 
+
+def __fetch_card_lang__(card: Card, code: str, number: int):
+    """Fetch card in PT language."""
+    base_url_search = f"{SCRYFALL_API_URL}/cards"
+    response_cards = {}
+
+    # Step 2: Search for the card in Portuguese    
+    response_cards = __get_card_data__(f"{base_url_search}/{number}/{code}/pt")
+    print(f"-INFO: {response_cards.url}")
+
+    if response_cards.status_code != 200:
+        print(f"!WARNING: Fallback to EN: {card.name}")
+        response_cards = __get_card_data__(f"{base_url_search}/{number}/{code}")
+        print(f"-INFO: {response_cards.url}")
+    
+    #elif response_cards.json().get('image_status') == "placeholder":  
+    elif response_cards.content.get('image_status') in ("placeholder", "missing", "lowres"):
+        print(f"!WARNING: No valid Image found. Fallback to EN: {card.name}")
+        response_cards = __get_card_data__(f"{base_url_search}/{number}/{code}")
+        print(f"-INFO: {response_cards.url}")
+
+    if response_cards.status_code != 200:
+        print(f"$ERROR: Failed to fetch card lang: {card.name}")
+        return
+
+    __fill_card__(card, response_cards.content, response_cards.url, response_cards.image_quality_score)
     print(f"-INFO: Fetched card details: {repr(card)}")    
     return card
 
     
 
 
-def fetch_cards(cards: List[Card], find_tokens: bool = False, url: str = ""):
-    """Fetch card details from Scryfall API."""
-    base_url_named = "https://api.scryfall.com/cards/named"   
+def __card_request__(card: Card) -> Tuple[str, Dict[str, str]]:
+    """Return the (url, params) used to look a card up on its own."""
+    if card.version and card.collector_number:
+        return f"{SCRYFALL_API_URL}/cards/{card.version}/{card.collector_number}", None
+
+    params = {"fuzzy": card.name}
+    if card.version:
+        params["set"] = card.version
+    return f"{SCRYFALL_API_URL}/cards/named", params
+
+
+def __collection_identifier__(card: Card) -> Dict[str, str]:
+    """Return the /cards/collection identifier for a card: set+number, name+set or name."""
+    if card.version and card.collector_number:
+        return {"set": card.version, "collector_number": card.collector_number}
+    if card.version:
+        return {"name": card.name, "set": card.version}
+    return {"name": card.name}
 
-    # List all files from the custom directory with .png and .jpg extensions
-    custom_url =  os.path.abspath("./custom_cards")
-    custom_images = [f for f in os.listdir(custom_url) if f.endswith(('.png', '.jpg'))]
-   
+
+def __identifier_key__(identifier: Dict[str, str]) -> Tuple[str, ...]:
+    if "collector_number" in identifier:
+        return ("set", identifier["set"].lower(), identifier["collector_number"].lower())
+    if "set" in identifier:
+        return ("name", identifier["name"].lower(), identifier["set"].lower())
+    return ("name", identifier["name"].lower())
+
+
+def __fetch_collection__(cards: List[Card]):
+    """Resolve cards in batches through /cards/collection and cache each card on its own.
+
+    Only cards the offline index or the cache cannot answer are sent. Identifiers the batch does not
+    resolve are left uncached, so they fall back to the per-card fuzzy lookup.
+    """
+    if is_offline():
+        return
+
+    card_index = get_card_index()
+    pending: Dict[Tuple[str, ...], List[Card]] = {}
     for card in cards:
-        # Check if a custom image exists for the card        
-        custom_image = next((f for f in custom_images if os.path.splitext(f)[0] == card.sanitized_name), None)
-        
-        if custom_image:
-            card.lang="nd"
-            card.image_url= f"{custom_url}\{custom_image}"
-            card.card_type="Token"            
+        url, params = __card_request__(card)
+        if card_index is not None and card_index.lookup(url, params) is not None:
             continue
-         
-        else:
-            # Step 1: Fetch English card details from named endpoint
-            print(f"-INFO: Fetching card {card.name} info")
-            if url:
-                response_named = get_with_cache(url)
-            else:
-                params = {"fuzzy": card.name}
-                if card.version:
-                    params["set"] = card.version
-                response_named = get_with_cache(base_url_named, params=params)
-            
-            print(f"-INFO: {response_named.url}")
-            if response_named.status_code != 200:
-                print(f"$ERROR: Failed to fetch card details: {card.name}")
-                continue
+        if get_cached(url, params) is None:
+            pending.setdefault(__identifier_key__(__collection_identifier__(card)), []).append(card)
 
-            card_data = response_named.content
-            code = card_data["collector_number"]
-            number = card_data["set"]
+    keys = list(pending.keys())
+    for batch_start in range(0, len(keys), COLLECTION_BATCH_SIZE):
+        batch_keys = keys[batch_start:batch_start + COLLECTION_BATCH_SIZE]
+        payload = __post_collection__([__collection_identifier__(pending[key][0]) for key in batch_keys])
+        if payload is None:
+            continue
 
-            __fetch_card_lang__(card, code, number)
-            
-            # If the card has tokens, attempt to fetch them
-            if find_tokens:
-                if 'all_parts' in card_data:
-                    print(f"-INFO: Fetching card parts")
-                    for part in card_data['all_parts']:
-                        if part['component'] == 'token' or (part['component'] == 'combo_piece' and part['type_line'] == 'Emblem'):
-                            token_card = Card(name=part.get('name'))
-                            tokens = fetch_cards([token_card], False, part['uri'])
-                            if tokens:
-                                cards.extend(tokens)
-            
-            print()
+        for card_data in payload.get("data", []):
+            names = [card_data["name"]] + [face["name"] for face in card_data.get("card_faces", [])]
+            candidates = [("set", card_data["set"].lower(), card_data["collector_number"].lower())]
+            candidates += [("name", name.lower(), card_data["set"].lower()) for name in names]
+            candidates += [("name", name.lower()) for name in names]
+
+            for key in candidates:
+                if key in pending:
+                    url, params = __card_request__(pending[key][0])
+                    put_in_cache(url, params, 200, card_data)
+
+        not_found = payload.get("not_found", [])
+        if not_found:
+            print(f"!WARNING: {len(not_found)} cards not found in collection, falling back to fuzzy lookup")
+
+
+def __post_collection__(identifiers: List[Dict[str, str]]) -> Optional[dict]:
+    """Send one /cards/collection batch and return its payload, or None when the request failed."""
+    print(f"-INFO: Fetching {len(identifiers)} cards from collection")
+    get_metrics().count("collection.requests")
+    get_metrics().count("collection.identifiers", len(identifiers))
+    response = api_post(f"{SCRYFALL_API_URL}/cards/collection", json={"identifiers": identifiers})
+    if response.status_code != 200:
+        print(f"!WARNING: Collection request failed ({response.status_code}), falling back to single lookups")
+        return None
+    return response.json()
+
+
+def __fetch_token_collection__(token_uris: Dict[str, str]):
+    """Resolve tokens by Scryfall id in /cards/collection batches, caching each one under its own uri."""
+    if is_offline():
+        return
+
+    card_index = get_card_index()
+    pending = {token_id: uri for token_id, uri in token_uris.items()
+               if (card_index is None or card_index.lookup(uri) is None) and get_cached(uri, None) is None}
+
+    token_ids = list(pending.keys())
+    for batch_start in range(0, len(token_ids), COLLECTION_BATCH_SIZE):
+        payload = __post_collection__([{"id": token_id} for token_id in token_ids[batch_start:batch_start + COLLECTION_BATCH_SIZE]])
+        if payload is None:
+            continue
+        for card_data in payload.get("data", []):
+            if card_data.get("id") in pending:
+                put_in_cache(pending[card_data["id"]], None, 200, card_data)
+
+
+def __fetch_card__(card: Card, find_tokens: bool = False, url: str = "") -> List[Dict[str, str]]:
+    """Fetch a single card and return the Scryfall parts (id, name, uri) of the tokens it creates."""
+    token_parts: List[Dict[str, str]] = []
+
+    # Check if a custom image exists for the card        
+    custom_image = custom_images().get(card.sanitized_name)
+    
+    if custom_image:
+        card.lang="nd"
+        card.image_url= custom_image
+        card.card_type="Token"            
+        return token_parts
+     
+    # Step 1: Fetch English card details from named endpoint
+    print(f"-INFO: Fetching card {card.name} info")
+    if url:
+        response_named = __get_card_data__(url)
+    else:
+        response_named = __get_card_data__(*__card_request__(card))
+    
+    print(f"-INFO: {response_named.url}")
+    if response_named.status_code != 200:
+        print(f"$ERROR: Failed to fetch card details: {card.name}")
+        return token_parts
+
+    card_data = response_named.content
+    code = card_data["collector_number"]
+    number = card_data["set"]
+
+    __fetch_card_lang__(card, code, number)
+    
+    # If the card has tokens, collect them so they can be fetched after the deck
+    if find_tokens:
+        if 'all_parts' in card_data:
+            print(f"-INFO: Fetching card parts")
+            for part in card_data['all_parts']:
+                if part['component'] == 'token' or (part['component'] == 'combo_piece' and part['type_line'] == 'Emblem'):
+                    token_parts.append(part)
+
+    return token_parts
+
+
+def __timed_fetch_card__(card: Card, find_tokens: bool = False, url: str = "") -> List[Dict[str, str]]:
+    with get_metrics().timed("card.fetch"):
+        return __fetch_card__(card, find_tokens, url)
+
+
+IMAGE_EXTENSIONS = (".png", ".jpg")
+
+# Directory listings by absolute path, each one read again only when the directory changes
+__directory_indexes__: Dict[str, DirectoryIndex] = {}
+__directory_indexes_lock__ = threading.Lock()
+
+
+def __directory_index__(directory: str, key: Callable[[str], str]) -> DirectoryIndex:
+    with __directory_indexes_lock__:
+        path = os.path.abspath(directory)
+        if path not in __directory_indexes__:
+            __directory_indexes__[path] = DirectoryIndex(path, key, IMAGE_EXTENSIONS)
+        return __directory_indexes__[path]
+
+
+def custom_images(directory: str = CUSTOM_CARDS_DIR) -> DirectoryIndex:
+    """Custom card art (.png and .jpg), keyed like Card.sanitized_name."""
+    return __directory_index__(directory, lambda file_name: sanitize_filename(os.path.splitext(file_name)[0].lower()))
+
+
+def iter_fetch_cards(cards: List[Card], find_tokens: bool = False, url: str = "", workers: int = FETCH_WORKERS) -> Iterator[Card]:
+    """Resolve cards like fetch_cards, yielding every card as soon as its details are in.
+
+    Each card's tokens are set on card.tokens before it is yielded. Cards creating
+    the same token (by Scryfall id) share one token Card, and once every card has
+    resolved the unique tokens are looked up in one batched pass and yielded in turn.
+    """
+    # Batch every card that needs a lookup so the per-card pass mostly hits the cache
+    if not url:
+        __fetch_collection__([card for card in cards if custom_images().get(card.sanitized_name) is None])
+
+    tokens: Dict[str, Card] = {}
+    token_uris: Dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(__timed_fetch_card__, card, find_tokens, url): card for card in cards}
+        for future in as_completed(futures):
+            card = futures[future]
+            card.tokens = []
+            for part in future.result():
+                if part["id"] not in tokens:
+                    tokens[part["id"]] = Card(name=part.get("name"))
+                    token_uris[part["id"]] = part["uri"]
+                card.tokens.append(tokens[part["id"]])
+            yield card
+
+        if not tokens:
+            return
+        print(f"-INFO: Fetching {len(tokens)} unique tokens")
+        get_metrics().count("tokens.unique", len(tokens))
+        __fetch_token_collection__(token_uris)
+
+        # Tokens are resolved straight from their Scryfall uri, now mostly from the cache
+        futures = {executor.submit(__timed_fetch_card__, token, False, token_uris[token_id]): token
+                   for token_id, token in tokens.items()}
+        for future in as_completed(futures):
+            future.result()
+            yield futures[future]
+
+
+def fetch_cards(cards: List[Card], find_tokens: bool = False, url: str = "", workers: int = FETCH_WORKERS) -> List[Card]:
+    """Fetch card details from Scryfall API.
+
+    Cards are first looked up in batches through /cards/collection, then resolved
+    concurrently by a bounded thread pool, every request going through the global
+    Scryfall rate limiter. Cards are updated in place and tokens are appended
+    after the deck, each unique token once with as many copies as cards create it.
+    """
+    for _ in iter_fetch_cards(cards, find_tokens, url, workers):
+        pass
+    for token, count in token_counts(list(cards)):
+        token.quantity = count
+        cards.append(token)
+    return cards
+
+
+def card_image_path(card: Card) -> str:
+    """Where a card's source image is kept in the cache, one file per printing and language."""
+    printing = f"{card.version} {card.collector_number}" if card.collector_number else card.version
+    return os.path.join(CACHE_DIR, sanitize_filename(f"{card.name}[{printing}][{card.lang}].png"))
+
+
+def __find_custom__(card: Card) -> Optional[str]:
+    return custom_images().get(card.sanitized_name)
+
+
+def __find_cached__(card: Card) -> Optional[str]:
+    """The card's image in the cache, after checking that it is complete."""
+    image_path = card_image_path(card)
+    if not os.path.exists(image_path):
+        return None
+    if is_valid_image(image_path):
+        return image_path
+    print(f"!WARNING: Cached image is corrupt, downloading again: {image_path}")
+    get_metrics().count("image_cache.corrupt")
+    os.remove(image_path)
+    return None
+
+
+def __download_to_cache__(card: Card) -> Optional[str]:
+    if not card.image_url or not card.image_url.startswith(("http://", "https://")):
+        return None
+    image_path = card_image_path(card)
+    return image_path if download_file(card.image_url, image_path, get_image_session()) else None
 
 
-def download_images(cards: List[Card]):
-    """Download high-definition images for each card."""
+def image_sources(mirror_dir: Optional[str] = IMAGE_MIRROR_DIR) -> ImageSourceChain:
+    """The sources a card image is taken from, in order: custom art, the local mirror, the image cache, the network.
+
+    Custom art and mirror files are used where they are; downloads land in the cache.
+    """
+    sources = [("custom", __find_custom__)]
+    if mirror_dir:
+        # Mirror files are named like Scryfall's image files (<scryfall id>.png) or like cached images
+        mirror = __directory_index__(mirror_dir, str.lower)
+        sources.append(("mirror", lambda card: mirror.get(os.path.basename(urlparse(card.image_url or "").path).lower())
+                        or mirror.get(os.path.basename(card_image_path(card)).lower())))
+    sources += [("cache", __find_cached__), ("network", __download_to_cache__)]
+    return ImageSourceChain(sources)
+
+
+def __resolve_image__(card: Card, sources: ImageSourceChain) -> Optional[str]:
+    with get_metrics().timed("card.download"):
+        return sources.resolve(card)
+
+
+def download_images(cards: List[Card], workers: int = DOWNLOAD_WORKERS, sources: Optional[ImageSourceChain] = None):
+    """Find or download high-definition images for each card.
+
+    Each image comes from the first source that has it, see image_sources.
+    Cards sharing a cached image file are resolved once, so no two downloads
+    ever write the same file. Downloads run on a bounded pool over one pooled session.
+    """
+    sources = sources or image_sources()
+    cards_by_path: Dict[str, List[Card]] = {}
     for card in cards:
-        image_path = os.path.join(CACHE_DIR, sanitize_filename(f"{card.name}[{card.version}][{card.lang}].png"))
-        if not os.path.exists(image_path):
-            if(not card.image_url.startswith("https://")):
-                copyfile(card.image_url, image_path)
-                card.image_path = image_path
-                print(f"-INFO: Copied: {card.name} | {card.lang}")
-                continue
-            
-            response = requests.get(card.image_url, stream=True)
-            if response.status_code == 200:
-                with open(image_path, "wb") as f:
-                    for chunk in response.iter_content(1024):
-                        f.write(chunk)
-                
-            card.image_path = image_path
-            print(f"-INFO: Downloaded: {card.name} | {card.lang}")            
+        if not card.image_url:
+            print(f"$ERROR: No image url for card: {card.name}")
+            continue
+        cards_by_path.setdefault(card_image_path(card), []).append(card)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(lambda same_path: __resolve_image__(same_path[0], sources), cards_by_path.values())
+
+        for (cached_path, same_path), image_path in zip(cards_by_path.items(), results):
+            for card in same_path:
+                card.image_path = image_path or cached_path
+            status = "Ready" if image_path else "Failed"
+            print(f"-INFO: {status}: {same_path[0].name} | {same_path[0].lang}")
+    print(f"-INFO: {sources.report()}")
+
+
+# One lock per cached image, so cards sharing an image never download it twice at the same time
+__image_locks__: Dict[str, threading.Lock] = {}
+__image_locks_lock__ = threading.Lock()
+
+
+def download_card_image(card: Card, sources: Optional[ImageSourceChain] = None) -> bool:
+    """Find or download one card's image and set its image_path; safe to call from many threads."""
+    if not card.image_url:
+        print(f"$ERROR: No image url for card: {card.name}")
+        return False
+
+    with __image_locks_lock__:
+        lock = __image_locks__.setdefault(card_image_path(card), threading.Lock())
+    with lock:
+        image_path = __resolve_image__(card, sources or image_sources())
+    card.image_path = image_path or card_image_path(card)
+    print(f"-INFO: {'Ready' if image_path else 'Failed'}: {card.name} | {card.lang}")
+    return image_path is not None
+
 
+def random_cards(quantity: int, seed: Optional[int] = None, exclude: Iterable[str] = (), lang: Optional[str] = None) -> List[Card]:
+    """Pick random cards without calling the Scryfall API, in one draw reproducible with a seed.
+
+    Cards come from cached card responses whose image is already in the image
+    cache, one printing per card, in lang when one is on disk. They are sorted so
+    the same cache and seed give the same draw. Cards with a printing whose image
+    path is in exclude (the deck's own cards) are left out. When too few images
+    are on disk, cached cards without one and then the offline card index make up
+    the rest, and their images are downloaded; only without any of them do the
+    deck's own cards fill the page. The same card drawn twice becomes one card
+    with a quantity of two.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    excluded = set(exclude)
+
+    # By oracle id, or the English name every printing shares, so a deck card's other printings count as the deck's too
+    printings: Dict[str, List[Tuple[str, Card]]] = {}
+    for url, card_data in iter_cached_cards():
+        card = Card(name=card_data["name"])
+        __fill_card__(card, card_data, url)
+        if card.image_url:
+            printings.setdefault(card_data.get("oracle_id") or card_data["name"], []).append((card_image_path(card), card))
+
+    def preferred(same_card: List[Tuple[str, Card]]) -> Card:
+        # The deck's language first, then the smallest path, so the pick does not depend on the cache's order
+        return min(same_card, key=lambda printing: (printing[1].lang != lang, printing[0]))[1]
+
+    pool: Dict[str, Card] = {}
+    candidates, without_image = [], []
+    for key in sorted(printings):
+        on_disk = [printing for printing in printings[key] if os.path.exists(printing[0])]
+        pool[key] = preferred(on_disk or printings[key])
+        if any(path in excluded for path, _ in printings[key]):
+            continue
+        if on_disk:
+            candidates.append(pool[key])
         else:
-            print(f"-INFO: Image already exists: {card.name}")
-            card.image_path = image_path
+            without_image.append(pool[key])
 
+    if len(candidates) < quantity and without_image:
+        print(f"!WARNING: Only {len(candidates)} cached card images to pick from, downloading images of other cached cards")
+        candidates += without_image
 
-def getRandomCards(quantity: int) -> List[Card]:
-    """Get random cards from Scryfall API."""
-    base_url_random = "https://api.scryfall.com/cards/random"
-    fetched_cards: List[Card] = []
+    if len(candidates) < quantity and get_card_index() is not None:
+        print("!WARNING: Not enough cached cards to pick from, picking random cards from the offline card index too")
+        for card_data in get_card_index().sample(quantity, rng):
+            card = Card(name=card_data["name"])
+            __fill_card__(card, card_data, f"{SCRYFALL_API_URL}/cards/{card_data['id']}")
+            key = card_data.get("oracle_id") or card_data["name"]
+            if card.image_url and card_image_path(card) not in excluded and key not in pool:
+                pool[key] = card
+                candidates.append(card)
 
-    while len(fetched_cards) < quantity:
-        response_cards = requests.get(base_url_random)
-        print(f"-INFO: {response_cards.url}")
+    if not candidates:
+        candidates = list(pool.values())
+        if candidates:
+            print("!WARNING: No other cached or indexed cards to pick from, filling the page with the deck's own cards")
 
-        if response_cards.status_code != 200:
-            print(f"$ERROR: Failed to fetch random cards")
-            return
-        
-        rnd_card_name = response_cards.json()['name']
-        card = Card(name=rnd_card_name)
-        print(f"-INFO: Fetched random card: {rnd_card_name}")
-        fetch_cards(card, False)
-        fetched_cards.append(card)
+    if not candidates:
+        print("$ERROR: No cached or indexed cards to pick random cards from")
+        return []
 
+    picks, counts = np.unique(rng.choice(len(candidates), size=quantity, replace=len(candidates) < quantity), return_counts=True)
+    fetched_cards: List[Card] = []
+    for pick, count in zip(picks.tolist(), counts.tolist()):
+        card = copy.copy(candidates[pick])
+        card.quantity = count
+        fetched_cards.append(card)
+        print(f"-INFO: Picked random card: {card.name}")
     return fetched_cards
 
 
-def fillUpCardPageWithRandomCards(cards: List[Card], page_size: PageSizeEnum):
-    page_size_enum = PageSizeEnum
-    # Fill up the page with random cards
-    if page_size == page_size_enum.A4:
-        cards_per_page = 9
-    elif page_size == page_size_enum.A3:
-        cards_per_page = 18
-    
+def fillUpCardPageWithRandomCards(cards: List[Card], page_size: PageSizeEnum, seed: Optional[int] = None):
+    """Fill the free slots of the last page with random cards, counted on the layout the pages are rendered with."""
+    from scripts.render_utils import compute_page_layout
+    cards_per_page = compute_page_layout(page_size).cards_per_page
+
     #perfect lenght
-    if len(cards) % cards_per_page == 0:
+    cards_to_fill = -sum(card.quantity for card in cards) % cards_per_page
+    if cards_to_fill == 0:
         return
-    
-    cards_to_fill = cards_per_page - (len(cards) % cards_per_page)
-    random_cards = getRandomCards(cards_to_fill)
-    cards.extend(random_cards)
-    
\ No newline at end of file
+
+    exclude = [card_image_path(card) for card in cards if card.image_url]
+    # The deck's most common language, so the fill matches the cards around it
+    langs = Counter(card.lang for card in cards if card.image_url and card.lang != "nd")
+    lang = min(langs, key=lambda card_lang: (-langs[card_lang], card_lang)) if langs else None
+    cards.extend(random_cards(cards_to_fill, seed, exclude, lang))
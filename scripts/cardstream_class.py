@@ -0,0 +1,179 @@
+import os
+import time
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+from scripts.card_class import Card
+from scripts.constants import DOWNLOAD_WORKERS, STREAM_QUEUE_SIZE, UPSCALE_BATCH_SIZE
+from scripts.metrics_utils import get_metrics
+
+# Queued after the last card, one per thread reading the queue
+__DONE__ = None
+
+
+class CardStream:
+    """Carries cards from resolved details to print-ready images through bounded queues.
+
+    put() hands a card over as soon as its details are in. Download threads fetch
+    its image, and one prepare thread scores and upscales images as they land, a
+    few cards at a time, so every stage runs while the one before it is still
+    busy. wait() blocks until a card's image is final. A full queue makes the
+    stage feeding it wait, so memory stays bounded whatever the deck size.
+
+    An error in any stage stops the stream and is raised again by put(), wait() and join().
+    """
+
+    def __init__(self, download: Callable[[Card], bool], prepare: Callable[[List[Card]], None],
+                 download_workers: int = DOWNLOAD_WORKERS, batch_size: int = UPSCALE_BATCH_SIZE,
+                 queue_size: int = STREAM_QUEUE_SIZE):
+        self.download = download
+        self.prepare = prepare
+        self.batch_size = max(1, batch_size)
+        self.to_download = queue.Queue(queue_size)
+        self.to_prepare = queue.Queue(queue_size)
+        self.lock = threading.Lock()
+        self.ready: Dict[int, Tuple[Card, threading.Event]] = {}
+        self.error: Optional[BaseException] = None
+        self.stopped = threading.Event()
+        self.finished = threading.Event()
+        # First start, last end and CPU seconds of the work done in each stage
+        self.spans: Dict[str, List[float]] = {}
+        self.downloaders_left = download_workers
+        self.threads = [threading.Thread(target=self.__download_worker__, name=f"stream-download-{i}", daemon=True)
+                        for i in range(download_workers)]
+        self.threads.append(threading.Thread(target=self.__prepare_worker__, name="stream-prepare", daemon=True))
+
+    def start(self) -> "CardStream":
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def put(self, card: Card):
+        """Queue a card whose details are resolved; blocks while the download queue is full."""
+        self.__event__(card)
+        self.__put__(self.to_download, card)
+
+    def close(self):
+        """No more cards will be put; the stream finishes once the queued ones are ready."""
+        for _ in range(self.downloaders_left):
+            self.__put__(self.to_download, __DONE__)
+
+    def stop(self):
+        """Give up on the cards still queued, e.g. because the build failed elsewhere."""
+        self.stopped.set()
+
+    def wait(self, card: Card) -> Optional[str]:
+        """Block until the card's image is final and return its path.
+
+        A card that was never put gets its current image_path once the stream is finished.
+        """
+        _, event = self.__event__(card)
+        while not event.wait(0.1):
+            self.__raise_error__()
+            if self.finished.is_set():
+                break
+        self.__raise_error__()
+        return card.image_path
+
+    def join(self, timings: Optional[Dict[str, float]] = None):
+        """Wait for every stage to finish and record how long each one was busy, from its first to its last card."""
+        for thread in self.threads:
+            thread.join()
+        metrics = get_metrics()
+        for stage, (started_at, ended_at, cpu) in self.spans.items():
+            metrics.record(f"stage.{stage}", ended_at - started_at, cpu)
+            if timings is not None:
+                timings[stage] = timings.get(stage, 0.0) + ended_at - started_at
+        self.__raise_error__()
+
+    def __raise_error__(self):
+        if self.error is not None:
+            raise RuntimeError(f"Card stream failed: {self.error}") from self.error
+
+    def __event__(self, card: Card) -> Tuple[Card, threading.Event]:
+        # The card is kept with its event, so its id cannot be reused while the stream runs
+        with self.lock:
+            return self.ready.setdefault(id(card), (card, threading.Event()))
+
+    def __set_ready__(self, card: Card):
+        self.__event__(card)[1].set()
+
+    def __put__(self, target: queue.Queue, item, raise_error: bool = True):
+        while True:
+            if self.error is not None and not raise_error:
+                return
+            self.__raise_error__()
+            if self.stopped.is_set():
+                return
+            try:
+                target.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def __get__(self, source: queue.Queue, block: bool = True):
+        while not (self.stopped.is_set() or self.error is not None):
+            try:
+                return source.get(timeout=0.1) if block else source.get_nowait()
+            except queue.Empty:
+                if not block:
+                    raise
+        return __DONE__
+
+    @contextmanager
+    def __busy__(self, stage: str):
+        started_at, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            ended_at, cpu = time.perf_counter(), time.thread_time() - cpu
+            with self.lock:
+                span = self.spans.setdefault(stage, [started_at, ended_at, 0.0])
+                span[0], span[1], span[2] = min(span[0], started_at), max(span[1], ended_at), span[2] + cpu
+
+    def __download_worker__(self):
+        try:
+            while True:
+                card = self.__get__(self.to_download)
+                if card is __DONE__:
+                    break
+                with self.__busy__("download"):
+                    downloaded = self.download(card)
+                if downloaded and card.image_path and os.path.exists(card.image_path):
+                    self.__put__(self.to_prepare, card)
+                else:
+                    # Nothing to prepare; the card renders the way it would without streaming
+                    self.__set_ready__(card)
+        except BaseException as e:
+            self.error = self.error or e
+        finally:
+            with self.lock:
+                self.downloaders_left -= 1
+                last = self.downloaders_left == 0
+            if last:
+                # The prepare thread has already stopped if the stream failed
+                self.__put__(self.to_prepare, __DONE__, raise_error=False)
+
+    def __prepare_worker__(self):
+        try:
+            done = False
+            while not done:
+                batch = [self.__get__(self.to_prepare)]
+                # Whatever else has already landed joins the batch, up to batch_size cards
+                while batch[-1] is not __DONE__ and len(batch) < self.batch_size:
+                    try:
+                        batch.append(self.__get__(self.to_prepare, block=False))
+                    except queue.Empty:
+                        break
+                done = batch[-1] is __DONE__
+                cards = [card for card in batch if card is not __DONE__]
+                if cards:
+                    with self.__busy__("upscale"):
+                        self.prepare(cards)
+                    for card in cards:
+                        self.__set_ready__(card)
+        except BaseException as e:
+            self.error = self.error or e
+        finally:
+            self.finished.set()
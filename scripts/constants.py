@@ -1,13 +1,52 @@
-from reportlab.lib.pagesizes import A4, A3
-from reportlab.lib.units import inch
+import os
 from scripts.pagesizeenum_class import PageSizeEnum
 
 # Constants
 
 OUTPUT_DIR = "magic_cards"
-CACHE_DIR = f"{OUTPUT_DIR}\\cache"
+CACHE_DIR = os.path.join(OUTPUT_DIR, "cache")
 DEFAULT_PAGE_SIZE = "A4"
-CACHE_FILE = f"{CACHE_DIR}\\cards_fetched.cache"
+CACHE_FILE = os.path.join(CACHE_DIR, "cards_fetched.cache")  # Legacy JSON cache, migrated on first use
+CACHE_DB_FILE = os.path.join(CACHE_DIR, "cards_fetched.db")
+CACHE_TTL_SECONDS = 30 * 24 * 60 * 60  # Default lifetime of a cached response
+CACHE_MAX_BYTES = 256 * 1024 * 1024  # Least recently used entries are evicted above this size
+CACHE_EVICTION_INTERVAL = 500  # Writes between size checks
+UPSCALE_MODEL_PATH = os.path.join("weights", "RealESRGAN_x2plus.pth")
+UPSCALE_DEVICE = "auto"  # "auto" picks CUDA when available, otherwise the CPU
+UPSCALE_BATCH_SIZE = 4  # Same-sized cards per forward pass
+UPSCALE_WORKERS = 1  # Processes for CPU upscaling, each one loads its own model
+UPSCALE_TILE_PAD = 10
+UPSCALE_RAM_FRACTION = 0.5  # Share of free memory the model activations may use
+UPSCALE_BYTES_PER_PIXEL = 4096  # Rough RRDBNet activation memory per input pixel, used to size tiles
+HASH_INDEX_FILE = os.path.join(CACHE_DIR, "hash_index.db")  # Content hashes of cached files by path, size and mtime
+RENDER_JOBS = min(4, os.cpu_count() or 1)  # Page rendering processes; each one holds a full page canvas
+TILE_CACHE_MAX_BYTES = 1024 * 1024 * 1024  # Prepared card tiles kept in memory while rendering a deck
+PAGE_MEMORY_MAX_BYTES = None  # With a cap, PNG pages are composited and encoded in strips instead of on a full canvas
+PNG_COMPRESS_LEVEL = 6  # zlib level of PNG pages, same as Pillow's default
+PAGE_FORMAT = "png"  # Encoding of --png-pages pages: "png", lossless "webp" or "jpeg" for proofs
+PAGE_FORMATS = ("png", "webp", "jpeg")
+JPEG_QUALITY = 95  # Quality of JPEG pages; chroma is kept at full resolution
+WEBP_METHOD = 4  # libwebp effort of WebP pages, 0 (fastest) to 6 (smallest)
+ENCODE_THREADS = os.cpu_count() or 1  # Threads deflating one PNG page, shared out among the render processes
+STREAM_QUEUE_SIZE = 64  # Cards waiting between two streaming stages; a full queue holds back the stage feeding it
+CUSTOM_CARDS_DIR = "custom_cards"  # Card art by sanitized card name, used instead of Scryfall's
+IMAGE_MIRROR_DIR = None  # Local copy of card images, by Scryfall image file name or cache file name, checked before downloading
+CARD_INDEX_FILE = os.path.join(CACHE_DIR, "cards_index.db")  # Built from Scryfall bulk data by --ingest-bulk-data
+DAEMON_ADDRESS = "127.0.0.1:8765"  # Where --serve listens; keep it local, the API has no authentication
+DAEMON_JOBS = 2  # Deck builds the daemon runs at the same time; model passes are still one at a time
+DAEMON_QUEUE_SIZE = 32  # Jobs waiting beyond this are refused with 503
+SCORE_WORKERS = os.cpu_count() or 1  # Processes used to score image quality
+BLEED_MODE = "flat"  # "flat" fills the bleed with the border colour, "edge" repeats the outermost pixels
+BLEED_MODES = ("flat", "edge")
+
+SCRYFALL_API_URL = os.environ.get("SCRYFALL_API_URL", "https://api.scryfall.com")
+SCRYFALL_REQUESTS_PER_SECOND = 10  # Scryfall asks for 50-100 ms between requests
+SCRYFALL_BURST = 1
+FETCH_WORKERS = 8  # Concurrent card lookups, still bounded by the rate limiter
+COLLECTION_BATCH_SIZE = 75  # Max identifiers accepted by /cards/collection
+DOWNLOAD_WORKERS = 16  # Image downloads are served by a CDN and are not rate limited
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_RETRIES = 3
 
 CARD_LIST_OUTPUT = "printed_card_list_with_tokens.txt"
 CARD_SPACING = 1  # Margin between cards
@@ -18,6 +57,12 @@ DPI = 300 * SCALE # 1 x is 300 DPI
 
 MARGIN_DPI = int(( MARGIN_CM / 2.54 ) * DPI )  # 1cm margin in mm to dpi
 
+# Page sizes in PDF points, same values as reportlab.lib.pagesizes, so importing the constants does not load reportlab
+inch = 72.0
+mm = inch / 2.54 * 0.1
+A4 = (210 * mm, 297 * mm)
+A3 = (297 * mm, 420 * mm)
+
 PAGE_SIZES_DPI_DELTA = (72) 
 PAGE_SIZES_DPI = {
     PageSizeEnum.A4: {"width": (int(round(A4[0] / inch, 1) * DPI) - MARGIN_DPI), "height": (int(round(A4[1] / inch, 1) * DPI)- MARGIN_DPI)},
@@ -30,3 +75,7 @@ BLEED = round(0.10 / 2.54 * DPI)  # in cm
 CARD_WIDTH = round(6.35 / 2.54 * DPI) #750 * SCALE # Card width at 300 DPI
 CARD_HEIGHT = round(8.8 / 2.54 * DPI) #1050 * SCALE # Card height at 300 DPI
 
+UPSCALE_POLICY = "auto"  # "auto" lets UpscalePolicy skip the model where it is not needed, "always" upscales every card
+UPSCALE_MIN_QUALITY_SCORE = 70.0  # Cards scoring at least this are resized with Lanczos instead of upscaled
+UPSCALE_PASSTHROUGH_WIDTH = CARD_WIDTH  # Sources at least this wide are already at print resolution
+
@@ -0,0 +1,113 @@
+import os
+import re
+import copy
+import glob
+from typing import Dict, Iterable, List, Optional, Tuple
+from scripts.card_class import Card
+from scripts.string_utils import sanitize_filename
+
+BASIC_LANDS = ["plains", "island", "swamp", "mountain", "forest"]
+
+
+def parse_deck(input_file: str, deck_name: str, include_basic_lands: bool = False) -> Tuple[str, List[Card]]:
+    """Read a deck list and return its name (from a "#DECK:" line, otherwise deck_name) and its cards."""
+    with open(input_file, "r") as f:
+        return parse_deck_lines(f, deck_name, include_basic_lands)
+
+
+def parse_deck_lines(lines: Iterable[str], deck_name: str, include_basic_lands: bool = False) -> Tuple[str, List[Card]]:
+    """Parse the lines of a deck list, see parse_deck."""
+    cards: List[Card] = []
+    for line in lines:
+        line = line.strip()
+        if line.startswith("#-"):
+            break
+
+        if line.startswith("#DECK:"):
+            deck_name = sanitize_filename(line.split(":")[1].strip())
+            continue
+
+        if not line or line.startswith("#") or line.startswith("=") :
+            continue
+
+        match = re.match(r"(\d+)?\s*([^\[]+?)(?:\s*\[(.+?)\])?$", line)
+        if match:
+            name = match.group(2).strip()
+            if not include_basic_lands and name.lower() in BASIC_LANDS:
+                continue
+
+            quantity = int(match.group(1)) if match.group(1) else 1
+            version = match.group(3)
+            collector_number = None
+            # "[set number]" pins an exact printing
+            if version and len(version.split()) == 2:
+                version, collector_number = version.split()
+            cards.append(Card(name=name, quantity=quantity, version=version, collector_number=collector_number))
+
+    return deck_name, cards
+
+
+def expand_deck_files(patterns: List[str]) -> List[str]:
+    """Expand file names and glob patterns into deck files, in order and without repeats."""
+    deck_files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) or ([pattern] if os.path.exists(pattern) else [])
+        if not matches:
+            print(f"!WARNING: No deck file matches '{pattern}'")
+        deck_files.extend(matches)
+    return list(dict.fromkeys(deck_files))
+
+
+def card_key(card: Card) -> tuple:
+    """What makes two deck entries the same card lookup."""
+    return card.name.lower(), (card.version or "").lower(), card.collector_number
+
+
+def unique_cards(decks: List[Tuple[str, List[Card]]]) -> Tuple[List[Card], List[List[Tuple[int, int]]]]:
+    """The union of the cards of every deck, one Card per lookup, and each deck's (index, quantity) pairs into it."""
+    union: List[Card] = []
+    index_of: Dict[tuple, int] = {}
+    deck_keys = []
+    for _, cards in decks:
+        keys = []
+        for card in cards:
+            key = card_key(card)
+            if key not in index_of:
+                index_of[key] = len(union)
+                union.append(Card(name=card.name, version=card.version, collector_number=card.collector_number))
+            keys.append((index_of[key], card.quantity))
+        deck_keys.append(keys)
+    return union, deck_keys
+
+
+def token_counts(cards: Iterable[Card]) -> List[Tuple[Card, int]]:
+    """Every token the cards create, once, with the number of cards creating it, in order of first appearance."""
+    counts: Dict[int, List] = {}
+    for card in cards:
+        for token in card.tokens:
+            counts.setdefault(id(token), [token, 0])[1] += 1
+    return [(token, count) for token, count in counts.values()]
+
+
+def deck_from_union(union: List[Card], keys: List[Tuple[int, int]], with_tokens: bool,
+                    origins: Optional[Dict[int, Card]] = None) -> List[Card]:
+    """A deck's own cards, copied from the resolved union with the deck's quantities, followed by their tokens.
+
+    Each token appears once, with one copy per card of the deck creating it.
+    When given, origins maps the id of every copy to the union card (or token) it was copied from.
+    """
+    cards = []
+    for index, quantity in keys:
+        card = copy.copy(union[index])
+        card.quantity = quantity
+        cards.append(card)
+        if origins is not None:
+            origins[id(card)] = union[index]
+
+    tokens = []
+    for token, count in (token_counts(union[index] for index, _ in keys) if with_tokens else []):
+        tokens.append(copy.copy(token))
+        tokens[-1].quantity = count
+        if origins is not None:
+            origins[id(tokens[-1])] = token
+    return cards + tokens
@@ -0,0 +1,47 @@
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+
+class DirectoryIndex:
+    """Files directly inside a directory, looked up by key in O(1).
+
+    The listing is read again only when the directory's mtime changes, which
+    happens whenever a file is added, removed or renamed in it. A missing
+    directory is an empty index.
+    """
+
+    def __init__(self, directory: str, key: Callable[[str], str] = lambda file_name: file_name,
+                 extensions: Tuple[str, ...] = ()):
+        self.directory = os.path.abspath(directory)
+        self.key = key
+        self.extensions = extensions
+        self.files: Dict[str, str] = {}
+        self.mtime_ns: Optional[int] = None
+        self.lock = threading.Lock()
+
+    def __refresh__(self):
+        try:
+            mtime_ns = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            mtime_ns = -1
+        if mtime_ns == self.mtime_ns:
+            return
+
+        files = {}
+        if mtime_ns != -1:
+            for file_name in sorted(os.listdir(self.directory)):
+                if not self.extensions or file_name.lower().endswith(self.extensions):
+                    files.setdefault(self.key(file_name), os.path.join(self.directory, file_name))
+        self.files, self.mtime_ns = files, mtime_ns
+
+    def get(self, key: str) -> Optional[str]:
+        """Path of the file with this key, or None."""
+        with self.lock:
+            self.__refresh__()
+            return self.files.get(key)
+
+    def __len__(self) -> int:
+        with self.lock:
+            self.__refresh__()
+            return len(self.files)
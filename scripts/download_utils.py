@@ -0,0 +1,77 @@
+import os
+import re
+import requests
+from PIL import Image
+from scripts.constants import DOWNLOAD_CHUNK_SIZE, DOWNLOAD_RETRIES
+from scripts.metrics_utils import get_metrics
+
+
+def is_valid_image(path: str) -> bool:
+    """Check that an image file is complete by letting PIL verify its structure."""
+    try:
+        with Image.open(path) as img:
+            img.verify()
+        return True
+    except Exception:
+        return False
+
+
+def __expected_size__(response: requests.Response) -> int:
+    """Return the full size of the resource, or -1 when the server does not say."""
+    content_range = response.headers.get("Content-Range", "")
+    match = re.match(r"bytes \d+-\d+/(\d+)", content_range)
+    if match:
+        return int(match.group(1))
+
+    content_length = response.headers.get("Content-Length")
+    return int(content_length) if content_length and response.status_code == 200 else -1
+
+
+def download_file(url: str, path: str, session: requests.Session, retries: int = DOWNLOAD_RETRIES) -> bool:
+    """Download url to path through a temp file, resuming partial transfers with HTTP Range.
+
+    The file only appears at path once its size and content have been verified,
+    so a failed transfer never leaves a truncated image behind as a cache hit.
+    """
+    part_path = f"{path}.part"
+
+    for attempt in range(1, retries + 1):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        try:
+            with session.get(url, stream=True, headers=headers, timeout=30) as response:
+                if response.status_code == 416:
+                    # The partial file already holds the whole resource
+                    expected = offset
+                elif response.status_code in (200, 206):
+                    if response.status_code == 200:
+                        offset = 0
+                    expected = __expected_size__(response)
+
+                    with open(part_path, "ab" if offset else "wb") as f:
+                        for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                            f.write(chunk)
+                            get_metrics().count("download.bytes", len(chunk))
+                else:
+                    print(f"$ERROR: Failed to download {url} ({response.status_code})")
+                    return False
+
+        except requests.RequestException as e:
+            print(f"!WARNING: Download interrupted ({attempt}/{retries}): {url}: {e}")
+            get_metrics().count("download.retries")
+            continue
+
+        size = os.path.getsize(part_path)
+        if (expected >= 0 and size != expected) or not is_valid_image(part_path):
+            print(f"!WARNING: Incomplete or corrupt download ({attempt}/{retries}): {url}")
+            get_metrics().count("download.retries")
+            if expected < 0 or size >= expected:
+                os.remove(part_path)
+            continue
+
+        os.replace(part_path, path)
+        return True
+
+    print(f"$ERROR: Giving up on {url}")
+    return False
@@ -0,0 +1,66 @@
+import os
+import threading
+from typing import NamedTuple, Optional
+from scripts.constants import ENCODE_THREADS, JPEG_QUALITY, PAGE_FORMAT, PAGE_FORMATS, PNG_COMPRESS_LEVEL, WEBP_METHOD
+from scripts.metrics_utils import get_metrics
+
+PAGE_EXTENSIONS = {"png": ".png", "webp": ".webp", "jpeg": ".jpg"}
+# Default effort of each format and the range it accepts
+PAGE_EFFORTS = {"png": (PNG_COMPRESS_LEVEL, 0, 9), "webp": (WEBP_METHOD, 0, 6), "jpeg": (JPEG_QUALITY, 1, 100)}
+
+
+class PageEncoder(NamedTuple):
+    """How rendered pages are encoded.
+
+    effort is the zlib level of PNG pages, the libwebp method of lossless WebP
+    pages or the quality of JPEG pages. PNG pages are deflated on `threads`
+    threads; Pillow encodes WebP and JPEG pages on one.
+    """
+    page_format: str = PAGE_FORMAT
+    effort: int = PAGE_EFFORTS[PAGE_FORMAT][0]
+    threads: int = ENCODE_THREADS
+
+    @property
+    def extension(self) -> str:
+        return PAGE_EXTENSIONS[self.page_format]
+
+    def save(self, image: "Image.Image", path: str):
+        """Encode a full page canvas to path, which only appears once the file is complete."""
+        # Imported here so choosing an encoder on the command line does not load numpy
+        import numpy as np
+        from scripts.pngwriter_class import BAND_ROWS, PngWriter
+
+        with get_metrics().timed(f"page.encode.{self.page_format}"):
+            if self.page_format == "png":
+                # Handed over in bands of rows, so the canvas is never copied whole
+                band_rows = BAND_ROWS * self.threads
+                with PngWriter(path, image.width, image.height, self.effort, self.threads) as writer:
+                    for top in range(0, image.height, band_rows):
+                        writer.write(np.asarray(image.crop((0, top, image.width, min(top + band_rows, image.height)))))
+                return
+
+            tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp{self.extension}"
+            try:
+                if self.page_format == "webp":
+                    image.save(tmp_path, "WEBP", lossless=True, method=self.effort)
+                else:
+                    # 4:4:4, so thin text and cut lines keep their colour on proofs
+                    image.save(tmp_path, "JPEG", quality=self.effort, subsampling=0)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+
+def page_encoder(page_format: str = PAGE_FORMAT, effort: Optional[int] = None, threads: int = ENCODE_THREADS) -> PageEncoder:
+    """A PageEncoder with the format's default effort when none is given.
+
+    Raises ValueError for an unknown format or an effort out of the format's range.
+    """
+    if page_format not in PAGE_FORMATS:
+        raise ValueError(f"Unknown page format '{page_format}', expected one of {', '.join(PAGE_FORMATS)}")
+    default, lowest, highest = PAGE_EFFORTS[page_format]
+    effort = default if effort is None else effort
+    if not lowest <= effort <= highest:
+        raise ValueError(f"Effort of {page_format} pages must be between {lowest} and {highest}, got {effort}")
+    return PageEncoder(page_format, effort, max(1, threads))
@@ -0,0 +1,81 @@
+import os
+import hashlib
+import sqlite3
+import threading
+from PIL import Image
+from scripts.constants import HASH_INDEX_FILE
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    path TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (path, kind)
+) WITHOUT ROWID;
+"""
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of the raw file bytes."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def pixel_digest(path: str) -> str:
+    """SHA-256 of the decoded pixels, so re-encoded or renamed copies of an image hash the same."""
+    with Image.open(path) as img:
+        img.load()
+        digest = hashlib.sha256(f"{img.mode}:{img.size}".encode("utf-8"))
+        digest.update(img.tobytes())
+    return digest.hexdigest()
+
+
+HASHERS = {"file": file_digest, "pixels": pixel_digest}
+
+
+class FileHashIndex:
+    """Remembers content hashes by (path, size, mtime) so unchanged files are never hashed twice."""
+
+    def __init__(self, index_file: str = HASH_INDEX_FILE):
+        self.index_file = os.path.abspath(index_file)
+        self.local = threading.local()
+
+    def __conn__(self) -> sqlite3.Connection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+            conn = sqlite3.connect(self.index_file, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self.local.conn = conn
+        return conn
+
+    def get(self, path: str, kind: str = "pixels") -> str:
+        """Return the digest of a file, hashing it only when it changed since the last call."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        conn = self.__conn__()
+
+        row = conn.execute("SELECT size, mtime_ns, digest FROM hashes WHERE path = ? AND kind = ?", (path, kind)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+
+        digest = HASHERS[kind](path)
+        conn.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?)", (path, kind, stat.st_size, stat.st_mtime_ns, digest))
+        return digest
+
+
+__hash_index__ = None
+
+
+def get_hash_index() -> FileHashIndex:
+    """Return the shared hash index for the current cache directory."""
+    global __hash_index__
+    if __hash_index__ is None or __hash_index__.index_file != os.path.abspath(HASH_INDEX_FILE):
+        __hash_index__ = FileHashIndex()
+    return __hash_index__
@@ -0,0 +1,55 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from scripts.constants import SCRYFALL_REQUESTS_PER_SECOND, SCRYFALL_BURST, FETCH_WORKERS, DOWNLOAD_WORKERS
+from scripts.tokenbucket_class import TokenBucket
+
+# Scryfall asks clients to identify themselves and to stay around 10 requests per second
+HEADERS = {
+    "User-Agent": "print-mtg-proxy-cards/1.0",
+    "Accept": "application/json;q=0.9,*/*;q=0.8",
+}
+
+__rate_limiter__ = TokenBucket(SCRYFALL_REQUESTS_PER_SECOND, SCRYFALL_BURST)
+__session__ = None
+__image_session__ = None
+__session_lock__ = threading.Lock()
+
+
+def __new_session__(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(HEADERS)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Return the shared pooled session used for Scryfall API calls."""
+    global __session__
+    with __session_lock__:
+        if __session__ is None:
+            __session__ = __new_session__(FETCH_WORKERS)
+    return __session__
+
+
+def get_image_session() -> requests.Session:
+    """Return the shared pooled session used for image downloads."""
+    global __image_session__
+    with __session_lock__:
+        if __image_session__ is None:
+            __image_session__ = __new_session__(DOWNLOAD_WORKERS)
+    return __image_session__
+
+
+def api_get(url: str, **kwargs) -> requests.Response:
+    """GET a Scryfall API url, waiting for the global rate limiter first."""
+    __rate_limiter__.acquire()
+    return get_session().get(url, **kwargs)
+
+
+def api_post(url: str, **kwargs) -> requests.Response:
+    """POST to a Scryfall API url, waiting for the global rate limiter first."""
+    __rate_limiter__.acquire()
+    return get_session().post(url, **kwargs)
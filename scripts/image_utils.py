@@ -1,25 +1,111 @@
 import os
-from typing import List
-import torch
+import threading
+import json
+import time
+import hashlib
+from typing import List, Optional, Tuple
+import cv2
 import numpy as np
 from PIL import Image, ImageDraw
-from basicsr.archs.rrdbnet_arch import RRDBNet
-from realesrgan import RealESRGANer
-from scripts.constants import BLEED, CACHE_DIR, SCALE
+from scripts.constants import BLEED, BLEED_MODE, CACHE_DIR, SCALE, UPSCALE_DEVICE, UPSCALE_BATCH_SIZE, UPSCALE_WORKERS, UPSCALE_MODEL_PATH
 from scripts.card_class import Card
+from scripts.cache_utils import get_meta, set_meta
+from scripts.hash_utils import get_hash_index
+from scripts.metrics_utils import get_metrics, process_cpu_seconds
+from scripts.upscalepolicy_class import PASSTHROUGH, RESIZE, UPSCALE, UpscalePolicy
+
+# Everything applied to a card before the model sees it; part of the upscale cache key
+PREPROCESSING = {"alpha_background": "white", "border_width": 20, "border_region": (50, 0, 60, 5)}
    
-def __get_card_image_with_fixes__(image_path) -> Image:
-    print("-INFO: Fixing card RGB and borders")    
-    image = get_rgb_image(image_path)
-    image = fix_card_borders(image)
-    return image
+def load_card_for_upscale(image_path: str) -> Optional[np.ndarray]:
+    """Decode a card and repaint its border, as every card is before the model or a resize sees it."""
+    print("-INFO: Fixing card RGB and borders")
+    with get_metrics().timed("card.prepare"):
+        return prepare_card_array(image_path, border_width=PREPROCESSING["border_width"])
 
 
-def bleed_card_borders(image: Image, bleed: int = BLEED)-> Image:
+def save_image(image: np.ndarray, output_path: str):
+    """Save an RGB array as PNG to output_path, which only appears once the file is complete."""
+    # Written aside and renamed so an interrupted save never looks like a cached result
+    tmp_path = f"{output_path}.{os.getpid()}-{threading.get_ident()}.tmp.png"
+    Image.fromarray(image).save(tmp_path)
+    os.replace(tmp_path, output_path)
+
+
+def read_rgb_array(image_path: str) -> Optional[np.ndarray]:
+    """Decode an image to an RGB uint8 array, blending any alpha onto white like get_rgb_image."""
+    # imdecode instead of imread so non-ASCII paths work on Windows too
+    data = np.fromfile(image_path, dtype=np.uint8)
+    img = cv2.imdecode(data, cv2.IMREAD_UNCHANGED) if data.size else None
+    if img is None:
+        return None
+
+    if img.dtype != np.uint8:
+        img = (img >> 8).astype(np.uint8)  # 16-bit PNG
+    if img.ndim == 2:
+        return cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
+    if img.shape[2] == 3:
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+    rgb = cv2.cvtColor(img, cv2.COLOR_BGRA2RGB)
+    # Transparency is usually limited to the rounded corners, so only those rows are blended
+    alpha = img[:, :, 3]
+    rows = np.flatnonzero(alpha.min(axis=1) < 255)
+    if rows.size:
+        row_alpha = alpha[rows, :, None].astype(np.uint16)
+        rgb[rows] = (rgb[rows] * row_alpha + 255 * (255 - row_alpha) + 127) // 255
+    return rgb
+
+
+def border_color_array(rgb: np.ndarray) -> Tuple[int, int, int]:
+    """Average colour of the border sample region, same as card_border_color on an array."""
+    x1, y1, x2, y2 = PREPROCESSING["border_region"]
+    region = rgb[y1:y2, x1:x2].reshape(-1, 3)
+    return tuple(int(channel) for channel in region.sum(axis=0) // len(region))
+
+
+def prepare_card_array(image_path: str,
+                       border_width: int = 0,
+                       bleed: int = 0,
+                       size: Optional[Tuple[int, int]] = None,
+                       bleed_mode: str = BLEED_MODE) -> Optional[np.ndarray]:
+    """Flatten, repaint the border, add the bleed and resize a card in one pass over a single array.
+
+    Does the work of get_rgb_image, fix_card_borders, bleed_card_borders and a
+    resize without round trips through PIL. `bleed` is in source pixels and
+    `size` is the final (width, height) including the bleed. The bleed is the
+    border colour ("flat") or the replicated outermost pixels ("edge").
+    """
+    rgb = read_rgb_array(image_path)
+    if rgb is None:
+        return None
+
+    color = border_color_array(rgb)
+    if border_width:
+        # Same frame as fix_card_borders: ImageDraw puts the right and bottom edges one pixel off the image
+        rgb[:border_width] = color
+        rgb[:, :border_width] = color
+        if border_width > 1:
+            rgb[-(border_width - 1):] = color
+            rgb[:, -(border_width - 1):] = color
+
+    if bleed:
+        if bleed_mode == "edge":
+            rgb = cv2.copyMakeBorder(rgb, bleed, bleed, bleed, bleed, cv2.BORDER_REPLICATE)
+        else:
+            rgb = cv2.copyMakeBorder(rgb, bleed, bleed, bleed, bleed, cv2.BORDER_CONSTANT, value=color)
+
+    if size and (rgb.shape[1], rgb.shape[0]) != tuple(size):
+        interpolation = cv2.INTER_AREA if size[0] < rgb.shape[1] else cv2.INTER_CUBIC
+        rgb = cv2.resize(rgb, tuple(size), interpolation=interpolation)
+    return rgb
+
+
+def card_border_color(image: Image) -> tuple:
     ##### thrief border color
     # Define the coordinates of the region to extract (x1, y1, x2, y2)
     # Example: top-left (x1, y1) and bottom-right (x2, y2)
-    region = (50, 0, 60, 5)  # Modify as per your desired region
+    region = PREPROCESSING["border_region"]  # Modify as per your desired region
 
     # Crop the image to the region
     cropped_image = image.crop(region)
@@ -31,7 +117,11 @@ def bleed_card_borders(image: Image, bleed: int = BLEED)-> Image:
     pixels = list(cropped_image.getdata())
 
     # Calculate the average color of the region
-    avg_color = tuple(sum(col) // len(col) for col in zip(*pixels))    
+    return tuple(sum(col) // len(col) for col in zip(*pixels))
+
+
+def bleed_card_borders(image: Image, bleed: int = BLEED)-> Image:
+    avg_color = card_border_color(image)
     
     # Create a drawing context
     image_with_bleed = Image.new("RGB", (image.width + 2 * bleed, image.height + 2 * bleed), avg_color)
@@ -40,22 +130,7 @@ def bleed_card_borders(image: Image, bleed: int = BLEED)-> Image:
 
 
 def fix_card_borders(image: Image, border_width: int = 20)-> Image:
-    ##### thrief border color
-    # Define the coordinates of the region to extract (x1, y1, x2, y2)
-    # Example: top-left (x1, y1) and bottom-right (x2, y2)
-    region = (50, 0, 60, 5)  # Modify as per your desired region
-
-    # Crop the image to the region
-    cropped_image = image.crop(region)
-
-    # Convert the cropped image to RGB (in case it's in another format)
-    cropped_image = cropped_image.convert("RGB")
-
-    # Get the pixel data from the cropped image
-    pixels = list(cropped_image.getdata())
-
-    # Calculate the average color of the region
-    avg_color = tuple(sum(col) // len(col) for col in zip(*pixels))    
+    avg_color = card_border_color(image)
     
     # Create a drawing context
     draw = ImageDraw.Draw(image)
@@ -88,64 +163,117 @@ def get_rgb_image(image_path: str) -> Image:
         return pil_img_rgb
     return pil_img
 
-def upscale_image(cards: List[Card]):
-    # Load the Real-ESRGAN model
-    #model_path = "https://github.com/xinntao/Real-ESRGAN/releases/download/v0.1.0/RealESRGAN_x4plus.pth" 
-    #model_path = "https://github.com/xinntao/Real-ESRGAN/releases/download/v0.2.5.0/realesr-animevideov3.pth" 
-    #model_path = "weights\\RealESRGAN_x4plus.pth" 
-    #model_path = "weights\\ESRGAN_SRx4_DF2KOST_official-ff704c30.pth" 
-    model_path = "weights\\RealESRGAN_x2plus.pth" 
-    scale_factor = SCALE
-
-    # Initialize the RealESRGAN model
-    device = torch.device('cuda')# if torch.cuda.is_available() else 'cpu')
-    #model = RRDBNet(num_in_ch=3, num_out_ch=3)#, num_feat=64, num_block=23, num_grow_ch=32, scale=4)
-    model = RRDBNet(num_in_ch=3, num_out_ch=3, num_feat=64, num_block=23, num_grow_ch=32, scale=scale_factor)
-    model.eval()
-    model = model.to(device)
-    realESRGANer = RealESRGANer(scale=scale_factor, model_path=model_path, model=model, tile=0, tile_pad=10, pre_pad=0, half=False, device=device)
-        
+def upscale_key(image_path: str, model_id: str, scale: int = SCALE) -> str:
+    """Cache key of an upscaled image: source pixels, model, scale and preprocessing."""
+    key_data = json.dumps([get_hash_index().get(image_path, "pixels"), model_id, scale, PREPROCESSING])
+    return hashlib.sha256(key_data.encode("utf-8")).hexdigest()[:32]
+
+
+def upscale_image(cards: List[Card],
+                  device: str = UPSCALE_DEVICE,
+                  batch_size: int = UPSCALE_BATCH_SIZE,
+                  workers: int = UPSCALE_WORKERS,
+                  tile: Optional[int] = None,
+                  threads: Optional[int] = None,
+                  upscaler: Optional["Upscaler"] = None,
+                  policy: Optional[UpscalePolicy] = None):
+    """Bring every card image to print resolution, with Real-ESRGAN where the policy asks for it.
 
+    The policy picks, per card, the model, a Lanczos resize or passthrough from
+    the source size and quality score. Model runs go to CUDA or CPU. Same-sized
+    images are batched per forward pass, tiles are sized to free memory unless
+    `tile` is given, and with workers > 1 the batches are spread over a process
+    pool holding one model per worker. Cards for the model are decoded one batch
+    at a time, so memory grows with the batch size rather than the deck. The
+    cards sent down each path are added to the policy's tally, summed up once
+    per run by upscale_report.
+    """
     output_folder = os.path.join(CACHE_DIR, "UP")
     # Ensure the output folder exists
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
+    policy = policy or UpscalePolicy()
+
+    # Results are keyed by content, so renamed or re-downloaded copies are processed once
+    # and a changed source, model, method or scale never reuses a stale result
+    model_id = None
+    scale = upscaler.scale if upscaler else SCALE
+
+    metrics = get_metrics()
+    jobs = []
+    queued = set()
+    counts = {UPSCALE: 0, RESIZE: 0, PASSTHROUGH: 0}
+    cached = 0
     for card in cards:
-        # Load the RGB image    
         img_path = card.image_path
+        with Image.open(img_path) as img:
+            width, height = img.size
+        path = policy.choose(width, height, card.image_quality_score, card.image_quality)
 
-        # Generate the output file path
-        base_filename = os.path.basename(img_path)
-        filename, ext = os.path.splitext(base_filename)
-        filename = f"{filename}[upscaled]{ext}"
-        output_path = os.path.join(output_folder, filename)
+        if path == UPSCALE and model_id is None:
+            # torch and basicsr take seconds to import, so they are only loaded once a card needs the model
+            from scripts.upscale_utils import model_identity
+            model_id = upscaler.identity if upscaler else model_identity(UPSCALE_MODEL_PATH)
+
+        if path == UPSCALE:
+            output_path = os.path.join(output_folder, f"{upscale_key(img_path, model_id, scale)}.png")
+        elif path == RESIZE:
+            output_path = os.path.join(output_folder, f"{upscale_key(img_path, 'resize:lanczos4', scale)}.png")
+        else:
+            output_path = os.path.join(output_folder, f"{upscale_key(img_path, PASSTHROUGH, 1)}.png")
         card.image_path = output_path
 
-        if os.path.exists(output_path):
-            print(f"-INFO: Image already upscaled: {filename}")
+        if os.path.exists(output_path) or output_path in queued:
+            print(f"-INFO: Image already upscaled: {card.name}")
+            cached += 1
+            metrics.count("upscale_cache.hit")
+            continue
+
+        metrics.count("upscale_cache.miss")
+        queued.add(output_path)
+        counts[path] += 1
+        if path == UPSCALE:
+            # Decoded when its batch runs, see run_batches
+            jobs.append((img_path, output_path, (width, height)))
             continue
 
-        img = __get_card_image_with_fixes__(img_path)
-         
+        img = load_card_for_upscale(img_path)
         if img is None:
             print(f"$Error: Unable to load image at {img_path}")
             continue
-        
-        # Convert the PIL image to a NumPy array (OpenCV/Real-ESRGAN compatible)
-        img_np = np.array(img)
 
-        # Upscale the image using the enhance method
-        upscaled_img, _ = realESRGANer.enhance(img_np, outscale=scale_factor)
-        
-        # Convert back to PIL Image for further processing
-        img = Image.fromarray(upscaled_img)
+        with metrics.timed(f"card.{path}"):
+            if path == RESIZE:
+                img = cv2.resize(img, (img.shape[1] * scale, img.shape[0] * scale), interpolation=cv2.INTER_LANCZOS4)
+            save_image(img, output_path)
+        print(f"-INFO: {path.capitalize()}: {card.name} ({width}x{height}, score {card.image_quality_score:.1f})")
+
+    # Model time per card is remembered per device so skipped cards can be priced even when the model did not run
+    seconds_key = f"upscale_seconds_per_card:{device}"
+    if jobs:
+        from scripts.upscale_utils import Upscaler, batch_by_size, run_batches, run_batches_in_pool
+        started_at, started_cpu = time.perf_counter(), process_cpu_seconds()
+        batches = batch_by_size(jobs, batch_size)
+        if workers > 1 and upscaler is None:
+            run_batches_in_pool(batches, workers, device=device, tile=tile, threads=threads)
+        else:
+            upscaler = upscaler or Upscaler(device=device, tile=tile, threads=threads)
+            run_batches(upscaler, batches)
+        model_seconds = time.perf_counter() - started_at
+        # Batched forward passes have no per-card time, so the model is recorded once for all its cards
+        metrics.record("model.upscale", model_seconds, process_cpu_seconds() - started_cpu)
+        set_meta(seconds_key, str(model_seconds / len(jobs)))
+
+    for path, count in counts.items():
+        if count:
+            metrics.count(f"upscale_policy.{path}", count)
 
-        #resized_img = img.resize((CARD_WIDTH, CARD_HEIGHT), Image.BICUBIC)
-        
-        # Save the upscaled image
-        #resized_img.save(output_path)
-        img.save(output_path)
+    # Streaming calls this once per handful of cards; the run is summed up once, see upscale_report
+    policy.tally(counts, cached)
 
-        print(f"Upscaled image saved to: {output_path}")
 
+def upscale_report(policy: UpscalePolicy, device: str = UPSCALE_DEVICE) -> Optional[str]:
+    """The policy's summary of the run, with the model time it avoided on this device; None before any card."""
+    seconds_per_card = get_meta(f"upscale_seconds_per_card:{device}")
+    return policy.report(float(seconds_per_card) if seconds_per_card else None)
@@ -0,0 +1,39 @@
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+from scripts.card_class import Card
+from scripts.metrics_utils import get_metrics
+
+
+class ImageSourceChain:
+    """Finds a card's image by asking each source in turn, e.g. custom art, a local mirror, the cache, the network.
+
+    A source is a name and a function returning a local image path for the card,
+    or None to pass the card on to the next source. Hits and misses are counted
+    per source, here and in the run's metrics as image_source.<name>.hit/miss.
+    """
+
+    def __init__(self, sources: List[Tuple[str, Callable[[Card], Optional[str]]]]):
+        self.sources = sources
+        self.hits: Dict[str, int] = {name: 0 for name, _ in sources}
+        self.misses: Dict[str, int] = {name: 0 for name, _ in sources}
+        self.lock = threading.Lock()
+
+    def resolve(self, card: Card) -> Optional[str]:
+        """Path of the card's image from the first source that has it, or None when none does."""
+        metrics = get_metrics()
+        for name, find in self.sources:
+            image_path = find(card)
+            with self.lock:
+                if image_path:
+                    self.hits[name] += 1
+                else:
+                    self.misses[name] += 1
+            metrics.count(f"image_source.{name}.{'hit' if image_path else 'miss'}")
+            if image_path:
+                return image_path
+        return None
+
+    def report(self) -> str:
+        with self.lock:
+            counts = [f"{name} {self.hits[name]}/{self.hits[name] + self.misses[name]}" for name, _ in self.sources]
+        return f"Image sources (hits/lookups): {', '.join(counts)}"
@@ -0,0 +1,325 @@
+import os
+import re
+import json
+import zlib
+import time
+import sqlite3
+import threading
+import unicodedata
+from typing import Any, Dict, Iterator, List, Optional, TextIO
+from urllib.parse import urlparse, parse_qs, unquote
+from scripts.constants import CARD_INDEX_FILE
+
+# Only the fields the pipeline reads are kept, which keeps the index a fraction of the dump size
+CARD_FIELDS = ("id", "oracle_id", "name", "printed_name", "lang", "set", "collector_number", "released_at",
+               "type_line", "printed_type_line", "image_status", "image_uris", "card_faces", "all_parts", "uri")
+FACE_FIELDS = ("name", "printed_name", "type_line", "printed_type_line", "image_uris")
+
+# Number of rarest query trigrams used to collect fuzzy candidates
+FUZZY_PROBE_TRIGRAMS = 6
+# Trigram similarity a fuzzy match needs, and its lead over the next card; below either the name is not found,
+# like a 404 from Scryfall, so unknown and ambiguous names fall back to the API instead of becoming another card
+FUZZY_MIN_SCORE = 0.5
+FUZZY_MIN_MARGIN = 0.1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    id TEXT PRIMARY KEY,
+    oracle_id TEXT,
+    name_norm TEXT NOT NULL,
+    printed_name_norm TEXT,
+    lang TEXT NOT NULL,
+    set_code TEXT NOT NULL,
+    collector_number TEXT NOT NULL,
+    released_at TEXT,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS names (
+    name_id INTEGER PRIMARY KEY,
+    name_norm TEXT NOT NULL UNIQUE,
+    card_name_norm TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS trigrams (
+    tri TEXT NOT NULL,
+    name_id INTEGER NOT NULL,
+    PRIMARY KEY (tri, name_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS trigram_counts (
+    tri TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS cards_name ON cards (name_norm, lang, released_at);
+CREATE INDEX IF NOT EXISTS cards_printed_name ON cards (printed_name_norm);
+CREATE INDEX IF NOT EXISTS cards_printing ON cards (set_code, collector_number, lang);
+CREATE INDEX IF NOT EXISTS cards_oracle ON cards (oracle_id, lang);
+"""
+
+
+def normalize_name(name: str) -> str:
+    """Lower-case a card name, strip accents and collapse punctuation to single spaces."""
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(c for c in name if not unicodedata.combining(c)).lower()
+    return re.sub(r"[^a-z0-9/]+", " ", name).strip()
+
+
+def trigrams(name_norm: str) -> set:
+    padded = f"  {name_norm} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def iter_json_array(f: TextIO, chunk_size: int = 1024 * 1024) -> Iterator[Dict[str, Any]]:
+    """Yield the objects of a top-level JSON array one by one, holding only about one chunk in memory."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    started = False
+
+    while True:
+        chunk = f.read(chunk_size)
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+        while True:
+            # Skip whitespace, the opening bracket and separators between objects
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,[":
+                started = started or buffer[pos] == "["
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+            if pos >= len(buffer):
+                break
+
+            try:
+                obj, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break  # Object continues in the next chunk
+
+            yield obj
+            pos = end
+
+        if not chunk:
+            if not started:
+                raise ValueError("Bulk data file is not a JSON array")
+            return
+
+
+def __compact_card__(card_data: Dict[str, Any]) -> Dict[str, Any]:
+    compact = {k: card_data[k] for k in CARD_FIELDS if k in card_data}
+    if "card_faces" in compact:
+        compact["card_faces"] = [{k: face[k] for k in FACE_FIELDS if k in face} for face in compact["card_faces"]]
+    return compact
+
+
+def ingest_bulk_data(bulk_file: str, index_file: str = CARD_INDEX_FILE, batch_size: int = 5000) -> int:
+    """Stream a Scryfall bulk-data dump (default_cards / all_cards) into a local card index."""
+    started_at = time.perf_counter()
+    tmp_file = f"{index_file}.tmp"
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+    os.makedirs(os.path.dirname(os.path.abspath(index_file)), exist_ok=True)
+
+    conn = sqlite3.connect(tmp_file)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executescript(SCHEMA)
+
+    total = 0
+    rows = []
+    with open(bulk_file, "r", encoding="utf-8") as f:
+        for card_data in iter_json_array(f):
+            if card_data.get("object") != "card":
+                continue
+
+            printed_name = card_data.get("printed_name")
+            rows.append((
+                card_data["id"],
+                card_data.get("oracle_id"),
+                normalize_name(card_data["name"]),
+                normalize_name(printed_name) if printed_name else None,
+                card_data.get("lang", "en"),
+                card_data["set"].lower(),
+                card_data["collector_number"].lower(),
+                card_data.get("released_at"),
+                zlib.compress(json.dumps(__compact_card__(card_data), separators=(",", ":")).encode("utf-8")),
+            ))
+
+            if len(rows) >= batch_size:
+                conn.executemany("INSERT OR REPLACE INTO cards VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                conn.commit()
+                total += len(rows)
+                rows = []
+                print(f"-INFO: Indexed {total} cards")
+
+    conn.executemany("INSERT OR REPLACE INTO cards VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    total += len(rows)
+    conn.executescript(INDEXES)
+
+    # Fuzzy index over English names and printed (translated) names, both pointing at the English name
+    conn.execute("INSERT OR IGNORE INTO names (name_norm, card_name_norm) SELECT DISTINCT name_norm, name_norm FROM cards")
+    conn.execute("INSERT OR IGNORE INTO names (name_norm, card_name_norm) "
+                 "SELECT DISTINCT printed_name_norm, name_norm FROM cards WHERE printed_name_norm IS NOT NULL")
+    trigram_rows = ((tri, name_id) for name_id, name_norm in conn.execute("SELECT name_id, name_norm FROM names").fetchall()
+                    for tri in trigrams(name_norm))
+    conn.executemany("INSERT OR IGNORE INTO trigrams VALUES (?, ?)", trigram_rows)
+    conn.execute("INSERT INTO trigram_counts SELECT tri, COUNT(*) FROM trigrams GROUP BY tri")
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+    os.replace(tmp_file, index_file)
+    print(f"-INFO: Indexed {total} cards into {index_file} in {time.perf_counter() - started_at:.1f}s")
+    return total
+
+
+class CardIndex:
+    """Read-only lookups over an index built by ingest_bulk_data, shaped like the Scryfall API."""
+
+    def __init__(self, index_file: str = CARD_INDEX_FILE):
+        self.index_file = os.path.abspath(index_file)
+        self.local = threading.local()
+
+    def __conn__(self) -> sqlite3.Connection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.index_file}?mode=ro", uri=True)
+            self.local.conn = conn
+        return conn
+
+    def __first__(self, query: str, args: tuple) -> Optional[Dict[str, Any]]:
+        row = self.__conn__().execute(query, args).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def by_id(self, card_id: str) -> Optional[Dict[str, Any]]:
+        return self.__first__("SELECT data FROM cards WHERE id = ?", (card_id,))
+
+    def sample(self, count: int, rng: "numpy.random.Generator") -> List[Dict[str, Any]]:
+        """Up to count random English printings with images, drawn in one go over the index's row ids."""
+        max_rowid = self.__conn__().execute("SELECT MAX(rowid) FROM cards").fetchone()[0] or 0
+        if not max_rowid:
+            return []
+
+        # Drawn with headroom for rows in other languages or without images, which are skipped
+        rowids = (rng.choice(max_rowid, size=min(max_rowid, count * 4), replace=False) + 1).tolist()
+        rows = dict(self.__conn__().execute(
+            f"SELECT rowid, data FROM cards WHERE lang = 'en' AND rowid IN ({','.join('?' * len(rowids))})", rowids).fetchall())
+        cards = [json.loads(zlib.decompress(rows[rowid])) for rowid in rowids if rowid in rows]
+        return [card_data for card_data in cards
+                if "image_uris" in card_data or all("image_uris" in face for face in card_data.get("card_faces", [{}]))][:count]
+
+    def printing(self, set_code: str, collector_number: str, lang: str = "en") -> Optional[Dict[str, Any]]:
+        """Answer /cards/{set}/{number}[/{lang}]."""
+        return self.__first__("SELECT data FROM cards WHERE set_code = ? AND collector_number = ? AND lang = ?",
+                              (set_code.lower(), collector_number.lower(), lang))
+
+    def exact(self, name: str, set_code: str = None) -> Optional[Dict[str, Any]]:
+        """Newest English printing of a card by exact (normalized) English or printed name."""
+        name_norm = normalize_name(name)
+        row = self.__conn__().execute("SELECT card_name_norm FROM names WHERE name_norm = ?", (name_norm,)).fetchone()
+        if row is None:
+            return None
+        return self.__newest__(row[0], set_code)
+
+    def __newest__(self, name_norm: str, set_code: str = None) -> Optional[Dict[str, Any]]:
+        if set_code:
+            return self.__first__("SELECT data FROM cards WHERE name_norm = ? AND set_code = ? "
+                                  "ORDER BY lang = 'en' DESC, released_at DESC LIMIT 1", (name_norm, set_code.lower()))
+        return self.__first__("SELECT data FROM cards WHERE name_norm = ? AND lang = 'en' "
+                              "ORDER BY released_at DESC LIMIT 1", (name_norm,))
+
+    def fuzzy(self, name: str, set_code: str = None) -> Optional[Dict[str, Any]]:
+        """Answer /cards/named?fuzzy=: exact match first, then the closest name by trigram similarity.
+
+        Returns None when no name is similar enough or two cards are about as close, see FUZZY_MIN_SCORE.
+        """
+        card_data = self.exact(name, set_code)
+        if card_data is not None:
+            return card_data
+
+        name_norm = normalize_name(name)
+        query_trigrams = trigrams(name_norm)
+        conn = self.__conn__()
+
+        # Probe with the rarest trigrams only, so common ones like " th" don't pull in half the index
+        placeholders = ",".join("?" * len(query_trigrams))
+        rare = [tri for tri, in conn.execute(
+            f"SELECT tri FROM trigram_counts WHERE tri IN ({placeholders}) ORDER BY count LIMIT ?",
+            (*query_trigrams, FUZZY_PROBE_TRIGRAMS))]
+        if not rare:
+            return None
+
+        placeholders = ",".join("?" * len(rare))
+        candidates = conn.execute(
+            f"SELECT DISTINCT n.name_norm, n.card_name_norm FROM trigrams t JOIN names n ON n.name_id = t.name_id "
+            f"WHERE t.tri IN ({placeholders})", rare).fetchall()
+
+        # Best score per card, since printed names in other languages point at the same card
+        scores: Dict[str, float] = {}
+        for candidate_norm, card_name_norm in candidates:
+            candidate_trigrams = trigrams(candidate_norm)
+            score = len(query_trigrams & candidate_trigrams) / len(query_trigrams | candidate_trigrams)
+            scores[card_name_norm] = max(score, scores.get(card_name_norm, 0.0))
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        if not ranked or ranked[0][1] < FUZZY_MIN_SCORE:
+            return None
+        if len(ranked) > 1 and ranked[0][1] - ranked[1][1] < FUZZY_MIN_MARGIN:
+            return None
+        return self.__newest__(ranked[0][0], set_code)
+
+    def lookup(self, url: str, params: Dict[str, str] = None) -> Optional[Dict[str, Any]]:
+        """Answer a Scryfall API url (/cards/named, /cards/{set}/{number}[/{lang}], /cards/{id})."""
+        parsed = urlparse(url)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        query.update(params or {})
+        parts = [unquote(p) for p in parsed.path.strip("/").split("/")]
+        if not parts or parts[0] != "cards":
+            return None
+
+        if parts[1:] == ["named"]:
+            if "exact" in query:
+                return self.exact(query["exact"], query.get("set"))
+            if "fuzzy" in query:
+                return self.fuzzy(query["fuzzy"], query.get("set"))
+            return None
+
+        if len(parts) == 2:
+            return self.by_id(parts[1])
+
+        if len(parts) in (3, 4):
+            return self.printing(parts[1], parts[2], parts[3] if len(parts) == 4 else "en")
+
+        return None
+
+
+__card_index__ = None
+__card_index_lock__ = threading.Lock()
+__offline__ = False
+
+
+def use_card_index(index_file: str = CARD_INDEX_FILE, offline: bool = False) -> Optional[CardIndex]:
+    """Select the offline index for lookups; offline=True also disables the HTTP fallback."""
+    global __card_index__, __offline__
+    with __card_index_lock__:
+        __card_index__ = CardIndex(index_file) if os.path.exists(index_file) else None
+        __offline__ = offline
+    if offline and __card_index__ is None:
+        print(f"!WARNING: Offline mode without a card index at {index_file}, no card can be resolved")
+    return __card_index__
+
+
+def get_card_index() -> Optional[CardIndex]:
+    """Return the offline card index, opening the default one when it exists."""
+    global __card_index__
+    with __card_index_lock__:
+        if __card_index__ is None and os.path.exists(CARD_INDEX_FILE):
+            __card_index__ = CardIndex(CARD_INDEX_FILE)
+    return __card_index__
+
+
+def is_offline() -> bool:
+    return __offline__
@@ -0,0 +1,35 @@
+import threading
+from scripts.constants import SCALE, UPSCALE_MODEL_PATH
+
+
+class LazyUpscaler:
+    """Stands in for an Upscaler and only builds it, importing torch, once a model pass needs it.
+
+    Its identity and scale are known without the model, so cached and resized
+    cards never load it. Attributes it does not have are taken from the real
+    Upscaler, built on first use with the given keyword arguments.
+    """
+
+    def __init__(self, model_path: str = UPSCALE_MODEL_PATH, **upscaler_kwargs):
+        self.model_path = model_path
+        self.scale = upscaler_kwargs.get("scale", SCALE)
+        self.upscaler_kwargs = upscaler_kwargs
+        self.upscaler = None
+        self.build_lock = threading.Lock()
+
+    @property
+    def identity(self) -> str:
+        if self.upscaler is not None:
+            return self.upscaler.identity
+        from scripts.upscale_utils import model_identity
+        return model_identity(self.model_path)
+
+    def __getattr__(self, name: str):
+        # Only called for attributes LazyUpscaler does not define itself
+        if name in ("upscaler", "build_lock", "model_path", "upscaler_kwargs") or name.startswith("__"):
+            raise AttributeError(name)
+        with self.build_lock:
+            if self.upscaler is None:
+                from scripts.upscale_utils import Upscaler
+                self.upscaler = Upscaler(model_path=self.model_path, **self.upscaler_kwargs)
+        return getattr(self.upscaler, name)
@@ -0,0 +1,62 @@
+import os
+import json
+import hashlib
+from typing import Dict, List
+from scripts.constants import BLEED, CARD_HEIGHT, CARD_SPACING, CARD_WIDTH, COLLAGE_COLOR, DPI, SCALE
+from scripts.hash_utils import get_hash_index
+from scripts.render_utils import CUTLINE_COLOR, CUTLINE_OFFSET, CUTLINE_WIDTH
+
+# Bump when the way a page is rendered changes, so every cached page is rebuilt once
+MANIFEST_VERSION = 1
+
+
+def manifest_path(output_dir: str, deck_name: str) -> str:
+    return os.path.join(output_dir, f"{deck_name}.manifest.json")
+
+
+def load_manifest(path: str) -> Dict[str, Dict[str, str]]:
+    """Return the build manifest of a deck: input hashes of its page artifacts and PDFs by file name.
+
+    Directly drawn PDFs also keep the hash of each of their pages under "pdf_pages".
+    """
+    empty = {"version": MANIFEST_VERSION, "pages": {}, "pdfs": {}, "pdf_pages": {}}
+    if not os.path.exists(path):
+        return empty
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        print(f"!WARNING: Unreadable build manifest, rebuilding every page: {path}")
+        return empty
+    if manifest.get("version") != MANIFEST_VERSION:
+        return empty
+    manifest.setdefault("pdf_pages", {})
+    return manifest
+
+
+def save_manifest(path: str, manifest: Dict[str, Dict[str, str]]):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def page_input_hash(image_paths: List[str], layout: tuple, page_size, settings: Dict[str, object]) -> str:
+    """Hash of everything that determines a page: card image contents in slot order, layout, page size and settings."""
+    hash_index = get_hash_index()
+    key_data = json.dumps({
+        "version": MANIFEST_VERSION,
+        "images": [hash_index.get(image_path, "file") for image_path in image_paths],
+        "layout": list(layout),
+        "page_size": str(page_size),
+        "constants": [CARD_WIDTH, CARD_HEIGHT, BLEED, CARD_SPACING, COLLAGE_COLOR, DPI, SCALE,
+                      CUTLINE_COLOR, CUTLINE_WIDTH, CUTLINE_OFFSET],
+        "settings": settings,
+    }, sort_keys=True)
+    return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+
+def deck_input_hash(page_hashes: List[str], settings: Dict[str, object]) -> str:
+    """Hash of a whole document, from its pages in order."""
+    key_data = json.dumps([page_hashes, settings], sort_keys=True)
+    return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
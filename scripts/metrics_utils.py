@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_bytes(children: bool = False) -> Optional[int]:
+    """Peak resident memory of this process (or of its finished child processes), when the platform tells."""
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+        # ru_maxrss is in KiB on Linux and in bytes on macOS
+        return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+    if children:
+        return None
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss)
+    except ImportError:
+        return None
+
+
+def process_cpu_seconds() -> float:
+    """CPU time of this process plus its children that have exited, such as finished pool workers."""
+    times = os.times()
+    return time.process_time() + times.children_user + times.children_system
+
+
+class Metrics:
+    """Thread-safe registry of stage and per-item timings, counters and peak memory for one run.
+
+    Stages (fetch, download, ...) record wall time and the CPU time of the whole
+    process, pool workers included once they exit. Per-item operations run on
+    thread pools, so they record the CPU time of their own thread.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.perf_counter()
+        self.timings: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, int] = {}
+
+    def record(self, name: str, wall: float, cpu: float):
+        with self.lock:
+            timing = self.timings.setdefault(name, {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "max_wall_seconds": 0.0})
+            timing["calls"] += 1
+            timing["wall_seconds"] += wall
+            timing["cpu_seconds"] += cpu
+            timing["max_wall_seconds"] = max(timing["max_wall_seconds"], wall)
+
+    def count(self, name: str, value: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def stage(self, name: str, timings: Optional[Dict[str, float]] = None):
+        """Time a pipeline stage; its wall seconds are also added to `timings` when given."""
+        wall, cpu = time.perf_counter(), process_cpu_seconds()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            self.record(f"stage.{name}", wall, process_cpu_seconds() - cpu)
+            if timings is not None:
+                timings[name] = timings.get(name, 0.0) + wall
+
+    @contextmanager
+    def timed(self, name: str):
+        """Time one per-item operation on the current thread."""
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - wall, time.thread_time() - cpu)
+
+    def merge(self, recorded: dict):
+        """Add the timings and counters of a snapshot taken elsewhere, e.g. in a pool worker, see collect_metrics."""
+        with self.lock:
+            for name, recorded_timing in recorded["timings"].items():
+                timing = self.timings.setdefault(name, {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "max_wall_seconds": 0.0})
+                timing["calls"] += recorded_timing["calls"]
+                timing["wall_seconds"] += recorded_timing["wall_seconds"]
+                timing["cpu_seconds"] += recorded_timing["cpu_seconds"]
+                timing["max_wall_seconds"] = max(timing["max_wall_seconds"], recorded_timing["max_wall_seconds"])
+            for name, value in recorded["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            timings = {name: {key: round(value, 4) if isinstance(value, float) else value for key, value in timing.items()}
+                       for name, timing in sorted(self.timings.items())}
+            counters = dict(sorted(self.counters.items()))
+        peak, children_peak = peak_rss_bytes(), peak_rss_bytes(children=True)
+        return {
+            "wall_seconds": round(time.perf_counter() - self.started_at, 4),
+            "cpu_seconds": round(process_cpu_seconds(), 4),
+            "peak_rss_mb": round(peak / 1024 ** 2, 1) if peak else None,
+            "peak_children_rss_mb": round(children_peak / 1024 ** 2, 1) if children_peak else None,
+            "timings": timings,
+            "counters": counters,
+        }
+
+    def write(self, path: str, extra: Optional[dict] = None):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({**self.snapshot(), **(extra or {})}, f, indent=2)
+        print(f"-INFO: Metrics written to {path}")
+
+
+__metrics__ = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """Return the metrics of the current run."""
+    return __metrics__
+
+
+def reset_metrics() -> Metrics:
+    global __metrics__
+    __metrics__ = Metrics()
+    return __metrics__
+
+
+def collect_metrics(function: Callable, *args) -> Tuple[Any, dict]:
+    """Run function in a pool worker on an empty registry and return its result with the snapshot of what it recorded.
+
+    Metrics recorded in a worker process stay there; the parent adds the snapshot with Metrics.merge.
+    """
+    metrics = reset_metrics()
+    return function(*args), metrics.snapshot()
+
+
+@contextmanager
+def profiled(output_file: Optional[str], top: int = 25):
+    """Run the body under cProfile and tracemalloc; writes pstats to output_file and prints the top entries."""
+    if not output_file:
+        yield {}
+        return
+
+    import cProfile
+    import pstats
+    import tracemalloc
+
+    results = {}
+    tracemalloc.start()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield results
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        profiler.dump_stats(output_file)
+        print(f"-INFO: Profile written to {output_file}")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(top)
+
+        print(f"-INFO: Python heap peak {peak / 1024 ** 2:.1f} MB; largest allocations still held:")
+        for stat in snapshot.statistics("lineno")[:10]:
+            print(f"    {stat}")
+        results["tracemalloc_peak_mb"] = round(peak / 1024 ** 2, 1)
+        results["tracemalloc_current_mb"] = round(current / 1024 ** 2, 1)
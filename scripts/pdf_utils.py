@@ -1,24 +1,24 @@
-from typing import List
-from reportlab.lib.pagesizes import A4, A3
+import os
+import json
+import hashlib
+from typing import Dict, Iterable, List, Tuple
+from reportlab import rl_config
 from reportlab.pdfgen import canvas
 from PIL import Image
-from scripts.constants import MARGIN_DPI, SCALE
+from scripts.constants import A3, A4, BLEED, BLEED_MODE, CACHE_DIR, CARD_HEIGHT, CARD_WIDTH, MARGIN_DPI, SCALE
 from scripts.pagesizeenum_class import PageSizeEnum
+from scripts.hash_utils import get_hash_index
+from scripts.metrics_utils import get_metrics
+from scripts.pdfwriter_class import PdfWriter
+from scripts.image_utils import card_border_color, prepare_card_array, save_image
+from scripts.render_utils import CUTLINE_COLOR, CUTLINE_WIDTH, PageLayout, cut_line_segments, slot_position
 
-def convert_images_to_pdf(images: List[str], output_pdf: str, page_size: PageSizeEnum):
-    """
-    Converts a list of images to a PDF file with specified page size.
-    Args:
-        images (list): List of file paths to the images to be converted.
-        output_pdf (str): File path for the output PDF.
-        page_size (str): Page size for the PDF. Supported values are "A4" and "A3".
-    Raises:
-        ValueError: If an unsupported page size is provided.
-        Exception: If there is an error processing an image or adding the card list.
-    Returns:
-        None
-    """
-    
+# Streams are written as binary, which PDF allows; reportlab's ASCII85 encoding runs in
+# pure Python without its C accelerator and takes seconds per embedded card image
+rl_config.useA85 = 0
+
+def pdf_page_size(page_size: PageSizeEnum) -> Tuple[float, float]:
+    """PDF page size in points for a page size enum."""
     # Determine page size (A4 or A3 landscape)
     # Define the page sizes for A4 and A3 (landscape)
     A4_PORTRAIT = A4  # A4 portrait
@@ -29,60 +29,124 @@ def convert_images_to_pdf(images: List[str], output_pdf: str, page_size: PageSiz
     elif page_size == PageSizeEnum.A3:
         page_width, page_height = A3_LANDSCAPE
 
-    page_width *= SCALE
-    page_height *= SCALE
-    
-    # Create a PDF canvas
+    return page_width * SCALE, page_height * SCALE
+
+
+def __edge_bled_image__(image_path: str) -> str:
+    """Copy of a card with its edge pixels replicated into the bleed, at the card's own resolution."""
+    key_data = json.dumps([get_hash_index().get(image_path, "file"), BLEED, CARD_WIDTH])
+    output_path = os.path.join(CACHE_DIR, "bleed", f"{hashlib.sha256(key_data.encode('utf-8')).hexdigest()[:32]}.png")
+    if os.path.exists(output_path):
+        return output_path
+
+    with Image.open(image_path) as img:
+        bleed = round(BLEED * img.width / CARD_WIDTH)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    save_image(prepare_card_array(image_path, bleed=bleed, bleed_mode="edge"), output_path)
+    return output_path
+
+
+def render_deck_to_pdf(pages: Iterable[List[str]], layout: PageLayout, output_pdf: str, page_size: PageSizeEnum,
+                       bleed_mode: str = BLEED_MODE):
+    """
+    Renders pages of card images straight into a PDF, without rasterizing whole pages.
+    Args:
+        pages (iterable): For each page, the image paths of its cards in slot order.
+            Pages are drawn as the iterable yields them, so it may wait for images still being prepared.
+        layout (PageLayout): Card grid computed for the page size, in pixels.
+        output_pdf (str): File path for the output PDF.
+        page_size (PageSizeEnum): Page size for the PDF.
+        bleed_mode (str): "flat" or "edge", see BLEED_MODE.
+    Returns:
+        None
+
+    Each unique image is embedded once as an image XObject (reportlab keys
+    XObjects by file name) and every copy is placed by reference. A flat
+    bleed is a filled rectangle in the card's border colour; an edge bleed
+    embeds a cached copy of the card with its edge pixels replicated. Cut
+    lines are vector paths.
+    """
+    page_width, page_height = pdf_page_size(page_size)
+
+    # Same fit-and-center mapping convert_images_to_pdf applies to a rendered page
+    scale = min(page_width / layout.page_width, page_height / layout.page_height)
+    x_offset = (page_width - layout.page_width * scale) / 2
+    y_offset = (page_height - layout.page_height * scale) / 2
+
+    def to_pdf(x: float, y: float) -> Tuple[float, float]:
+        return x_offset + x * scale, y_offset + (layout.page_height - y) * scale
+
+    tile_width, tile_height = (CARD_WIDTH + BLEED * 2) * scale, (CARD_HEIGHT + BLEED * 2) * scale
+    border_colors: Dict[str, tuple] = {}
+    bled_images: Dict[str, str] = {}
+    metrics = get_metrics()
+
+    images_placed = 0
     c = canvas.Canvas(output_pdf, pagesize=(page_width, page_height))
+    for image_paths in pages:
+        images_placed += len(image_paths)
+        with metrics.timed("pdf.page"):
+            for i, image_path in enumerate(image_paths):
+                if bleed_mode == "edge":
+                    if image_path not in bled_images:
+                        bled_images[image_path] = __edge_bled_image__(image_path)
+                    x, y = to_pdf(*slot_position(i, layout))
+                    c.drawImage(bled_images[image_path], x, y - tile_height, width=tile_width, height=tile_height)
+                    continue
+
+                if image_path not in border_colors:
+                    with Image.open(image_path) as img:
+                        border_colors[image_path] = card_border_color(img)
+
+                x, y = to_pdf(*slot_position(i, layout))
+                c.setFillColorRGB(*(channel / 255 for channel in border_colors[image_path]))
+                c.rect(x, y - tile_height, tile_width, tile_height, stroke=0, fill=1)
+                c.drawImage(image_path, x + BLEED * scale, y - tile_height + BLEED * scale,
+                            width=CARD_WIDTH * scale, height=CARD_HEIGHT * scale)
+
+            c.setStrokeColor(CUTLINE_COLOR)
+            c.setLineWidth(CUTLINE_WIDTH * scale)
+            for x1, y1, x2, y2 in cut_line_segments(layout):
+                c.line(*to_pdf(x1, y1), *to_pdf(x2, y2))
+            c.showPage()
+
+    with metrics.timed("pdf.save"):
+        c.save()
+    metrics.count("pdf.images_placed", images_placed)
+    metrics.count("pdf.images_embedded", len(bled_images) + len(border_colors))
+    metrics.count("pdf.bytes", os.path.getsize(output_pdf))
+    print(f"PDF created: {output_pdf}")
+
+
+def convert_images_to_pdf(images: List[str], output_pdf: str, page_size: PageSizeEnum):
+    """
+    Converts a list of images to a PDF file with specified page size.
+    Args:
+        images (list): List of file paths to the images to be converted.
+        output_pdf (str): File path for the output PDF.
+        page_size (str): Page size for the PDF. Supported values are "A4" and "A3".
+    Returns:
+        None
+
+    Each image is scaled to fit its page and centered. PNG and JPEG pages are
+    embedded with their encoded bytes as they are, see PdfWriter; WebP pages are
+    decoded once. An image that cannot be read is reported and left out.
+    """
+    page_width, page_height = pdf_page_size(page_size)
+    metrics = get_metrics()
+
+    embedded = 0
+    with PdfWriter(output_pdf, page_width, page_height) as pdf:
+        for image_path in images:
+            try:
+                with metrics.timed("pdf.page"):
+                    copied = pdf.add_image_page(image_path)
+                metrics.count("pdf.images_copied" if copied else "pdf.images_reencoded")
+                embedded += 1
+            except Exception as e:
+                print(f"Error processing image {image_path}: {e}")
 
-    for image_path in images:
-        try:
-            # Open the PNG image
-            img = Image.open(image_path)
-            img_width, img_height = img.size
-
-            # Scale the image to fit the page while maintaining aspect ratio
-            # Calculate scaling factors
-            scale_width = page_width / img_width 
-            scale_height = page_height / img_height 
-            scale = min(scale_width, scale_height)
-            
-            # New dimensions for the image
-            new_width = img_width * scale
-            new_height = img_height * scale
-
-            # Center the image on the page
-            x_offset = (page_width - new_width) / 2
-            y_offset = (page_height - new_height) / 2
-
-            # Draw the image on the canvas
-            c.drawImage(image_path, x_offset, y_offset, width=new_width, height=new_height, preserveAspectRatio=True)
-            #c.drawImage(image_path, x_offset, y_offset, page_width - x_offset, page_height - x_offset, preserveAspectRatio=True)
-            c.showPage()  # Add a new page
-
-        except Exception as e:
-            print(f"Error processing image {image_path}: {e}")
-
-    # Add card list if it exists        
-    # card_list_path = os.path.join(OUTPUT_DIR, CARD_LIST_OUTPUT)  # Use os.path.join for clarity
-    # if card_list_path and os.path.exists(card_list_path):
-    #     try:
-    #         with open(card_list_path, "r") as f:
-    #             card_list_text = f.read()
-            
-    #         c.setFont("Helvetica", 10)
-    #         text_margin = 40  # Margin for text placement
-    #         text_y = page_height - text_margin
-            
-    #         for line in card_list_text.splitlines():
-    #             c.drawString(text_margin, text_y, line)
-    #             text_y -= 12  # Move to the next line
-            
-    #         c.showPage()  # Add a page for the card list
-    #     except Exception as e:
-    #         print(f"Error adding card list to PDF: {e}")
-
-    # Save the PDF
-    c.save()
+    metrics.count("pdf.images_embedded", embedded)
+    metrics.count("pdf.bytes", os.path.getsize(output_pdf))
     print(f"PDF created: {output_pdf}")        
     
\ No newline at end of file
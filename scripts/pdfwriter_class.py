@@ -0,0 +1,190 @@
+import os
+import struct
+import threading
+import zlib
+from typing import BinaryIO, Callable, List, Tuple
+import numpy as np
+from PIL import Image
+from scripts.constants import PNG_COMPRESS_LEVEL
+from scripts.pngwriter_class import FILTER_ROWS, PNG_SIGNATURE, filter_rows
+
+COPY_BYTES = 1024 * 1024
+# PNG colour types PDF's PNG predictor reads as they are, by number of colour components
+PNG_COLORS = {0: 1, 2: 3}
+COLOR_SPACES = {1: "/DeviceGray", 3: "/DeviceRGB"}
+
+
+class PdfWriter:
+    """Writes a PDF of full-page images, copying their encoded bytes into it where PDF can hold them as they are.
+
+    PNG pages keep their deflated rows, which PDF reads through its PNG
+    predictor, and JPEG pages their DCT data, so neither is decoded or
+    compressed again. Formats PDF has no filter for, WebP among them, are
+    decoded and deflated once. Images stream from disk into the file, which
+    only appears at path once it is complete.
+    """
+
+    def __init__(self, path: str, page_width: float, page_height: float):
+        self.path = path
+        self.page_width = page_width
+        self.page_height = page_height
+        # Byte offset of every object, object n at index n - 1; the page tree (object 2) is written last
+        self.offsets: List[int] = [0, 0]
+        self.page_ids: List[int] = []
+        self.tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp.pdf"
+        self.file = open(self.tmp_path, "wb")
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self.__write_object__(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+    def add_image_page(self, image_path: str) -> bool:
+        """Add a page holding the image, scaled to fit and centered. Returns whether its bytes were copied as they are.
+
+        An image that cannot be read raises before anything is written, and a
+        failed copy is rolled back, so the document stays valid either way.
+        """
+        width, height, entries, length, write_data, copied = __image_stream__(image_path)
+        scale = min(self.page_width / width, self.page_height / height)
+        x_offset = (self.page_width - width * scale) / 2
+        y_offset = (self.page_height - height * scale) / 2
+
+        start, object_count = self.file.tell(), len(self.offsets)
+        try:
+            image_id = self.__new_object__()
+            self.file.write(f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} {entries} "
+                            f"/Length {length} >>\nstream\n".encode())
+            write_data(self.file)
+            self.file.write(b"\nendstream\nendobj\n")
+
+            content = f"q {width * scale:.4f} 0 0 {height * scale:.4f} {x_offset:.4f} {y_offset:.4f} cm /Im0 Do Q".encode()
+            content_id = self.__new_object__()
+            self.file.write(f"<< /Length {len(content)} >>\nstream\n".encode() + content + b"\nendstream\nendobj\n")
+
+            page_id = self.__new_object__()
+            self.file.write(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.page_width:.4f} {self.page_height:.4f}] "
+                            f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>\nendobj\n".encode())
+        except BaseException:
+            self.file.seek(start)
+            self.file.truncate()
+            del self.offsets[object_count:]
+            raise
+        self.page_ids.append(page_id)
+        return copied
+
+    def close(self):
+        if self.file.closed:
+            return
+        kids = " ".join(f"{page_id} 0 R" for page_id in self.page_ids)
+        self.__write_object__(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>".encode())
+
+        xref_offset = self.file.tell()
+        self.file.write(f"xref\n0 {len(self.offsets) + 1}\n0000000000 65535 f \n".encode())
+        self.file.write("".join(f"{offset:010d} 00000 n \n" for offset in self.offsets).encode())
+        self.file.write(f"trailer\n<< /Size {len(self.offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __new_object__(self) -> int:
+        self.offsets.append(self.file.tell())
+        self.file.write(f"{len(self.offsets)} 0 obj\n".encode())
+        return len(self.offsets)
+
+    def __write_object__(self, object_id: int, body: bytes):
+        self.offsets[object_id - 1] = self.file.tell()
+        self.file.write(f"{object_id} 0 obj\n".encode() + body + b"\nendobj\n")
+
+    def __enter__(self) -> "PdfWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def __predictor_entries__(width: int, colors: int) -> str:
+    return (f"/ColorSpace {COLOR_SPACES[colors]} /BitsPerComponent 8 /Filter /FlateDecode "
+            f"/DecodeParms << /Predictor 15 /Colors {colors} /BitsPerComponent 8 /Columns {width} >>")
+
+
+def __copy_spans__(path: str, spans: List[Tuple[int, int]]) -> Callable[[BinaryIO], None]:
+    def write_data(target: BinaryIO):
+        with open(path, "rb") as f:
+            for offset, length in spans:
+                f.seek(offset)
+                while length:
+                    data = f.read(min(length, COPY_BYTES))
+                    if not data:
+                        raise EOFError(f"{path} ended early")
+                    target.write(data)
+                    length -= len(data)
+    return write_data
+
+
+def __png_idat_spans__(path: str):
+    """Width, height, colour components and (offset, length) of every IDAT chunk of a PNG PDF can read as it is, else None."""
+    spans, header = [], None
+    with open(path, "rb") as f:
+        if f.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+            return None
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                return None
+            length, chunk_type = struct.unpack(">I4s", chunk_header)
+            if chunk_type == b"IHDR":
+                header = struct.unpack(">IIBBBBB", f.read(13))
+                f.seek(length - 13 + 4, os.SEEK_CUR)
+            elif chunk_type == b"IDAT":
+                spans.append((f.tell(), length))
+                f.seek(length + 4, os.SEEK_CUR)
+            elif chunk_type == b"IEND":
+                break
+            elif chunk_type in (b"tRNS", b"PLTE"):
+                # Transparency or a palette need more than a plain image XObject
+                return None
+            else:
+                f.seek(length + 4, os.SEEK_CUR)
+
+    if header is None or not spans:
+        return None
+    width, height, bit_depth, color_type, _, _, interlace = header
+    if bit_depth != 8 or color_type not in PNG_COLORS or interlace:
+        return None
+    return width, height, PNG_COLORS[color_type], spans
+
+
+def __image_stream__(image_path: str) -> Tuple[int, int, str, int, Callable[[BinaryIO], None], bool]:
+    """Width, height, stream dictionary entries, stream length and a function writing the stream of an image XObject.
+
+    The last value is whether the file's own encoded bytes are copied.
+    """
+    png = __png_idat_spans__(image_path)
+    if png:
+        width, height, colors, spans = png
+        return width, height, __predictor_entries__(width, colors), sum(length for _, length in spans), \
+            __copy_spans__(image_path, spans), True
+
+    with Image.open(image_path) as img:
+        if img.format == "JPEG" and img.mode in ("RGB", "L"):
+            colors = 3 if img.mode == "RGB" else 1
+            return img.width, img.height, f"/ColorSpace {COLOR_SPACES[colors]} /BitsPerComponent 8 /Filter /DCTDecode", \
+                os.path.getsize(image_path), __copy_spans__(image_path, [(0, os.path.getsize(image_path))]), True
+
+        # No PDF filter reads this format; decode it once and deflate it like a PNG
+        rows = np.asarray(img.convert("RGB")).reshape(img.height, -1)
+        compressor = zlib.compressobj(PNG_COMPRESS_LEVEL)
+        previous, data = np.zeros(rows.shape[1], dtype=np.uint8), []
+        for start in range(0, rows.shape[0], FILTER_ROWS):
+            chunk = rows[start:start + FILTER_ROWS]
+            data.append(compressor.compress(filter_rows(chunk, previous).tobytes()))
+            previous = chunk[-1]
+        data.append(compressor.flush())
+        data = b"".join(data)
+        return img.width, img.height, __predictor_entries__(img.width, 3), len(data), \
+            lambda target: target.write(data), False
@@ -0,0 +1,200 @@
+import os
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+import numpy as np
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Rows filtered per step; keeps the filter temporaries a few MB even on A3 pages
+FILTER_ROWS = 16
+# Deflate window; a band of rows is compressed with the bytes just before it as its dictionary
+WINDOW_SIZE = 32 * 1024
+# Fewest rows a thread deflates on its own; smaller bands lose more matches than they gain in speed
+BAND_ROWS = 4 * FILTER_ROWS
+ADLER_BASE = 65521
+# Bytes of numpy temporaries filter_rows holds at its peak per byte of the rows it filters, measured with tracemalloc
+FILTER_BYTES_PER_BYTE = 20
+# A compressor's deflate state at the default memLevel (window, hash chains, pending output) and its dictionary
+DEFLATE_STATE_BYTES = 384 * 1024
+
+
+def png_writer_memory(width: int, threads: int = 1) -> int:
+    """Bytes a PngWriter of that width holds besides its strips: each thread's filter temporaries and compressor."""
+    return max(1, threads) * (width * 3 * FILTER_ROWS * FILTER_BYTES_PER_BYTE + DEFLATE_STATE_BYTES)
+
+
+def png_writer_row_memory(width: int, threads: int = 1) -> int:
+    """Bytes a PngWriter holds per row of the strip being written; with threads, the deflated bands wait for each other.
+
+    Bands are joined once deflated, so each may be held twice, and deflate does not shrink noisy rows.
+    """
+    return width * 3 * 2 if threads > 1 else 0
+
+
+def __chunk__(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+
+def filter_rows(rows: np.ndarray, previous: np.ndarray) -> np.ndarray:
+    """PNG-filter rows of RGB bytes, picking per row the filter with the smallest sum of absolute values.
+
+    rows is (height, width * 3) uint8 and previous the row above the first one.
+    Returns (height, 1 + width * 3) uint8 with the filter type byte in front of every row.
+    """
+    # uint8 arithmetic wraps modulo 256, which is exactly how PNG filters subtract
+    up = np.vstack([previous[None, :], rows[:-1]])
+    left = np.zeros_like(rows)
+    left[:, 3:] = rows[:, :-3]
+    up_left = np.zeros_like(rows)
+    up_left[:, 3:] = up[:, :-3]
+
+    a, b, c = left.astype(np.int16), up.astype(np.int16), up_left.astype(np.int16)
+    pa, pb, pc = np.abs(b - c), np.abs(a - c), np.abs(a + b - 2 * c)
+    paeth = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, up, up_left))
+    del a, b, c, pa, pb, pc
+
+    candidates = [rows, rows - left, rows - up, rows - ((left.astype(np.uint16) + up) >> 1).astype(np.uint8), rows - paeth]
+    # Same heuristic as libpng and Pillow: bytes read as signed, smallest total magnitude wins
+    costs = np.stack([np.minimum(candidate, -candidate).sum(axis=1, dtype=np.uint32) for candidate in candidates])
+    best = costs.argmin(axis=0)
+
+    filtered = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+    filtered[:, 0] = best
+    for row, filter_type in enumerate(best):
+        filtered[row, 1:] = candidates[filter_type][row]
+    return filtered
+
+
+def adler32_combine(first: int, second: int, second_length: int) -> int:
+    """Adler-32 of two byte strings one after the other, from the checksum of each."""
+    low = ((first & 0xffff) + (second & 0xffff) - 1) % ADLER_BASE
+    high = ((first >> 16) + (second >> 16) + second_length * ((first & 0xffff) - 1)) % ADLER_BASE
+    return (high << 16) | low
+
+
+def __deflate_band__(rows: np.ndarray, start: int, stop: int, previous: np.ndarray, tail: bytes, compress_level: int,
+                     emit: Optional[Callable[[bytes], None]] = None) -> Tuple[bytes, int, int, bytes]:
+    """Filter and raw-deflate rows[start:stop], ending on a byte boundary so bands can be joined.
+
+    previous and tail are the row and the filtered bytes before rows[0]. The
+    filtered bytes just before the band are the compressor's dictionary, so
+    splitting a strip into bands barely costs any compression. Returns the
+    deflated bytes, unless they were handed to emit as they came, the Adler-32
+    and length of the filtered bytes and the last WINDOW_SIZE of them.
+    """
+    # Filtering only looks one row up, so the few rows before the band filter the same here as in their own band
+    context_start = max(0, start - -(-WINDOW_SIZE // (rows.shape[1] + 1)))
+    if context_start < start:
+        context_previous = rows[context_start - 1] if context_start else previous
+        context = filter_rows(rows[context_start:start], context_previous).tobytes()
+        tail = (tail + context if not context_start else context)[-WINDOW_SIZE:]
+
+    # Z_FILTERED suits PNG-filtered rows, as in libpng
+    options = (compress_level, zlib.DEFLATED, -15, zlib.DEF_MEM_LEVEL, zlib.Z_FILTERED)
+    compressor = zlib.compressobj(*options, tail) if tail else zlib.compressobj(*options)
+    data, adler, length = [], 1, 0
+    emit = emit or data.append
+    previous = rows[start - 1] if start else previous
+    for step in range(start, stop, FILTER_ROWS):
+        chunk = rows[step:min(step + FILTER_ROWS, stop)]
+        filtered = filter_rows(chunk, previous).tobytes()
+        emit(compressor.compress(filtered))
+        adler, length = zlib.adler32(filtered, adler), length + len(filtered)
+        tail = (tail + filtered)[-WINDOW_SIZE:]
+        previous = chunk[-1]
+    emit(compressor.flush(zlib.Z_SYNC_FLUSH))
+    return b"".join(data), adler, length, tail
+
+
+class PngWriter:
+    """Writes an RGB PNG strip by strip, so the whole image never has to be held in memory.
+
+    Strips are filtered and deflated as they arrive and the file only appears
+    at path once every row has been written. With threads > 1, a strip is cut
+    into bands deflated side by side, each primed with the bytes before it,
+    and the bands are joined into one zlib stream.
+    """
+
+    def __init__(self, path: str, width: int, height: int, compress_level: int = 6, threads: int = 1):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.compress_level = compress_level
+        self.rows_written = 0
+        self.previous = np.zeros(width * 3, dtype=np.uint8)
+        self.tail = b""
+        self.adler = 1
+        self.threads = max(1, threads)
+        self.pool: Optional[ThreadPoolExecutor] = ThreadPoolExecutor(self.threads) if self.threads > 1 else None
+        self.tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp.png"
+        self.file = open(self.tmp_path, "wb")
+        self.file.write(PNG_SIGNATURE)
+        self.file.write(__chunk__(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        # zlib header, with the same level bits zlib.compress would write; the bands' raw deflate data follows it
+        self.__write_idat__(zlib.compress(b"", compress_level)[:2])
+
+    def write(self, strip: np.ndarray):
+        """Append (rows, width, 3) uint8 RGB rows."""
+        if strip.shape[1:] != (self.width, 3):
+            raise ValueError(f"Expected strips of shape (rows, {self.width}, 3), got {strip.shape}")
+        if self.rows_written + strip.shape[0] > self.height:
+            raise ValueError(f"More than {self.height} rows written to {self.path}")
+
+        rows = strip.reshape(strip.shape[0], -1)
+        if not rows.shape[0]:
+            return
+        band_rows = max(BAND_ROWS, -(-rows.shape[0] // self.threads))
+        bands = [(rows, start, min(start + band_rows, rows.shape[0]), self.previous, self.tail, self.compress_level)
+                 for start in range(0, rows.shape[0], band_rows)]
+        if self.pool and len(bands) > 1:
+            results = list(self.pool.map(lambda band: __deflate_band__(*band), bands))
+        else:
+            # One band at a time goes straight to the file, so nothing is held back
+            results = [__deflate_band__(*band, emit=self.__write_idat__) for band in bands]
+
+        for data, adler, length, _ in results:
+            self.__write_idat__(data)
+            self.adler = adler32_combine(self.adler, adler, length)
+        self.tail = results[-1][3]
+        self.previous = rows[-1].copy()
+        self.rows_written += strip.shape[0]
+
+    def close(self):
+        if self.file.closed:
+            return
+        if self.rows_written != self.height:
+            self.abort()
+            raise ValueError(f"{self.rows_written} of {self.height} rows written to {self.path}")
+        # An empty final block, then the Adler-32 of every filtered byte
+        final_block = zlib.compressobj(self.compress_level, zlib.DEFLATED, -15).flush()
+        self.file.write(__chunk__(b"IDAT", final_block + struct.pack(">I", self.adler)))
+        self.file.write(__chunk__(b"IEND", b""))
+        self.file.close()
+        self.__shutdown__()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self.__shutdown__()
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __write_idat__(self, data: bytes):
+        if data:
+            self.file.write(__chunk__(b"IDAT", data))
+
+    def __shutdown__(self):
+        if self.pool:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __enter__(self) -> "PngWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
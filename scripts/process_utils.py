@@ -0,0 +1,26 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Imported once by the fork server, so every worker forked from it starts with them loaded
+FORKSERVER_PRELOAD = ["numpy", "PIL.Image"]
+
+
+def process_context() -> multiprocessing.context.BaseContext:
+    """Start method for pool workers that never forks this process.
+
+    Pools are started while download, prepare and daemon job threads are
+    running. A forked child inherits every lock one of them held at that moment
+    (stdout, the metrics registry) and can hang on it for good. Workers are
+    forked from a clean fork server where the platform has one and spawned
+    elsewhere, e.g. on Windows.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(FORKSERVER_PRELOAD)
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def process_pool(max_workers: int, **kwargs) -> ProcessPoolExecutor:
+    """A ProcessPoolExecutor whose workers are started with process_context()."""
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=process_context(), **kwargs)
@@ -0,0 +1,278 @@
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Hashable, List, NamedTuple, Optional, Tuple
+import numpy as np
+from PIL import Image, ImageDraw
+from scripts.constants import BLEED, CARD_HEIGHT, CARD_SPACING, CARD_WIDTH, COLLAGE_COLOR, PAGE_SIZES_DPI
+from scripts.encode_utils import PageEncoder
+from scripts.metrics_utils import collect_metrics, get_metrics
+from scripts.pagesizeenum_class import PageSizeEnum
+from scripts.process_utils import process_pool
+from scripts.pngwriter_class import PngWriter, png_writer_memory, png_writer_row_memory
+
+CUTLINE_COLOR = "red"
+CUTLINE_WIDTH = 3
+CUTLINE_OFFSET = 100
+# Peak RSS strip rendering grows by beyond the buffers it accounts for (allocator slack, the encoded
+# file and decoder state of the tile being read), measured with benchmarks.bench_page_memory
+PAGE_MEMORY_HEADROOM = 8 * 1024 * 1024
+
+
+class PageLayout(NamedTuple):
+    """Card grid of a page, in pixels at DPI."""
+    page_width: int
+    page_height: int
+    cards_per_row: int
+    rows_per_page: int
+    cards_per_page: int
+    total_cards_width: int
+    total_cards_height: int
+    offset_x: int
+    offset_y: int
+
+
+def compute_page_layout(page_size: PageSizeEnum) -> PageLayout:
+    """Compute how many cards fit on a page and where the centered grid starts."""
+    page_dims = PAGE_SIZES_DPI[page_size]
+    page_width, page_height = page_dims["width"], page_dims["height"]
+
+    # Calculate layout dimensions
+    cards_per_row = (page_width) // (CARD_WIDTH + (BLEED * 2) + CARD_SPACING)
+    rows_per_page = (page_height) // (CARD_HEIGHT + (BLEED * 2) + CARD_SPACING)
+    cards_per_page = int(cards_per_row * rows_per_page)
+
+    # Calculate offset to center cards
+    total_cards_width = cards_per_row * (CARD_WIDTH + (BLEED * 2)) + (cards_per_row - 1) * CARD_SPACING
+    total_cards_height = rows_per_page * (CARD_HEIGHT + (BLEED * 2)) + (rows_per_page - 1) * CARD_SPACING
+
+    offset_x = (page_width - total_cards_width) // 2
+    offset_y = int((page_height - total_cards_height) // 2) # margem superior
+
+    return PageLayout(page_width, page_height, cards_per_row, rows_per_page, cards_per_page,
+                      total_cards_width, total_cards_height, offset_x, offset_y)
+
+
+def slot_position(i: int, layout: PageLayout) -> Tuple[int, int]:
+    """Top-left pixel of the i-th card slot on a page."""
+    row = i // layout.cards_per_row
+    col = i % layout.cards_per_row
+    x_pos = layout.offset_x + (col - 1 * CARD_SPACING) + col * (CARD_WIDTH + (BLEED * 2))
+    y_pos = layout.offset_y + (row - 1 * CARD_SPACING) + row * (CARD_HEIGHT + (BLEED * 2))
+    return x_pos, y_pos
+
+
+def cut_line_segments(layout: PageLayout) -> List[Tuple[int, int, int, int]]:
+    """Cut lines as (x1, y1, x2, y2) pixel segments, horizontal lines first."""
+    segments = []
+
+    # Horizontal lines
+    for row in range(layout.rows_per_page + 1):
+        y_line = layout.offset_y + row * (CARD_HEIGHT + (BLEED * 2) + CARD_SPACING) - ((CUTLINE_WIDTH + 1) // 2)
+        segments.append((layout.offset_x - CUTLINE_OFFSET, y_line - 1,
+                         layout.offset_x + layout.total_cards_width + CUTLINE_OFFSET, y_line - 1))
+
+    # Vertical lines
+    for col in range(layout.cards_per_row + 1):
+        x_line = layout.offset_x + col * (CARD_WIDTH + (BLEED * 2) + CARD_SPACING) - ((CUTLINE_WIDTH + 1) // 2)
+        segments.append((x_line, layout.offset_y - CUTLINE_OFFSET,
+                         x_line, layout.offset_y + layout.total_cards_height + CUTLINE_OFFSET))
+
+    return segments
+
+
+def draw_cut_lines(draw: ImageDraw.ImageDraw, layout: PageLayout):
+    for x1, y1, x2, y2 in cut_line_segments(layout):
+        draw.line([(x1, y1), (x2, y2)], fill=CUTLINE_COLOR, width=CUTLINE_WIDTH)
+
+
+def render_page(layout: PageLayout, tiles: List[Image.Image], output_png: str, encoder: Optional[PageEncoder] = None):
+    """Composite one page of prepared card tiles and save it with the encoder, PNG by default."""
+    collage = Image.new("RGB", (layout.page_width, layout.page_height), COLLAGE_COLOR)
+    draw_cut_lines(ImageDraw.Draw(collage), layout)
+
+    for i, tile in enumerate(tiles):
+        collage.paste(tile, slot_position(i, layout))
+
+    (encoder or PageEncoder()).save(collage, output_png)
+    print(f"Collage saved as {output_png}")
+
+
+def min_page_memory(layout: PageLayout, threads: int = 1) -> int:
+    """Smallest memory cap strip rendering can keep to.
+
+    That is one row of card tiles, the decode and resize buffers of the tile
+    being prepared (about three tiles), the filter buffers and compressor of
+    each encoder thread, see png_writer_memory, and PAGE_MEMORY_HEADROOM.
+    """
+    tile_pixels = (CARD_WIDTH + BLEED * 2) * (CARD_HEIGHT + BLEED * 2)
+    # Pillow keeps RGB pixels in 4 bytes
+    return (layout.cards_per_row * tile_pixels * 4 + 3 * tile_pixels * 3 + png_writer_memory(layout.page_width, threads)
+            + PAGE_MEMORY_HEADROOM)
+
+
+def strip_row_memory(layout: PageLayout, threads: int = 1) -> int:
+    """Bytes each row of a strip costs: 4 per pixel on the canvas, 3 in the copy handed to the encoder,
+    4 per pixel of the tile part cropped into it and what the encoder holds per row, see png_writer_row_memory.
+    """
+    return layout.page_width * 7 + (CARD_WIDTH + BLEED * 2) * 4 + png_writer_row_memory(layout.page_width, threads)
+
+
+def strip_bounds(layout: PageLayout, slot_count: int, max_bytes: int, threads: int = 1) -> List[Tuple[int, int]]:
+    """Split a page into (top, bottom) strips that fit max_bytes next to one row of card tiles, see min_page_memory.
+
+    Strips never straddle the top or bottom edge of a row of cards, so only the
+    tiles of one row are needed at a time. Each strip row costs strip_row_memory.
+    """
+    tile_height = CARD_HEIGHT + BLEED * 2
+    strip_height = max(16, (max_bytes - min_page_memory(layout, threads)) // strip_row_memory(layout, threads))
+
+    edges = {0, layout.page_height}
+    for i in range(slot_count):
+        _, y = slot_position(i, layout)
+        edges.update(edge for edge in (y, y + tile_height) if 0 < edge < layout.page_height)
+
+    bounds = []
+    edges = sorted(edges)
+    for top, bottom in zip(edges, edges[1:]):
+        bounds.extend((y, min(y + strip_height, bottom)) for y in range(top, bottom, strip_height))
+    return bounds
+
+
+def render_page_strips(layout: PageLayout, keys: List[Hashable], get_tile: Callable[[Hashable], Image.Image],
+                       output_png: str, max_bytes: int, encoder: Optional[PageEncoder] = None):
+    """Composite and encode a page strip by strip as PNG, never holding the whole canvas.
+
+    Produces the same pixels as render_page: cut lines first, then the tiles in
+    slot order. A tile is prepared when its first strip is reached and released
+    after its last one. The encoder's effort is the zlib level.
+    """
+    encoder = encoder or PageEncoder()
+    if encoder.page_format != "png":
+        raise ValueError(f"Pages rendered in strips are PNG, not {encoder.page_format}")
+    tile_height = CARD_HEIGHT + BLEED * 2
+    positions = [slot_position(i, layout) for i in range(len(keys))]
+    tiles: Dict[Hashable, Image.Image] = {}
+
+    with PngWriter(output_png, layout.page_width, layout.page_height, encoder.effort, encoder.threads) as writer:
+        for top, bottom in strip_bounds(layout, len(keys), max_bytes, encoder.threads):
+            slots = [i for i, (_, y) in enumerate(positions) if y < bottom and y + tile_height > top]
+            needed = {keys[i] for i in slots}
+            for key in [key for key in tiles if key not in needed]:
+                del tiles[key]
+            for key in needed:
+                if key not in tiles:
+                    tiles[key] = get_tile(key)
+
+            strip = Image.new("RGB", (layout.page_width, bottom - top), COLLAGE_COLOR)
+            draw = ImageDraw.Draw(strip)
+            for x1, y1, x2, y2 in cut_line_segments(layout):
+                draw.line([(x1, y1 - top), (x2, y2 - top)], fill=CUTLINE_COLOR, width=CUTLINE_WIDTH)
+            for i in slots:
+                x, y = positions[i]
+                tile = tiles[keys[i]]
+                strip.paste(tile.crop((0, max(top - y, 0), tile.width, min(bottom - y, tile.height))), (x, max(y - top, 0)))
+
+            writer.write(np.asarray(strip))
+            del strip, draw
+    print(f"Collage saved as {output_png}")
+
+
+def __render_page_strips_worker__(keys: List[Hashable], get_tile: Callable[[Hashable], Image.Image], layout: PageLayout,
+                                  output_png: str, max_bytes: int, encoder: PageEncoder) -> str:
+    render_page_strips(layout, keys, get_tile, output_png, max_bytes, encoder)
+    return output_png
+
+
+def __render_page_worker__(shm_name: str, tile_table: List[Tuple[int, int, int]], slots: List[int],
+                           layout: PageLayout, output_png: str, encoder: PageEncoder) -> str:
+    """Render a page in a pool worker from tiles held in a shared memory block, without copying them."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    buffers, tiles = [], []
+    try:
+        for slot in slots:
+            offset, width, height = tile_table[slot]
+            buffers.append(shm.buf[offset:offset + width * height * 3])
+            tiles.append(Image.frombuffer("RGB", (width, height), buffers[-1], "raw", "RGB", 0, 1))
+        render_page(layout, tiles, output_png, encoder)
+    finally:
+        # Views into the block must be released before it can be closed
+        tiles.clear()
+        for buffer in buffers:
+            buffer.release()
+        shm.close()
+    return output_png
+
+
+def __share_tiles__(tiles: List[Image.Image]) -> Tuple[shared_memory.SharedMemory, List[Tuple[int, int, int]]]:
+    """Copy tiles into one shared memory block and return it with each tile's (offset, width, height)."""
+    table, offset = [], 0
+    for tile in tiles:
+        table.append((offset, tile.width, tile.height))
+        offset += tile.width * tile.height * 3
+
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for tile, (offset, width, height) in zip(tiles, table):
+        view = np.ndarray((height, width, 3), dtype=np.uint8, buffer=shm.buf, offset=offset)
+        view[:] = np.asarray(tile.convert("RGB"))
+        del view
+    return shm, table
+
+
+def render_pages(pages: List[List[Hashable]], get_tile: Callable[[Hashable], Image.Image],
+                 layout: PageLayout, output_pngs: List[str], jobs: int = 1, max_memory: Optional[int] = None,
+                 encoder: Optional[PageEncoder] = None):
+    """Render pages, each a list of tile keys, serially or on a process pool.
+
+    With jobs > 1, pages are rendered in waves of 2 * jobs. The unique tiles of a
+    wave are placed once in shared memory and every worker reads them from there.
+
+    With max_memory, every page is composited in strips that keep to that many
+    bytes per page, see render_page_strips. Each process then prepares its own
+    tiles, so get_tile must be picklable when jobs > 1.
+
+    Pages are saved with the encoder, PNG by default; its threads are shared
+    out among the processes.
+    """
+    encoder = encoder or PageEncoder()
+    if jobs > 1:
+        encoder = encoder._replace(threads=max(1, encoder.threads // jobs))
+    if max_memory:
+        if max_memory < min_page_memory(layout, encoder.threads):
+            print(f"!WARNING: Page memory cap below the {min_page_memory(layout, encoder.threads) / 1024 ** 2:.0f} MB "
+                  f"one row of cards needs; rendering with the smallest strips")
+        if jobs <= 1:
+            for keys, output_png in zip(pages, output_pngs):
+                render_page_strips(layout, keys, get_tile, output_png, max_memory, encoder)
+            return
+        with process_pool(jobs) as executor:
+            futures = [executor.submit(collect_metrics, __render_page_strips_worker__, keys, get_tile, layout, output_png,
+                                       max_memory, encoder)
+                       for keys, output_png in zip(pages, output_pngs)]
+            for future in futures:
+                get_metrics().merge(future.result()[1])
+        return
+
+    if jobs <= 1:
+        for keys, output_png in zip(pages, output_pngs):
+            render_page(layout, [get_tile(key) for key in keys], output_png, encoder)
+        return
+
+    wave_size = 2 * jobs
+    with process_pool(jobs) as executor:
+        for wave_start in range(0, len(pages), wave_size):
+            wave = pages[wave_start:wave_start + wave_size]
+
+            slot_of: Dict[Hashable, int] = {}
+            for keys in wave:
+                for key in keys:
+                    slot_of.setdefault(key, len(slot_of))
+
+            shm, tile_table = __share_tiles__([get_tile(key) for key in slot_of])
+            try:
+                futures = [executor.submit(collect_metrics, __render_page_worker__, shm.name, tile_table,
+                                           [slot_of[key] for key in keys], layout, output_png, encoder)
+                           for keys, output_png in zip(wave, output_pngs[wave_start:wave_start + wave_size])]
+                for future in futures:
+                    get_metrics().merge(future.result()[1])
+            finally:
+                shm.close()
+                shm.unlink()
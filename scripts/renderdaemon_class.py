@@ -0,0 +1,209 @@
+import json
+import queue
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+# Finished jobs kept for the status endpoints; the oldest are dropped first
+MAX_JOBS_KEPT = 1000
+
+
+class RenderDaemon:
+    """Runs deck builds submitted over a local HTTP API, keeping the model, caches and connection pools warm.
+
+    Jobs go through a bounded queue and `workers` threads run them. Each job is a
+    deck list plus options handed to `run_job(job_id, deck_text, options, timings)`,
+    which returns the PDF paths and records the seconds spent per stage in timings.
+
+    API:
+        POST /jobs          deck list as text/plain, or JSON {"deck": "...", "options": {...}};
+                            202 with the job, or 200 once it finished when called with ?wait=1;
+                            503 when the queue is full
+        GET  /jobs          every job kept, newest first
+        GET  /jobs/<id>     one job: status, PDF paths, queue time and per-stage timings
+        GET  /status        queue depth, workers, job counts and uptime
+    """
+
+    def __init__(self,
+                 run_job: Callable[[str, str, dict, Dict[str, float]], List[str]],
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 workers: int = 1,
+                 queue_size: int = 32,
+                 info: Optional[dict] = None):
+        self.run_job = run_job
+        self.workers = workers
+        self.info = info or {}
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.jobs: "OrderedDict[str, dict]" = OrderedDict()
+        self.done_events: Dict[str, threading.Event] = {}
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.server = ThreadingHTTPServer((host, port), self.__handler__())
+        self.threads: List[threading.Thread] = []
+
+    @property
+    def address(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def submit(self, deck_text: str, options: dict) -> Optional[dict]:
+        """Queue a job and return it, or None when the queue is full."""
+        job_id = uuid.uuid4().hex[:12]
+        job = {"id": job_id, "status": "queued", "options": options, "submitted_at": time.time(),
+               "started_at": None, "finished_at": None, "queue_seconds": None, "run_seconds": None,
+               "timings": {}, "pdfs": [], "error": None}
+        with self.lock:
+            try:
+                self.queue.put_nowait((job_id, deck_text))
+            except queue.Full:
+                return None
+            self.jobs[job_id] = job
+            self.done_events[job_id] = threading.Event()
+            self.__forget_old_jobs__()
+        return dict(job)
+
+    def job(self, job_id: str) -> Optional[dict]:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job else None
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[dict]:
+        event = self.done_events.get(job_id)
+        if event:
+            event.wait(timeout)
+        return self.job(job_id)
+
+    def status(self) -> dict:
+        with self.lock:
+            counts = {state: 0 for state in ("queued", "running", "done", "failed")}
+            for job in self.jobs.values():
+                counts[job["status"]] += 1
+            return {**self.info, "uptime_seconds": round(time.time() - self.started_at, 1), "workers": self.workers,
+                    "queue_size": self.queue.maxsize, "queue_depth": self.queue.qsize(), "jobs": counts}
+
+    def __forget_old_jobs__(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job["status"] in ("done", "failed")]
+        for job_id in finished[:max(0, len(self.jobs) - MAX_JOBS_KEPT)]:
+            del self.jobs[job_id]
+            self.done_events.pop(job_id, None)
+
+    def __worker__(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            job_id, deck_text = item
+            with self.lock:
+                job = self.jobs[job_id]
+                job["status"] = "running"
+                job["started_at"] = time.time()
+                job["queue_seconds"] = round(job["started_at"] - job["submitted_at"], 3)
+                options = dict(job["options"])
+                done = self.done_events[job_id]
+            timings: Dict[str, float] = {}
+
+            try:
+                pdfs = self.run_job(job_id, deck_text, options, timings)
+                status, error = "done", None
+            except Exception as e:
+                traceback.print_exc()
+                pdfs, status, error = [], "failed", f"{type(e).__name__}: {e}"
+
+            with self.lock:
+                job.update(status=status, error=error, pdfs=pdfs, finished_at=time.time())
+                job["run_seconds"] = round(job["finished_at"] - job["started_at"], 3)
+                job["timings"] = {stage: round(seconds, 3) for stage, seconds in timings.items()}
+            done.set()
+            print(f"-INFO: Job {job_id} {status} in {job['run_seconds']}s")
+
+    def start(self) -> "RenderDaemon":
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self.__worker__, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        for _ in self.threads:
+            self.queue.put(None)
+
+    def serve_forever(self):
+        """Run until interrupted."""
+        self.start()
+        print(f"-INFO: Serving on {self.address} with {self.workers} workers")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            print("-INFO: Shutting down")
+        finally:
+            self.stop()
+
+    def __handler__(self):
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def __send_json__(self, status: int, payload, headers: Optional[dict] = None):
+                body = json.dumps(payload, indent=2).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                path = urlparse(self.path).path.rstrip("/")
+                if path == "/status":
+                    return self.__send_json__(200, daemon.status())
+                if path == "/jobs":
+                    with daemon.lock:
+                        jobs = [dict(job) for job in reversed(daemon.jobs.values())]
+                    return self.__send_json__(200, jobs)
+                if path.startswith("/jobs/"):
+                    job = daemon.job(path[len("/jobs/"):])
+                    if job:
+                        return self.__send_json__(200, job)
+                return self.__send_json__(404, {"error": "not found"})
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                if url.path.rstrip("/") != "/jobs":
+                    return self.__send_json__(404, {"error": "not found"})
+
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+                options = {}
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    try:
+                        payload = json.loads(body)
+                        body, options = payload["deck"], payload.get("options", {})
+                    except (ValueError, KeyError, TypeError):
+                        return self.__send_json__(400, {"error": 'expected {"deck": "...", "options": {...}}'})
+                if not body.strip():
+                    return self.__send_json__(400, {"error": "empty deck list"})
+
+                job = daemon.submit(body, options)
+                if job is None:
+                    return self.__send_json__(503, {"error": "queue full"}, {"Retry-After": "5"})
+
+                if parse_qs(url.query).get("wait", ["0"])[0] not in ("0", ""):
+                    return self.__send_json__(200, daemon.wait(job["id"]))
+                return self.__send_json__(202, job, {"Location": f"/jobs/{job['id']}"})
+
+        return Handler
@@ -1,7 +1,34 @@
+import os
+from typing import Dict, List, Optional
 import cv2
 import numpy as np
-from skimage.metrics import structural_similarity as ssim
-import os
+from scripts.cache_utils import get_image_scores, put_image_scores, set_image_quality_score
+from scripts.card_class import Card
+from scripts.constants import CACHE_DIR, SCORE_WORKERS
+from scripts.hash_utils import get_hash_index
+from scripts.process_utils import process_pool
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+
+def patch_std(gray: np.ndarray, patch_size: int = 32) -> np.ndarray:
+    """Standard deviation of every patch_size x patch_size patch, partial edge patches included.
+
+    Uses integral images of the values and their squares, so the cost does not
+    depend on the number of patches.
+    """
+    height, width = gray.shape
+    sums, squares = cv2.integral2(gray, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+    ys = np.append(np.arange(0, height, patch_size), height)
+    xs = np.append(np.arange(0, width, patch_size), width)
+
+    def box(table: np.ndarray) -> np.ndarray:
+        return (table[ys[1:, None], xs[None, 1:]] - table[ys[:-1, None], xs[None, 1:]]
+                - table[ys[1:, None], xs[None, :-1]] + table[ys[:-1, None], xs[None, :-1]])
+
+    counts = np.diff(ys)[:, None] * np.diff(xs)[None, :]
+    means = box(sums) / counts
+    return np.sqrt(np.maximum(box(squares) / counts - means ** 2, 0))
 
 def calculate_image_quality_score(image_path):
     """Calculates a quality score, focusing on fog and noise.
@@ -21,14 +48,7 @@ def calculate_image_quality_score(image_path):
 
         # 1. Noise Estimation (using standard deviation in different image patches)
         patch_size = 32  # Adjust patch size as needed
-        noise_scores = []
-        for y in range(0, gray.shape[0], patch_size):
-            for x in range(0, gray.shape[1], patch_size):
-                patch = gray[y:y+patch_size, x:x+patch_size]
-                noise_std = np.std(patch)
-                noise_scores.append(noise_std)
-
-        avg_noise = np.mean(noise_scores)
+        avg_noise = patch_std(gray, patch_size).mean()
         noise_score = max(0, 100 - avg_noise * 0.5) # Scale and invert
 
 
@@ -44,34 +64,67 @@ def calculate_image_quality_score(image_path):
         # Combine scores (adjust weights as needed)
         quality_score = (noise_score * 0.5 + contrast_score * 0.3 + blur_score * 0.2)
 
-        return quality_score
+        return float(quality_score)
 
     except Exception as e:
         print(f"An error occurred: {e}")
         return None
 
 
+def score_images(image_paths: List[str], workers: int = SCORE_WORKERS) -> Dict[str, Optional[float]]:
+    """Quality score of every image, computed once per image content and kept in the cache database.
 
-# # Example usage (same as before):
-# # image_path1 = "magic_cards\\cache\\Amarras_Luminosas[pt].png"  # Replace with your image path
-# # image_path2 = "magic_cards\\cache\\Adarkar Wastes[en].png"  # Replace with your image path
-# # quality1 = calculate_image_quality_score(image_path1)
-# # List all images in the directory
-# image_dir = "magic_cards\\cache"
-# image_files = [f for f in os.listdir(image_dir) if os.path.isfile(os.path.join(image_dir, f))]
-# # Create a list to store image quality scores
-# image_scores = []
-
-# # Calculate quality scores for each image and store them in the list
-# for image_file in image_files:
-#     image_path = os.path.join(image_dir, image_file)
-#     quality_score = calculate_image_quality_score(image_path)
-#     if quality_score is not None:
-#         image_scores.append((image_file, quality_score))
-
-# # Sort the list by quality score in descending order
-# image_scores.sort(key=lambda x: x[1], reverse=False)
-
-# # Print the sorted list of image quality scores
-# for image_file, quality_score in image_scores:
-#     print(f"Quality score: {quality_score:.2f} | {image_file}")
+    Images are identified by a hash of their bytes, so renamed copies are not
+    scored again. New images are scored on a process pool.
+    """
+    hash_index = get_hash_index()
+    digests = {path: hash_index.get(path, "file") for path in dict.fromkeys(image_paths)}
+    stored = get_image_scores(set(digests.values()))
+
+    # One path per unseen digest is enough
+    pending = {}
+    for path, digest in digests.items():
+        if digest not in stored:
+            pending.setdefault(digest, path)
+
+    if pending:
+        print(f"-INFO: Scoring {len(pending)} images")
+        paths = list(pending.values())
+        if workers > 1 and len(paths) > 1:
+            with process_pool(min(workers, len(paths))) as executor:
+                scores = list(executor.map(calculate_image_quality_score, paths, chunksize=4))
+        else:
+            scores = [calculate_image_quality_score(path) for path in paths]
+
+        new_scores = {digest: (path, score) for (digest, path), score in zip(pending.items(), scores)}
+        put_image_scores(new_scores)
+        stored.update({digest: score for digest, (_, score) in new_scores.items()})
+
+    return {path: stored[digest] for path, digest in digests.items()}
+
+
+def score_cards(cards: List[Card], workers: int = SCORE_WORKERS):
+    """Set image_quality_score on every card with an image and store it on its cached Scryfall response."""
+    with_images = [card for card in cards if getattr(card, "image_path", None) and os.path.exists(card.image_path)]
+    scores = score_images([card.image_path for card in with_images], workers)
+    for card in with_images:
+        score = scores[card.image_path]
+        if score is None:
+            continue
+        card.image_quality_score = score
+        if card.scryfall_url:
+            set_image_quality_score(card.scryfall_url, score)
+
+
+def score_cache_dir(cache_dir: str = CACHE_DIR, workers: int = SCORE_WORKERS) -> List[tuple]:
+    """Score every image in the cache directory and return (file name, score) pairs, worst first."""
+    if not os.path.isdir(cache_dir):
+        return []
+    image_files = [f for f in os.listdir(cache_dir)
+                   if os.path.isfile(os.path.join(cache_dir, f)) and f.lower().endswith(IMAGE_EXTENSIONS)]
+    scores = score_images([os.path.join(cache_dir, f) for f in image_files], workers)
+
+    image_scores = [(f, scores[os.path.join(cache_dir, f)]) for f in image_files]
+    image_scores = [(f, score) for f, score in image_scores if score is not None]
+    image_scores.sort(key=lambda x: x[1])
+    return image_scores
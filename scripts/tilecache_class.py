@@ -0,0 +1,49 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+from PIL import Image
+
+
+class TileCache:
+    """Memory-bounded LRU of prepared card tiles, so each unique card is prepared once per run."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.tiles = OrderedDict()
+        self.bytes_held = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def __size__(tile: Image.Image) -> int:
+        return tile.width * tile.height * len(tile.getbands())
+
+    def get(self, key: Hashable, prepare: Callable[[], Image.Image]) -> Image.Image:
+        """Return the tile for key, calling prepare() only on a miss."""
+        with self.lock:
+            tile = self.tiles.get(key)
+            if tile is not None:
+                self.tiles.move_to_end(key)
+                self.hits += 1
+                return tile
+            self.misses += 1
+
+        tile = prepare()
+        size = self.__size__(tile)
+
+        with self.lock:
+            if key not in self.tiles:
+                self.tiles[key] = tile
+                self.bytes_held += size
+            while self.bytes_held > self.max_bytes and len(self.tiles) > 1:
+                _, evicted = self.tiles.popitem(last=False)
+                self.bytes_held -= self.__size__(evicted)
+        return tile
+
+    def report(self) -> str:
+        return (f"Tile cache: {self.hits} hits, {self.misses} misses, "
+                f"{len(self.tiles)} tiles, {self.bytes_held / (1024 * 1024):.1f} MB held")
+
+    def __repr__(self):
+        return f"TileCache(max_bytes={self.max_bytes}, hits={self.hits}, misses={self.misses}, bytes_held={self.bytes_held})"
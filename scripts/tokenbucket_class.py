@@ -0,0 +1,32 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket used to keep requests under a global rate."""
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: int = 1):
+        """Block until `tokens` are available and consume them."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+
+                wait = (tokens - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+    def __repr__(self):
+        return f"TokenBucket(rate={self.rate}, capacity={self.capacity})"
@@ -0,0 +1,219 @@
+import os
+import time
+import math
+import hashlib
+import threading
+from typing import List, Optional, Tuple
+import numpy as np
+import torch
+from torch.nn import functional as F
+from basicsr.archs.rrdbnet_arch import RRDBNet
+from scripts.hash_utils import get_hash_index
+from scripts.image_utils import load_card_for_upscale, save_image
+from scripts.metrics_utils import collect_metrics, get_metrics
+from scripts.process_utils import process_pool
+from scripts.constants import (SCALE, UPSCALE_MODEL_PATH, UPSCALE_DEVICE, UPSCALE_TILE_PAD,
+                               UPSCALE_RAM_FRACTION, UPSCALE_BYTES_PER_PIXEL)
+
+
+def resolve_device(device: str = UPSCALE_DEVICE) -> torch.device:
+    """Map "auto" to CUDA when available and CPU otherwise."""
+    if device == "auto":
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    return torch.device(device)
+
+
+def available_memory(device: torch.device) -> int:
+    """Bytes of memory the model can use on the device."""
+    if device.type == "cuda":
+        free, _ = torch.cuda.mem_get_info(device)
+        return free
+
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        pass
+
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return 4 * 1024 ** 3
+
+
+def choose_tile_size(height: int, width: int, batch_size: int, device: torch.device) -> int:
+    """Pick the largest tile whose activations fit in a fraction of free memory; 0 means no tiling."""
+    budget = available_memory(device) * UPSCALE_RAM_FRACTION
+    max_pixels = budget / (UPSCALE_BYTES_PER_PIXEL * batch_size)
+    if height * width <= max_pixels:
+        return 0
+
+    tile = int(math.sqrt(max_pixels)) // 32 * 32
+    return max(tile, 64)
+
+
+def model_identity(model_path: str = UPSCALE_MODEL_PATH) -> str:
+    """Identify a weights file by name and content, without loading the model."""
+    return f"{os.path.basename(model_path)}:{get_hash_index().get(model_path, 'file')}"
+
+
+def build_model(scale: int = SCALE, model_path: str = UPSCALE_MODEL_PATH) -> torch.nn.Module:
+    """Build the Real-ESRGAN RRDBNet and load its weights."""
+    model = RRDBNet(num_in_ch=3, num_out_ch=3, num_feat=64, num_block=23, num_grow_ch=32, scale=scale)
+    weights = torch.load(model_path, map_location="cpu")
+    model.load_state_dict(weights.get("params_ema", weights.get("params", weights)), strict=True)
+    return model
+
+
+class Upscaler:
+    """Real-ESRGAN inference over batches of same-sized images, tiled to fit memory."""
+
+    def __init__(self,
+                 model: torch.nn.Module = None,
+                 scale: int = SCALE,
+                 device: str = UPSCALE_DEVICE,
+                 tile: Optional[int] = None,
+                 tile_pad: int = UPSCALE_TILE_PAD,
+                 threads: Optional[int] = None,
+                 half: bool = False,
+                 model_path: str = UPSCALE_MODEL_PATH):
+        self.device = resolve_device(device)
+        self.scale = scale
+        self.tile = tile
+        self.tile_pad = tile_pad
+        # One forward pass at a time, so threads (e.g. daemon jobs) can share the model
+        self.lock = threading.Lock()
+
+        if self.device.type == "cpu":
+            torch.set_num_threads(threads or os.cpu_count() or 1)
+
+        if model is None:
+            self.identity = model_identity(model_path)
+            model = build_model(scale, model_path)
+        else:
+            # Models built in code (e.g. for benchmarks) are identified by their weights
+            digest = hashlib.sha256()
+            for name, tensor in model.state_dict().items():
+                digest.update(name.encode("utf-8"))
+                digest.update(tensor.cpu().numpy().tobytes())
+            self.identity = f"{type(model).__name__}:{digest.hexdigest()}"
+        self.model = model.eval().to(self.device)
+        self.half = half and self.device.type == "cuda"
+        if self.half:
+            self.model = self.model.half()
+
+    def __forward__(self, batch: torch.Tensor) -> torch.Tensor:
+        with torch.no_grad():
+            return self.model(batch)
+
+    def __tiled_forward__(self, batch: torch.Tensor, tile: int) -> torch.Tensor:
+        """Run the model tile by tile over the whole batch, like RealESRGANer.tile_process."""
+        n, c, height, width = batch.shape
+        scale = self.scale
+        output = batch.new_zeros((n, c, height * scale, width * scale))
+
+        for y in range(0, height, tile):
+            for x in range(0, width, tile):
+                y_end, x_end = min(y + tile, height), min(x + tile, width)
+                y_pad, x_pad = max(y - self.tile_pad, 0), max(x - self.tile_pad, 0)
+                y_pad_end, x_pad_end = min(y_end + self.tile_pad, height), min(x_end + self.tile_pad, width)
+
+                tile_output = self.__forward__(batch[:, :, y_pad:y_pad_end, x_pad:x_pad_end])
+
+                out_y, out_x = (y - y_pad) * scale, (x - x_pad) * scale
+                output[:, :, y * scale:y_end * scale, x * scale:x_end * scale] = tile_output[
+                    :, :, out_y:out_y + (y_end - y) * scale, out_x:out_x + (x_end - x) * scale]
+
+        return output
+
+    def enhance(self, images: List[np.ndarray]) -> List[np.ndarray]:
+        """Upscale same-sized RGB uint8 images in a single forward pass (or one pass per tile)."""
+        height, width = images[0].shape[:2]
+        batch = torch.from_numpy(np.stack(images)).permute(0, 3, 1, 2).float().div_(255)
+        batch = batch.to(self.device)
+        if self.half:
+            batch = batch.half()
+
+        # RRDBNet x2/x1 unshuffles pixels, so both sides must be a multiple of 2/4
+        mod = {2: 2, 1: 4}.get(self.scale, 1)
+        pad_h, pad_w = (mod - height % mod) % mod, (mod - width % mod) % mod
+        if pad_h or pad_w:
+            batch = F.pad(batch, (0, pad_w, 0, pad_h), "reflect")
+
+        tile = self.tile if self.tile is not None else choose_tile_size(height, width, len(images), self.device)
+        with self.lock:
+            output = self.__tiled_forward__(batch, tile) if tile else self.__forward__(batch)
+        output = output[:, :, :height * self.scale, :width * self.scale]
+
+        output = output.float().clamp_(0, 1).mul_(255).round_().byte().permute(0, 2, 3, 1).cpu().numpy()
+        return list(output)
+
+
+# A card to upscale: source image path, output path and the source's (width, height)
+UpscaleJob = Tuple[str, str, Tuple[int, int]]
+
+
+def batch_by_size(jobs: List[UpscaleJob], batch_size: int) -> List[List[UpscaleJob]]:
+    """Group jobs into batches of identically sized images."""
+    by_size = {}
+    for job in jobs:
+        by_size.setdefault(job[2], []).append(job)
+    return [same_size[i:i + batch_size] for same_size in by_size.values() for i in range(0, len(same_size), batch_size)]
+
+
+def run_batches(upscaler: Upscaler, batches: List[List[UpscaleJob]]) -> int:
+    """Upscale every batch and save each result to its output path.
+
+    A batch's images are decoded when it runs, so one batch is held in memory at a time.
+    """
+    done = 0
+    for batch in batches:
+        started_at = time.perf_counter()
+        images, output_paths = [], []
+        for image_path, output_path, _ in batch:
+            img = load_card_for_upscale(image_path)
+            if img is None:
+                print(f"$Error: Unable to load image at {image_path}")
+                continue
+            images.append(img)
+            output_paths.append(output_path)
+        if not images:
+            continue
+
+        outputs = upscaler.enhance(images)
+        del images
+        for output, output_path in zip(outputs, output_paths):
+            save_image(output, output_path)
+            print(f"Upscaled image saved to: {output_path}")
+        done += len(outputs)
+        print(f"-INFO: Upscaled batch of {len(outputs)} in {time.perf_counter() - started_at:.1f}s")
+    return done
+
+
+# One model per process-pool worker, built once by the pool initializer
+__worker_upscaler__ = None
+
+
+def __init_worker__(upscaler_kwargs: dict):
+    global __worker_upscaler__
+    __worker_upscaler__ = Upscaler(**upscaler_kwargs)
+
+
+def __run_worker_batch__(batch: List[UpscaleJob]) -> int:
+    return run_batches(__worker_upscaler__, [batch])
+
+
+def run_batches_in_pool(batches: List[List[UpscaleJob]], workers: int, **upscaler_kwargs) -> int:
+    """Fan batches out to a process pool, each worker holding its own model and a share of the CPU threads.
+
+    Workers decode their own batches, so only paths are sent to them.
+    """
+    upscaler_kwargs.setdefault("threads", max(1, (os.cpu_count() or 1) // workers))
+    done = 0
+    with process_pool(workers, initializer=__init_worker__, initargs=(upscaler_kwargs,)) as executor:
+        futures = [executor.submit(collect_metrics, __run_worker_batch__, batch) for batch in batches]
+        for future in futures:
+            upscaled, recorded = future.result()
+            get_metrics().merge(recorded)
+            done += upscaled
+    return done
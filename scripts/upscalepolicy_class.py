@@ -0,0 +1,67 @@
+import threading
+from typing import Dict, Optional
+from scripts.constants import UPSCALE_POLICY, UPSCALE_MIN_QUALITY_SCORE, UPSCALE_PASSTHROUGH_WIDTH
+
+UPSCALE = "upscale"
+RESIZE = "resize"
+PASSTHROUGH = "passthrough"
+
+
+class UpscalePolicy:
+    """Chooses, per card image, between the Real-ESRGAN model, a Lanczos resize and no resampling at all.
+
+    Images already as wide as a printed card are passed through. Images whose
+    quality score reaches min_score are resized, unless Scryfall flags them as
+    low resolution. Everything else, including unscored images, is upscaled.
+    With mode "always" every image is upscaled, as before.
+
+    It also adds up the cards sent down each path over a run, which may take
+    many upscale_image calls, so the run is summed up once, see report().
+    """
+
+    MODES = ("auto", "always")
+
+    def __init__(self,
+                 mode: str = UPSCALE_POLICY,
+                 min_score: float = UPSCALE_MIN_QUALITY_SCORE,
+                 passthrough_width: int = UPSCALE_PASSTHROUGH_WIDTH):
+        self.mode = mode
+        self.min_score = min_score
+        self.passthrough_width = passthrough_width
+        self.counts: Dict[str, int] = {UPSCALE: 0, RESIZE: 0, PASSTHROUGH: 0}
+        self.cached = 0
+        self.lock = threading.Lock()
+
+    def choose(self, width: int, height: int, score: float, image_quality: str = "unknown") -> str:
+        if self.mode == "always":
+            return UPSCALE
+        if width >= self.passthrough_width:
+            return PASSTHROUGH
+        if image_quality == "lowres" or score is None or score < 0:
+            return UPSCALE
+        if score >= self.min_score:
+            return RESIZE
+        return UPSCALE
+
+    def tally(self, counts: Dict[str, int], cached: int):
+        """Add the cards one upscale_image call sent down each path, and those it found already prepared."""
+        with self.lock:
+            for path, count in counts.items():
+                self.counts[path] += count
+            self.cached += cached
+
+    def report(self, seconds_per_card: Optional[float] = None) -> Optional[str]:
+        """Summary of the run so far, pricing skipped model runs at seconds_per_card; None before any card."""
+        with self.lock:
+            counts, cached = dict(self.counts), self.cached
+        if not sum(counts.values()) and not cached:
+            return None
+
+        skipped = counts[RESIZE] + counts[PASSTHROUGH]
+        report = (f"-INFO: Upscale policy: {counts[UPSCALE]} upscaled, {counts[RESIZE]} resized, "
+                  f"{counts[PASSTHROUGH]} passed through, {cached} cached")
+        if skipped and seconds_per_card:
+            report += f"; about {skipped * seconds_per_card:.0f}s of model time avoided"
+        elif skipped:
+            report += f"; model skipped for {skipped} cards"
+        return report
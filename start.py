@@ -1,122 +1,184 @@
-import json
 import os
-import re
-import hashlib
 import argparse
-import re
-from typing import List
-import unicodedata
-import requests
-import cv2
-import os
-import torch
-import numpy as np
-from urllib.parse import urlencode
-from PIL import Image, ImageDraw
-from colorthief import ColorThief
-from reportlab.lib.pagesizes import A4, A3
-from reportlab.pdfgen import canvas
-from realesrgan.utils import RealESRGANer
-from PIL import Image
-from basicsr.archs.rrdbnet_arch import RRDBNet
+import itertools
+import threading
 import time
-from scripts.score_img import calculate_image_quality_score
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 from scripts.string_utils import sanitize_filename
-from scripts.cache_utils import get_with_cache
-from scripts.constants import BLEED, CACHE_DIR, OUTPUT_DIR, DEFAULT_PAGE_SIZE, PAGE_SIZES_DPI, CARD_WIDTH, CARD_HEIGHT, CARD_SPACING, SCALE, COLLAGE_COLOR, CARD_LIST_OUTPUT
-from scripts.image_utils import bleed_card_borders, fix_card_borders, upscale_image
-from scripts.cards_api import fetch_cards, download_images, fillUpCardPageWithRandomCards
-from scripts.pdf_utils import convert_images_to_pdf
+from scripts.constants import DAEMON_ADDRESS, DAEMON_JOBS, DAEMON_QUEUE_SIZE, BLEED, BLEED_MODE, BLEED_MODES, UPSCALE_POLICY, UPSCALE_MIN_QUALITY_SCORE, UPSCALE_PASSTHROUGH_WIDTH, CACHE_DIR, OUTPUT_DIR, DEFAULT_PAGE_SIZE, CARD_WIDTH, CARD_HEIGHT, CARD_LIST_OUTPUT, IMAGE_MIRROR_DIR, PAGE_FORMAT, PAGE_FORMATS, RENDER_JOBS, TILE_CACHE_MAX_BYTES, PAGE_MEMORY_MAX_BYTES, UPSCALE_DEVICE, UPSCALE_BATCH_SIZE, UPSCALE_WORKERS
+from scripts.cards_api import fetch_cards, download_card_image, download_images, fillUpCardPageWithRandomCards, image_sources, iter_fetch_cards
+from scripts.index_utils import ingest_bulk_data, use_card_index
 from scripts.card_class import Card
+from scripts.imagesourcechain_class import ImageSourceChain
+from scripts.metrics_utils import get_metrics, profiled
+from scripts.encode_utils import PageEncoder, page_encoder
+from scripts.deck_utils import deck_from_union, expand_deck_files, parse_deck, parse_deck_lines, unique_cards
 from scripts.pagesizeenum_class import PageSizeEnum
+from scripts.upscalepolicy_class import UpscalePolicy
+
+# Image, PDF and model backends (cv2, reportlab, torch) are imported by the stages that use them,
+# so listing a deck or ingesting bulk data starts without loading them
 
 # Ensure output directory exists
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 os.makedirs(CACHE_DIR, exist_ok=True)
 
-def generate_collages(cards: List[Card], page_size: PageSizeEnum, deck_name: str):
-    """Generate multiple PNG collages with card images for the selected page size."""
-    page_dims = PAGE_SIZES_DPI[page_size]    
-    page_width, page_height = page_dims["width"], page_dims["height"]
-
-    # Calculate layout dimensions
-    cards_per_row = (page_width) // (CARD_WIDTH + (BLEED * 2) + CARD_SPACING)
-    rows_per_page = (page_height) // (CARD_HEIGHT + (BLEED * 2) + CARD_SPACING)
-    cards_per_page = int(cards_per_row * rows_per_page)
-    png_files = []  # This will store all the generated PNG files
+def __tile_key__(image_path: str, bleed_mode: str = BLEED_MODE) -> tuple:
+    """Identify a prepared tile by its source file and the layout it is prepared for."""
+    stat = os.stat(image_path)
+    return (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size, CARD_WIDTH, CARD_HEIGHT, BLEED, bleed_mode)
+
+
+def prepare_card_tile(image_path: str, bleed_mode: str = BLEED_MODE) -> "Image.Image":
+    """Decode a card image, add the bleed and resize it to its slot on the page."""
+    from PIL import Image
+    from scripts.image_utils import prepare_card_array
+    tile = prepare_card_array(image_path, bleed=BLEED, size=(CARD_WIDTH + (BLEED * 2), CARD_HEIGHT + (BLEED * 2)),
+                              bleed_mode=bleed_mode)
+    return Image.fromarray(tile)
+
+
+def load_card_tile(key: tuple) -> "Image.Image":
+    """Prepare the tile identified by a __tile_key__."""
+    with get_metrics().timed("card.tile"):
+        return prepare_card_tile(key[0], key[-1])
+
+
+def generate_collages(cards: List[Card], page_size: PageSizeEnum, deck_name: str, jobs: int = RENDER_JOBS,
+                      png_pages: bool = False, bleed_mode: str = BLEED_MODE, output_dir: str = None,
+                      max_page_memory: Optional[int] = PAGE_MEMORY_MAX_BYTES,
+                      image_path_of: Optional[Callable[[Card], str]] = None,
+                      encoder: Optional[PageEncoder] = None) -> str:
+    """Generate the deck PDF for the selected page size and return its path.
+
+    By default cards are placed straight into the PDF; with png_pages every page is
+    first rendered as a full-resolution collage, saved with the encoder (PNG by
+    default, or lossless WebP or JPEG), and the PDF is built from those.
+    With max_page_memory, PNG pages are composited and encoded in strips that keep
+    to that many bytes per page instead of on a full canvas.
+
+    image_path_of returns a card's final image and may block until it is ready
+    (see CardStream); every page is then drawn or rendered as soon as its own
+    cards are ready, while later cards are still being prepared.
+
+    A build manifest in the output folder records the input hash of every page
+    and PDF. PNG pages whose inputs did not change are reused, and a PDF whose
+    pages did not change is not written again.
+    """
+    from scripts.manifest_utils import deck_input_hash, load_manifest, manifest_path, page_input_hash, save_manifest
+    from scripts.pdf_utils import convert_images_to_pdf, render_deck_to_pdf
+    from scripts.render_utils import compute_page_layout, render_pages
+    from scripts.tilecache_class import TileCache
+
+    metrics = get_metrics()
+    output_dir = output_dir or OUTPUT_DIR
+    layout = compute_page_layout(page_size)
+    cards_per_page = layout.cards_per_page
 
     expanded_cards: List[Card] = [card for card in cards for _ in range(card.quantity)]
 
     total_cards = len(expanded_cards)
     print(f"Total number of cards: {total_cards}")
-    
-    for page_idx in range(0, total_cards, cards_per_page):
-
-        # Calculate offset to center cards
-        total_cards_width = cards_per_row * (CARD_WIDTH + (BLEED * 2))+ (cards_per_row - 1) * CARD_SPACING
-        total_cards_height = rows_per_page * (CARD_HEIGHT + (BLEED * 2)) + (rows_per_page - 1) * CARD_SPACING
-      
-        offset_x = (page_width - total_cards_width) // 2 
-        offset_y = int((page_height - total_cards_height) // 2) # margem superior
-
-        # If MTG back is selected, set the collage background to black and remove cut lines
-        collage_color =  COLLAGE_COLOR
-        collage = Image.new("RGB", (page_width, page_height), collage_color)
-        draw = ImageDraw.Draw(collage)
-
-
-        #If MTG back is not selected, draw cut lines
-        #if not is_mtg_back:                
-        cutline_color = "red"
-        cutline_width = 3
-        cutline_offset = 100
-
-        # Draw cut Horizontal lines 
-        for row in range(rows_per_page + 1):
-            y_line = offset_y + row * (CARD_HEIGHT + (BLEED * 2) + (CARD_SPACING )) - ((cutline_width + 1) // 2)
-            draw.line([(offset_x - cutline_offset, y_line - 1), (offset_x + total_cards_width + cutline_offset , y_line - 1)], fill=cutline_color, width=cutline_width)
-
-        # Draw cut Vertical lines
-        for col in range(cards_per_row + 1):
-            x_line = offset_x + col * (CARD_WIDTH + (BLEED * 2) + CARD_SPACING ) - ((cutline_width + 1) // 2)
-            draw.line([(x_line, offset_y - cutline_offset), (x_line, offset_y + total_cards_height + cutline_offset)], fill=cutline_color, width=cutline_width)
-        # else:
-        #     margin_offset = 50
-        #     draw.rectangle(
-        #         [(offset_x - margin_offset , offset_y - margin_offset), 
-        #         (offset_x + total_cards_width + margin_offset , offset_y + total_cards_height  + margin_offset)], 
-        #         fill=(17, 14, 3),  width=150
-        #     )
-
-
-        page_cards = expanded_cards[page_idx:page_idx + cards_per_page]
-        
-        for i, card in enumerate(page_cards):
-            row = i // cards_per_row
-            col = i % cards_per_row
-            x_pos = offset_x + (col - 1 * CARD_SPACING) + col * (CARD_WIDTH  + (BLEED * 2))
-            y_pos = offset_y + (row -1 * CARD_SPACING)  + row * (CARD_HEIGHT + (BLEED * 2))
-            # # If MTG back is selected, don't draw the black background behind cards
-            # if not is_mtg_back:
-            #     # Draw black background square behind the card
-            #     draw.rectangle([x_pos, y_pos, x_pos + CARD_WIDTH, y_pos + CARD_HEIGHT], fill="black")
-
-            with Image.open(card.image_path) as img:
-                img.load()
-                img = bleed_card_borders(img, BLEED)
-                img = img.resize((CARD_WIDTH + (BLEED * 2), CARD_HEIGHT + (BLEED * 2)), Image.DEFAULT_STRATEGY)
-                collage.paste(img, (x_pos, y_pos))
-
-        output_png = os.path.join(OUTPUT_DIR, f"{deck_name}{page_idx // cards_per_page + 1}.png")
-        collage.save(output_png)
-        print(f"Collage saved as {output_png}")
-
-        # Add the PNG file to the list
-        png_files.append(output_png)
-
-    # Now, convert all PNG files to a single PDF
-    pdf_output_file = os.path.join(OUTPUT_DIR, f"{deck_name}_{page_size}.pdf")
-    convert_images_to_pdf(png_files, pdf_output_file, page_size)
+    pdf_output_file = os.path.join(output_dir, f"{deck_name}_{page_size}.pdf")
+
+    card_pages = [expanded_cards[page_idx:page_idx + cards_per_page] for page_idx in range(0, total_cards, cards_per_page)]
+    settings = {"bleed_mode": bleed_mode, "png_pages": png_pages}
+    encoder = encoder or page_encoder()
+    if png_pages:
+        if max_page_memory and encoder.page_format != "png":
+            print(f"!WARNING: Pages rendered under a memory cap are PNG; ignoring the {encoder.page_format} page format")
+            encoder = page_encoder(threads=encoder.threads)
+        settings.update(page_format=encoder.page_format, page_effort=encoder.effort)
+    page_hashes: List[str] = []
+
+    def ready_pages() -> Iterator[List[str]]:
+        """Image paths of every page, in order, each one once its cards are ready."""
+        for page_cards in card_pages:
+            image_paths = [image_path_of(card) if image_path_of else card.image_path for card in page_cards]
+            page_hashes.append(page_input_hash(image_paths, layout, page_size, settings))
+            yield image_paths
+
+    manifest_file = manifest_path(output_dir, deck_name)
+    manifest = load_manifest(manifest_file)
+    pdf_name = os.path.basename(pdf_output_file)
+
+    if not png_pages:
+        # Images are shared by every page of the document, so it is rebuilt as a whole or not at all.
+        # Pages that match the last build are only hashed; drawing starts at the first one that changed
+        previous_hashes = manifest["pdf_pages"].get(pdf_name, [])
+        image_pages = ready_pages()
+        unchanged = []
+        for image_paths in image_pages:
+            unchanged.append(image_paths)
+            if page_hashes[-1] != (previous_hashes[len(unchanged) - 1] if len(unchanged) <= len(previous_hashes) else None):
+                break
+
+        if len(page_hashes) == len(card_pages) and manifest["pdfs"].get(pdf_name) == deck_input_hash(page_hashes, settings) \
+                and os.path.exists(pdf_output_file):
+            print(f"-INFO: PDF is up to date: {pdf_output_file}")
+            metrics.count("pdf.up_to_date")
+            return pdf_output_file
+        render_deck_to_pdf(itertools.chain(unchanged, image_pages), layout, pdf_output_file, page_size, bleed_mode)
+        manifest["pdfs"][pdf_name] = deck_input_hash(page_hashes, settings)
+        manifest["pdf_pages"][pdf_name] = page_hashes
+        save_manifest(manifest_file, manifest)
+        return pdf_output_file
+
+    # Copies of a card share one decoded, bled and resized tile; strips only keep the tiles of one row of cards
+    tile_cache = TileCache(TILE_CACHE_MAX_BYTES)
+    get_tile = load_card_tile if max_page_memory else (lambda key: tile_cache.get(key, lambda: load_card_tile(key)))
+
+    page_files = [os.path.join(output_dir, f"{deck_name}{page_number + 1}{encoder.extension}")
+                  for page_number in range(len(card_pages))]
+
+    def render_wave(wave: List[Tuple[int, list]]):
+        # Pages are composited and encoded on `jobs` processes; file names and order stay the same
+        render_pages([keys for _, keys in wave], get_tile, layout, [page_files[i] for i, _ in wave], jobs, max_page_memory,
+                     encoder)
+        for i, _ in wave:
+            manifest["pages"][os.path.basename(page_files[i])] = page_hashes[i]
+
+    # Only pages whose inputs changed since the last build are rendered again. While cards are still
+    # being prepared, pages go out in waves of 2 * jobs as soon as their cards are ready
+    wave_size = 2 * max(1, jobs) if image_path_of else max(1, len(card_pages))
+    stale, wave = [], []
+    for page_number, image_paths in enumerate(ready_pages()):
+        page_file = page_files[page_number]
+        if manifest["pages"].get(os.path.basename(page_file)) == page_hashes[page_number] and os.path.exists(page_file):
+            continue
+        stale.append(page_number)
+        wave.append((page_number, [__tile_key__(image_path, bleed_mode) for image_path in image_paths]))
+        if len(wave) == wave_size:
+            render_wave(wave)
+            wave = []
+    if wave:
+        render_wave(wave)
+    print(f"-INFO: Rendered {len(stale)} of {len(card_pages)} pages; the rest are unchanged")
+    metrics.count("pages.rendered", len(stale))
+    metrics.count("pages.skipped", len(card_pages) - len(stale))
+    metrics.count("tile_cache.hit", tile_cache.hits)
+    metrics.count("tile_cache.miss", tile_cache.misses)
+
+    # Pages left over from a longer version of the deck, or saved in another format, are no longer part of it
+    current = {os.path.basename(page_file) for page_file in page_files}
+    for page_name in [name for name in manifest["pages"] if name not in current]:
+        if os.path.exists(os.path.join(output_dir, page_name)):
+            os.remove(os.path.join(output_dir, page_name))
+        del manifest["pages"][page_name]
+
+    if stale and not max_page_memory:
+        print(f"-INFO: {tile_cache.report()}")
+
+    pdf_hash = deck_input_hash(page_hashes, settings)
+    if manifest["pdfs"].get(pdf_name) == pdf_hash and os.path.exists(pdf_output_file) and not stale:
+        print(f"-INFO: PDF is up to date: {pdf_output_file}")
+        metrics.count("pdf.up_to_date")
+    else:
+        # Now, convert all page images to a single PDF
+        convert_images_to_pdf(page_files, pdf_output_file, page_size)
+        manifest["pdfs"][pdf_name] = pdf_hash
+    save_manifest(manifest_file, manifest)
+    return pdf_output_file
 
 def save_card_list(cards: List[Card], deck_name: str, output_file="card_list.txt"):
     """Save card names and quantities grouped by card types to a file."""
@@ -130,73 +192,271 @@ def save_card_list(cards: List[Card], deck_name: str, output_file="card_list.txt
 
 
 def main():
-    global OUTPUT_DIR
     parser = argparse.ArgumentParser(description="Generate printable MTG card collages.")
+    parser.add_argument("--decks", nargs="+", metavar="DECK_FILE", help="Deck files or glob patterns to build in one batch instead of card_names.txt.")
     parser.add_argument("--page-size", choices=[e.name for e in PageSizeEnum], default=DEFAULT_PAGE_SIZE, help="Page size for the collages (default: A4).")
     parser.add_argument("--download-tokens", action="store_true", help="Download tokens created by each card.")
     parser.add_argument("--list-all-deck-and-tokens", action="store_true", help="Generate a list with all deck card names and tokens.")
     parser.add_argument("--include-basic-lands", action="store_true", help="Include basic lands in the collages.")
     parser.add_argument("--complete-page-rnd-cards", action="store_true", help="Complete page size with random cards.")
+    parser.add_argument("--random-seed", type=int, help="Seed of the random cards picked by --complete-page-rnd-cards, for a repeatable fill.")
+    parser.add_argument("--ingest-bulk-data", metavar="BULK_JSON", help="Build the offline card index from a Scryfall bulk-data file and exit.")
+    parser.add_argument("--score-cache", action="store_true", help="Score the quality of every cached card image, store the scores and exit.")
+    parser.add_argument("--device", choices=["auto", "cpu", "cuda"], default=UPSCALE_DEVICE, help="Device used for upscaling (default: auto).")
+    parser.add_argument("--upscale-batch", type=int, default=UPSCALE_BATCH_SIZE, help="Same-sized cards per upscaling forward pass.")
+    parser.add_argument("--upscale-workers", type=int, default=UPSCALE_WORKERS, help="Upscaling processes, each one loading its own model.")
+    parser.add_argument("--upscale-tile", type=int, default=None, help="Upscaling tile size; sized to free memory by default, 0 disables tiling.")
+    parser.add_argument("--upscale-policy", choices=UpscalePolicy.MODES, default=UPSCALE_POLICY, help="auto: upscale only cards that need it; always: upscale every card (default: auto).")
+    parser.add_argument("--min-quality-score", type=float, default=UPSCALE_MIN_QUALITY_SCORE, help=f"Cards scoring at least this are resized instead of upscaled (default: {UPSCALE_MIN_QUALITY_SCORE}).")
+    parser.add_argument("--passthrough-width", type=int, default=UPSCALE_PASSTHROUGH_WIDTH, help=f"Cards at least this many pixels wide are used as they are (default: {UPSCALE_PASSTHROUGH_WIDTH}).")
+    parser.add_argument("--png-pages", action="store_true", help="Render full-resolution PNG pages and build the PDF from them.")
+    parser.add_argument("--jobs", type=int, default=RENDER_JOBS, help=f"Processes used to render pages (default: {RENDER_JOBS}).")
+    parser.add_argument("--max-page-memory", type=float, metavar="MB", help="Composite and encode PNG pages in strips that keep to this many MB per page instead of on a full canvas.")
+    parser.add_argument("--page-format", choices=PAGE_FORMATS, default=PAGE_FORMAT, help="Encoding of --png-pages pages: PNG, lossless WebP, or JPEG for quick proofs.")
+    parser.add_argument("--page-effort", type=int, metavar="N", help="zlib level of PNG pages (0-9, default 6), method of WebP pages (0-6, default 4) or quality of JPEG pages (1-100, default 95).")
+    parser.add_argument("--no-stream", dest="stream", action="store_false", help="Run each stage over all cards before starting the next, instead of overlapping them.")
+    parser.add_argument("--bleed-mode", choices=BLEED_MODES, default=BLEED_MODE, help="Fill the bleed with the border colour (flat) or repeat the card's edge pixels (edge).")
+    parser.add_argument("--serve", nargs="?", const=DAEMON_ADDRESS, metavar="[HOST:]PORT", help=f"Run as a daemon that builds decks posted to a local HTTP API (default address: {DAEMON_ADDRESS}).")
+    parser.add_argument("--serve-jobs", type=int, default=DAEMON_JOBS, help=f"Decks the daemon builds at the same time (default: {DAEMON_JOBS}).")
+    parser.add_argument("--queue-size", type=int, default=DAEMON_QUEUE_SIZE, help=f"Jobs the daemon queues before refusing new ones (default: {DAEMON_QUEUE_SIZE}).")
+    parser.add_argument("--image-mirror", metavar="DIR", default=IMAGE_MIRROR_DIR, help="Local directory of card images, named like Scryfall's image files or the cached images, used before downloading.")
+    parser.add_argument("--offline", action="store_true", help="Resolve cards from the offline card index only, never from the Scryfall API.")
+    parser.add_argument("--metrics", metavar="OUT_JSON", help="Write per-stage and per-card timings, cache counters, bytes downloaded and peak memory to a JSON file.")
+    parser.add_argument("--profile", nargs="?", const="profile.prof", metavar="OUT_PROF", help="Run under cProfile and tracemalloc, print the hottest functions and allocations and save the profile (default: profile.prof).")
 
     args = parser.parse_args()
     args.page_size = PageSizeEnum[args.page_size]
-    deck_name: str = time.strftime("%Y%m%d_%H%M%S")
+    args.max_page_memory = int(args.max_page_memory * 1024 * 1024) if args.max_page_memory else PAGE_MEMORY_MAX_BYTES
+    try:
+        page_encoder(args.page_format, args.page_effort)
+    except ValueError as e:
+        parser.error(str(e))
+
+    profile = {}
+    try:
+        with profiled(args.profile) as profile:
+            run(args)
+    finally:
+        # A failed run still leaves the metrics of the stages it got through
+        if args.metrics:
+            get_metrics().write(args.metrics, profile)
+
+
+def run(args: argparse.Namespace):
+    """Run the command selected on the command line."""
+    if args.ingest_bulk_data:
+        ingest_bulk_data(args.ingest_bulk_data)
+        return
 
-    # Load the card names from the file
-    input_file = "card_names.txt"
-    if not os.path.exists(input_file):
-        print(f"Input file '{input_file}' not found. Please create it and list card names, one per line.")
+    if args.score_cache:
+        from scripts.score_img import score_cache_dir
+        for image_file, quality_score in score_cache_dir():
+            print(f"Quality score: {quality_score:.2f} | {image_file}")
         return
 
-    with open(input_file, "r") as f:
-        cards: List[Card] = []
-        for line in f:
-            line = line.strip()
-            if line.startswith("#-"):
-                break
-            
-            if line.startswith("#DECK:"):
-                deck_name = sanitize_filename(line.split(":")[1].strip())
-                continue
-
-            if not line or line.startswith("#") or line.startswith("=") :
-                continue
-
-            match = re.match(r"(\d+)?\s*([^\[]+?)(?:\s*\[(.+?)\])?$", line)
-            if match:
-                name = match.group(2).strip()                
-                if (not args.include_basic_lands 
-                    and name.lower() in ["plains", "island", "swamp", "mountain", "forest"]):
-                    continue
-                
-                quantity = int(match.group(1)) if match.group(1) else 1                
-                version = match.group(3)
-                cards.append(Card(name=name, quantity=quantity, version=version))
-                continue
-
-    print("Fetching card data...")
-    fetch_cards(cards, args.download_tokens or args.list_all_deck_and_tokens)
-        
-    # save file with all card names and its quantities 
-    OUTPUT_DIR = f"{OUTPUT_DIR}\\{deck_name}"
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-    output_file = os.path.join(OUTPUT_DIR, CARD_LIST_OUTPUT)
-    save_card_list(cards, deck_name, output_file)
-
-    if not args.list_all_deck_and_tokens:
-        if args.complete_page_rnd_cards:
-            fillUpCardPageWithRandomCards(cards, args.page_size)
+    use_card_index(offline=args.offline)
+
+    if args.serve:
+        serve(args)
+        return
+
+    if args.decks:
+        deck_files = expand_deck_files(args.decks)
+        if not deck_files:
+            return
+        decks = [parse_deck(deck_file, sanitize_filename(os.path.splitext(os.path.basename(deck_file))[0]), args.include_basic_lands)
+                 for deck_file in deck_files]
+    else:
+        # Load the card names from the file
+        input_file = "card_names.txt"
+        if not os.path.exists(input_file):
+            print(f"Input file '{input_file}' not found. Please create it and list card names, one per line.")
+            return
+        decks = [parse_deck(input_file, time.strftime("%Y%m%d_%H%M%S"), args.include_basic_lands)]
+
+    build_decks(decks, args)
+
+
+# Options a daemon job may set for itself; everything else comes from the daemon's command line
+JOB_OPTIONS = ("page_size", "download_tokens", "include_basic_lands", "complete_page_rnd_cards", "png_pages",
+               "bleed_mode", "upscale_policy", "min_quality_score", "passthrough_width", "max_page_memory",
+               "random_seed", "page_format", "page_effort")
+
+
+def serve(args: argparse.Namespace):
+    """Run the render daemon with one warm upscaler shared by every job."""
+    from scripts.renderdaemon_class import RenderDaemon
+
+    upscaler = None
+    try:
+        from scripts.upscale_utils import Upscaler
+        upscaler = Upscaler(device=args.device, tile=args.upscale_tile)
+    except (ImportError, OSError) as e:
+        # Resized and passed-through cards still build, as on the command line
+        print(f"!WARNING: Upscaling model not loaded, jobs that need it will fail: {e}")
+
+    # Jobs building the same deck name share its output folder and build manifest, so they run one at a time
+    deck_locks: Dict[str, threading.Lock] = {}
+    deck_locks_lock = threading.Lock()
+
+    def run_job(job_id: str, deck_text: str, options: dict, timings: Dict[str, float]) -> List[str]:
+        unknown = set(options) - set(JOB_OPTIONS)
+        if unknown:
+            raise ValueError(f"Unknown options: {', '.join(sorted(unknown))}")
+
+        job_args = argparse.Namespace(**{**vars(args), **options})
+        if isinstance(job_args.page_size, str):
+            job_args.page_size = PageSizeEnum[job_args.page_size]
+        if options.get("max_page_memory"):
+            # In MB, like on the command line
+            job_args.max_page_memory = int(options["max_page_memory"] * 1024 * 1024)
+        deck_name, cards = parse_deck_lines(deck_text.splitlines(), f"job_{job_id}", job_args.include_basic_lands)
+        with deck_locks_lock:
+            deck_lock = deck_locks.setdefault(deck_name, threading.Lock())
+        with deck_lock:
+            return build_decks([(deck_name, cards)], job_args, upscaler, timings)
+
+    host, _, port = args.serve.rpartition(":")
+    info = {"model": upscaler.identity if upscaler else None, "device": str(upscaler.device) if upscaler else None}
+    RenderDaemon(run_job, host or "127.0.0.1", int(port), args.serve_jobs, args.queue_size, info).serve_forever()
+
+
+def __card_stream__(args: argparse.Namespace, upscaler, policy: UpscalePolicy, sources: ImageSourceChain) -> "CardStream":
+    """A CardStream that downloads, scores and upscales cards as their details come in."""
+    from scripts.cardstream_class import CardStream
+    from scripts.image_utils import upscale_image
+    from scripts.lazyupscaler_class import LazyUpscaler
+    from scripts.score_img import score_cards
+
+    if args.upscale_workers > 1 and upscaler is None:
+        print("!WARNING: --upscale-workers only applies with --no-stream; streaming upscales on one model")
+    # One model for the whole stream, loaded by the first card that needs it
+    upscaler = upscaler or LazyUpscaler(device=args.device, tile=args.upscale_tile)
+
+    def prepare(cards: List[Card]):
+        # A handful of cards at a time, so a process pool would cost more than it saves
+        score_cards(cards, workers=1)
+        upscale_image(cards, device=args.device, batch_size=args.upscale_batch, tile=args.upscale_tile,
+                      upscaler=upscaler, policy=policy)
+
+    return CardStream(lambda card: download_card_image(card, sources), prepare, batch_size=args.upscale_batch)
+
+
+def __print_upscale_report__(policy: UpscalePolicy, device: str):
+    """Sum up how the policy prepared the run's cards, once per run."""
+    from scripts.image_utils import upscale_report
+    report = upscale_report(policy, device)
+    if report:
+        print(report)
+
+
+def build_decks(decks: List[Tuple[str, List[Card]]], args: argparse.Namespace,
+                upscaler=None, timings: Optional[Dict[str, float]] = None) -> List[str]:
+    """Build every deck in one pass: cards, images and the upscaler are shared by all of them.
+
+    The union of all decks is resolved once, every unique image is downloaded and
+    upscaled once, and then each deck gets its own card list and PDF. Returns the
+    PDF paths; seconds spent in each stage are added to `timings` when given and
+    recorded, with their CPU time, in the run's metrics.
+
+    By default the stages overlap: a card's image is downloaded as soon as its
+    details resolve and upscaled as soon as it lands, and a page is drawn as soon
+    as its cards are ready. Page contents are known once every card and token has
+    resolved. With args.stream off, each stage runs over all cards before the next.
+    """
+    metrics = get_metrics()
+    with_tokens = args.download_tokens or args.list_all_deck_and_tokens
+    union, deck_keys = unique_cards(decks)
+    metrics.count("cards.unique", len(union))
+    policy = UpscalePolicy(args.upscale_policy, args.min_quality_score, args.passthrough_width)
+    sources = image_sources(args.image_mirror)
+    encoder = page_encoder(getattr(args, "page_format", PAGE_FORMAT), getattr(args, "page_effort", None))
+
+    stream = None
+    if getattr(args, "stream", True) and not args.list_all_deck_and_tokens:
+        stream = __card_stream__(args, upscaler, policy, sources).start()
+
+    try:
+        with metrics.stage("fetch", timings):
+            print(f"Fetching card data for {len(union)} unique cards in {len(decks)} decks...")
+            if stream:
+                for card in iter_fetch_cards(union, with_tokens):
+                    stream.put(card)
+            else:
+                fetch_cards(union, with_tokens)
+
+        deck_names = set()
+        built: List[Tuple[str, str, List[Card]]] = []
+        # Deck cards are copies; the stream prepares the union card each one was copied from
+        origins: Dict[int, Card] = {}
+        for (deck_name, _), keys in zip(decks, deck_keys):
+            # Two deck files may declare the same #DECK: name
+            base_name, suffix = deck_name, 2
+            while deck_name in deck_names:
+                deck_name, suffix = f"{base_name}_{suffix}", suffix + 1
+            deck_names.add(deck_name)
+
+            cards = deck_from_union(union, keys, with_tokens, origins)
+
+            # save file with all card names and its quantities 
+            deck_output_dir = os.path.join(OUTPUT_DIR, deck_name)
+            os.makedirs(deck_output_dir, exist_ok=True)
+            save_card_list(cards, deck_name, os.path.join(deck_output_dir, CARD_LIST_OUTPUT))
+            built.append((deck_name, deck_output_dir, cards))
+
+        if args.list_all_deck_and_tokens:
+            return []
 
+        if args.complete_page_rnd_cards:
+            with metrics.stage("fetch", timings):
+                for _, _, cards in built:
+                    filled = len(cards)
+                    fillUpCardPageWithRandomCards(cards, args.page_size, args.random_seed)
+                    for card in (cards[filled:] if stream else []):
+                        stream.put(card)
+
+        if stream:
+            stream.close()
+            with metrics.stage("render", timings):
+                print("Generating collages as cards get ready...")
+                pdf_files = [generate_collages(cards, args.page_size, deck_name, args.jobs, args.png_pages, args.bleed_mode,
+                                               deck_output_dir, args.max_page_memory,
+                                               lambda card: stream.wait(origins.get(id(card), card)), encoder)
+                             for deck_name, deck_output_dir, cards in built]
+            stream.join(timings)
+            __print_upscale_report__(policy, args.device)
+            print(f"-INFO: {sources.report()}")
+            return pdf_files
+    except BaseException:
+        if stream:
+            stream.stop()
+        raise
+
+    from scripts.image_utils import upscale_image
+    from scripts.score_img import score_cards
+
+    # Copies of a card across decks share one download and one upscaled image
+    all_cards = [card for _, _, cards in built for card in cards]
+
+    with metrics.stage("download", timings):
         print("Downloading images...")
-        download_images(cards)
+        download_images(all_cards, sources=sources)
+    with metrics.stage("score", timings):
+        score_cards(all_cards)
 
-        # After downloading images, scale them
+    # After downloading images, scale them
+    with metrics.stage("upscale", timings):
         print("Scaling UP images...")
-        upscale_image(cards)  # Scale all images in the cache folder
+        upscale_image(all_cards, device=args.device, batch_size=args.upscale_batch,
+                      workers=args.upscale_workers, tile=args.upscale_tile, upscaler=upscaler, policy=policy)
+    __print_upscale_report__(policy, args.device)
 
+    with metrics.stage("render", timings):
         print("Generating collages...")
-        generate_collages(cards, args.page_size, deck_name)
+        pdf_files = [generate_collages(cards, args.page_size, deck_name, args.jobs, args.png_pages, args.bleed_mode,
+                                       deck_output_dir, args.max_page_memory, encoder=encoder)
+                     for deck_name, deck_output_dir, cards in built]
+    return pdf_files
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,82 @@
+import pytest
+
+from scripts import cache_utils
+from scripts.cache_utils import get_cached, get_with_cache, put_in_cache
+
+URL = "https://api.scryfall.com/cards/named"
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+class Response:
+    def __init__(self, status_code: int, payload=None, text: str = ""):
+        self.status_code = status_code
+        self.payload = payload
+        self.text = text
+
+    def json(self):
+        if self.payload is None:
+            raise ValueError("not JSON")
+        return self.payload
+
+
+@pytest.fixture
+def clock(tmp_path, monkeypatch) -> Clock:
+    # The cache database lives in the cache folder, relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    clock = Clock()
+    monkeypatch.setattr(cache_utils, "time", clock)
+    return clock
+
+
+def card(name: str) -> dict:
+    return {"object": "card", "name": name}
+
+
+def test_entry_expires_after_its_ttl(clock):
+    put_in_cache(URL, {"fuzzy": "Sol Ring"}, 200, card("Sol Ring"), ttl=60)
+    put_in_cache(URL, {"fuzzy": "Mox Pearl"}, 200, card("Mox Pearl"), ttl=None)
+    assert get_cached(URL, {"fuzzy": "Sol Ring"}).content == card("Sol Ring")
+
+    clock.now += 61
+    assert get_cached(URL, {"fuzzy": "Sol Ring"}) is None
+    assert get_cached(URL, {"fuzzy": "Mox Pearl"}).content == card("Mox Pearl")
+
+
+def test_eviction_drops_expired_then_least_recently_used_entries(clock):
+    for name in ("Card A", "Card B", "Card C", "Card D"):
+        put_in_cache(URL, {"fuzzy": name}, 200, card(name), ttl=None if name != "Card D" else 60)
+        clock.now += 1
+    # Read after the access resolution, so the read moves Card A to the back of the line
+    clock.now += cache_utils.ACCESS_RESOLUTION_SECONDS + 1
+    assert get_cached(URL, {"fuzzy": "Card A"}) is not None
+
+    conn = cache_utils.__connect__()
+    entry_size = conn.execute("SELECT size FROM responses LIMIT 1").fetchone()[0]
+    cache_utils.__evict__(conn, max_bytes=2 * entry_size)
+
+    assert get_cached(URL, {"fuzzy": "Card B"}) is None
+    assert get_cached(URL, {"fuzzy": "Card D"}) is None
+    assert get_cached(URL, {"fuzzy": "Card A"}) is not None
+    assert get_cached(URL, {"fuzzy": "Card C"}) is not None
+
+
+@pytest.mark.parametrize("response, cached", [
+    (Response(200, card("Sol Ring")), True),
+    (Response(404, {"object": "error", "status": 404}), True),
+    (Response(429, {"object": "error", "status": 429}), False),
+    (Response(502, text="<html>Bad Gateway</html>"), False),
+])
+def test_only_definite_answers_are_cached(clock, monkeypatch, response, cached):
+    monkeypatch.setattr(cache_utils, "api_get", lambda url: response)
+    entry = get_with_cache(URL, {"fuzzy": "Sol Ring"})
+    assert entry.status_code == response.status_code
+    assert (get_cached(URL, {"fuzzy": "Sol Ring"}) is not None) == cached
+    if response.payload is None:
+        assert entry.content["details"] == response.text
@@ -0,0 +1,22 @@
+from scripts.card_class import Card
+from scripts.cards_api import card_image_path, download_images
+from scripts.imagesourcechain_class import ImageSourceChain
+
+
+def printing(collector_number: str, image_url: str) -> Card:
+    return Card("Lightning Bolt", lang="en", version="m10", collector_number=collector_number, image_url=image_url)
+
+
+def test_each_printing_has_its_own_cached_image():
+    assert card_image_path(printing("146", "https://img/146.png")) != card_image_path(printing("147", "https://img/147.png"))
+    assert card_image_path(printing("146", "https://img/146.png")) == card_image_path(printing("146", "https://mirror/146.png"))
+
+
+def test_cards_saved_to_the_same_file_are_resolved_once():
+    resolved = []
+    sources = ImageSourceChain([("test", lambda card: resolved.append(card.image_url) or card_image_path(card))])
+    cards = [printing("146", "https://img/146.png"), printing("146", "https://mirror/146.png"), printing("147", "https://img/147.png")]
+
+    download_images(cards, workers=2, sources=sources)
+    assert resolved == ["https://img/146.png", "https://img/147.png"]
+    assert [card.image_path for card in cards] == [card_image_path(cards[0])] * 2 + [card_image_path(cards[2])]
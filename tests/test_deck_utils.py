@@ -0,0 +1,25 @@
+from scripts.deck_utils import parse_deck_lines, unique_cards
+
+
+def test_set_and_collector_number_pin_a_printing():
+    deck_name, cards = parse_deck_lines(["#DECK: Burn", "4 Lightning Bolt [m10 146]", "2 Shock [m19]", "Counterspell"], "default")
+    assert deck_name == "Burn"
+    assert [(card.name, card.quantity, card.version, card.collector_number) for card in cards] == [
+        ("Lightning Bolt", 4, "m10", "146"),
+        ("Shock", 2, "m19", None),
+        ("Counterspell", 1, None, None),
+    ]
+
+
+def test_comments_basic_lands_and_end_marker_are_skipped():
+    lines = ["# Main deck", "=== Creatures", "10 Island", "1 Sol Ring", "", "#- everything below is ignored", "1 Mox Pearl"]
+    assert [card.name for card in parse_deck_lines(lines, "deck")[1]] == ["Sol Ring"]
+    assert [card.name for card in parse_deck_lines(lines, "deck", include_basic_lands=True)[1]] == ["Island", "Sol Ring"]
+
+
+def test_pinned_printings_are_separate_lookups():
+    _, first = parse_deck_lines(["1 Lightning Bolt [m10 146]", "1 Lightning Bolt [m10 147]"], "first")
+    _, second = parse_deck_lines(["2 lightning bolt [M10 146]"], "second")
+    union, deck_keys = unique_cards([("first", first), ("second", second)])
+    assert [(card.version, card.collector_number) for card in union] == [("m10", "146"), ("m10", "147")]
+    assert deck_keys == [[(0, 1), (1, 1)], [(0, 2)]]
@@ -0,0 +1,30 @@
+import json
+
+import pytest
+
+from scripts.index_utils import CardIndex, ingest_bulk_data
+
+NAMES = ("Lightning Bolt", "Lightning Blast", "Treasure", "Sol Ring", "Counterspell")
+
+
+@pytest.fixture
+def card_index(tmp_path) -> CardIndex:
+    bulk_file = tmp_path / "default_cards.json"
+    bulk_file.write_text(json.dumps([
+        {"object": "card", "id": f"id-{i}", "name": name, "lang": "en", "set": "tst", "collector_number": str(i),
+         "released_at": "2020-01-01", "type_line": "Instant", "image_uris": {"png": f"https://img/{i}.png"}}
+        for i, name in enumerate(NAMES)]))
+    index_file = str(tmp_path / "cards_index.db")
+    ingest_bulk_data(str(bulk_file), index_file)
+    return CardIndex(index_file)
+
+
+def test_fuzzy_matches_typos(card_index):
+    assert card_index.fuzzy("Lightnig Bolt")["name"] == "Lightning Bolt"
+    assert card_index.fuzzy("Counterspel")["name"] == "Counterspell"
+
+
+@pytest.mark.parametrize("name", ["Totally Not A Card", "Bolt", "Lightning B"])
+def test_fuzzy_unknown_or_ambiguous_name_is_not_found(card_index, name):
+    assert card_index.fuzzy(name) is None
+    assert card_index.lookup(f"https://api.scryfall.com/cards/named?fuzzy={name}") is None
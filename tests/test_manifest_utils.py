@@ -0,0 +1,52 @@
+import os
+
+import pytest
+from PIL import Image
+
+from scripts.manifest_utils import deck_input_hash, page_input_hash
+
+LAYOUT = (4862, 6902, 3, 3, 9, 4500, 6600, 181, 151)
+SETTINGS = {"bleed_mode": "flat", "png_pages": False}
+
+
+@pytest.fixture
+def images(tmp_path, monkeypatch):
+    # The hash index lives in the cache folder, relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    paths = []
+    for i, color in enumerate([(200, 30, 30), (30, 30, 200)]):
+        paths.append(str(tmp_path / f"card{i}.png"))
+        Image.new("RGB", (16, 16), color).save(paths[-1])
+    return paths
+
+
+def test_same_inputs_give_the_same_hash(images):
+    assert page_input_hash(images, LAYOUT, "A4", SETTINGS) == page_input_hash(list(images), LAYOUT, "A4", dict(SETTINGS))
+
+
+@pytest.mark.parametrize("change", [
+    lambda images, layout, page_size, settings: (images[::-1], layout, page_size, settings),
+    lambda images, layout, page_size, settings: (images[:1], layout, page_size, settings),
+    lambda images, layout, page_size, settings: (images, layout[:-1] + (layout[-1] + 1,), page_size, settings),
+    lambda images, layout, page_size, settings: (images, layout, "A3", settings),
+    lambda images, layout, page_size, settings: (images, layout, page_size, {**settings, "bleed_mode": "edge"}),
+], ids=["slot order", "card removed", "layout", "page size", "settings"])
+def test_any_input_change_invalidates_the_page(images, change):
+    before = page_input_hash(images, LAYOUT, "A4", SETTINGS)
+    assert page_input_hash(*change(images, LAYOUT, "A4", SETTINGS)) != before
+
+
+def test_new_card_art_invalidates_the_page(images):
+    before = page_input_hash(images, LAYOUT, "A4", SETTINGS)
+    Image.new("RGB", (16, 16), (30, 200, 30)).save(images[0])
+    # Same size; the hash index notices the rewrite by its modification time
+    stat = os.stat(images[0])
+    os.utime(images[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert page_input_hash(images, LAYOUT, "A4", SETTINGS) != before
+
+
+def test_deck_hash_follows_its_pages(images):
+    pages = [page_input_hash(images, LAYOUT, "A4", SETTINGS), page_input_hash(images[:1], LAYOUT, "A4", SETTINGS)]
+    assert deck_input_hash(pages, SETTINGS) == deck_input_hash(list(pages), SETTINGS)
+    assert deck_input_hash(pages[::-1], SETTINGS) != deck_input_hash(pages, SETTINGS)
+    assert deck_input_hash(pages[:1], SETTINGS) != deck_input_hash(pages, SETTINGS)
@@ -0,0 +1,15 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/clear_refs"), reason="peak RSS can only be measured per render on Linux")
+def test_strip_rendering_keeps_peak_rss_under_the_cap():
+    # The benchmark renders an A4 page in a fresh process and fails when peak RSS grows beyond the cap or pixels change
+    result = subprocess.run([sys.executable, "-m", "benchmarks.bench_page_memory", "--page-size", "A4", "--cap-mb", "100"],
+                            cwd=REPO_ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
@@ -0,0 +1,91 @@
+import re
+import struct
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from scripts.pdfwriter_class import PdfWriter
+
+PAGE = (595.0, 842.0)
+
+
+def card_pixels(height: int = 60, width: int = 40) -> np.ndarray:
+    y, x = np.mgrid[0:height, 0:width]
+    return np.stack([x * 6, y * 4, (x + y) * 2], axis=-1).astype(np.uint8)
+
+
+def idat_data(path: str) -> bytes:
+    """The zlib stream of a PNG, joined from its IDAT chunks."""
+    with open(path, "rb") as f:
+        data = f.read()
+    chunks, offset = [], 8
+    while offset < len(data):
+        length, chunk_type = struct.unpack(">I4s", data[offset:offset + 8])
+        if chunk_type == b"IDAT":
+            chunks.append(data[offset + 8:offset + 8 + length])
+        offset += 12 + length
+    return b"".join(chunks)
+
+
+def page_count(pdf: bytes) -> int:
+    return int(re.search(rb"/Type /Pages /Kids \[[^\]]*\] /Count (\d+)", pdf).group(1))
+
+
+def test_png_and_jpeg_bytes_are_copied_as_they_are(tmp_path):
+    png, jpeg = str(tmp_path / "page.png"), str(tmp_path / "page.jpg")
+    Image.fromarray(card_pixels()).save(png)
+    Image.fromarray(card_pixels()).save(jpeg, quality=90)
+
+    pdf_path = tmp_path / "deck.pdf"
+    with PdfWriter(str(pdf_path), *PAGE) as pdf:
+        assert pdf.add_image_page(png) is True
+        assert pdf.add_image_page(jpeg) is True
+
+    pdf = pdf_path.read_bytes()
+    assert pdf.startswith(b"%PDF-1.4")
+    assert idat_data(png) in pdf
+    assert b"/Predictor 15 /Colors 3 /BitsPerComponent 8 /Columns 40" in pdf
+    with open(jpeg, "rb") as f:
+        assert f.read() in pdf
+    assert b"/Filter /DCTDecode" in pdf
+    assert page_count(pdf) == 2
+
+
+def test_formats_pdf_cannot_hold_are_reencoded(tmp_path):
+    webp = str(tmp_path / "page.webp")
+    Image.fromarray(card_pixels()).save(webp, lossless=True)
+
+    pdf_path = tmp_path / "deck.pdf"
+    with PdfWriter(str(pdf_path), *PAGE) as pdf:
+        assert pdf.add_image_page(webp) is False
+    assert page_count(pdf_path.read_bytes()) == 1
+
+
+def test_unreadable_image_leaves_the_document_valid(tmp_path):
+    png, broken = str(tmp_path / "page.png"), tmp_path / "broken.png"
+    Image.fromarray(card_pixels()).save(png)
+    broken.write_bytes(b"not an image")
+
+    pdf_path = tmp_path / "deck.pdf"
+    with PdfWriter(str(pdf_path), *PAGE) as pdf:
+        pdf.add_image_page(png)
+        with pytest.raises(Exception):
+            pdf.add_image_page(str(broken))
+        pdf.add_image_page(png)
+
+    pdf = pdf_path.read_bytes()
+    assert page_count(pdf) == 2
+    # Every object the cross-reference table points at starts where it says
+    xref_offset = int(pdf.rsplit(b"startxref\n", 1)[1].split()[0])
+    entries = pdf[xref_offset:].split(b"\n")[3:]
+    for object_id, entry in enumerate(entries[:page_count(pdf) * 3 + 2], start=1):
+        offset = int(entry.split()[0])
+        assert pdf[offset:].startswith(f"{object_id} 0 obj".encode())
+
+
+def test_failed_document_leaves_no_file(tmp_path):
+    with pytest.raises(RuntimeError):
+        with PdfWriter(str(tmp_path / "deck.pdf"), *PAGE):
+            raise RuntimeError("render failed")
+    assert list(tmp_path.iterdir()) == []
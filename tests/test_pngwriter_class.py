@@ -0,0 +1,59 @@
+import zlib
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from scripts.pngwriter_class import BAND_ROWS, PngWriter, adler32_combine
+
+
+def page_pixels(height: int, width: int) -> np.ndarray:
+    """Gradients, flat areas and noise, so every PNG filter type gets picked somewhere."""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([x * 255 // width, y * 255 // height, (x + y) % 256], axis=-1).astype(np.uint8)
+    pixels[height // 3:height // 2] = 200
+    noisy = height // 4
+    pixels[-noisy:] = rng.integers(0, 256, (noisy, width, 3), dtype=np.uint8)
+    return pixels
+
+
+@pytest.mark.parametrize("threads", [1, 3])
+@pytest.mark.parametrize("strip_rows", [1, 50, BAND_ROWS * 3 + 7])
+def test_strips_decode_to_the_same_pixels(tmp_path, threads, strip_rows):
+    pixels = page_pixels(5 * BAND_ROWS + 11, 37)
+    path = str(tmp_path / "page.png")
+    with PngWriter(path, pixels.shape[1], pixels.shape[0], compress_level=6, threads=threads) as writer:
+        for top in range(0, pixels.shape[0], strip_rows):
+            writer.write(pixels[top:top + strip_rows])
+
+    with Image.open(path) as img:
+        assert img.mode == "RGB"
+        assert np.array_equal(np.asarray(img), pixels)
+
+
+def test_missing_rows_leave_no_file(tmp_path):
+    path = tmp_path / "page.png"
+    writer = PngWriter(str(path), 8, 4)
+    writer.write(np.zeros((3, 8, 3), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        writer.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_strip_of_the_wrong_width_is_refused(tmp_path):
+    with PngWriter(str(tmp_path / "page.png"), 8, 4) as writer:
+        with pytest.raises(ValueError):
+            writer.write(np.zeros((4, 9, 3), dtype=np.uint8))
+        writer.write(np.zeros((4, 8, 3), dtype=np.uint8))
+
+
+@pytest.mark.parametrize("first, second", [
+    (b"", b""),
+    (b"card", b""),
+    (b"", b"card"),
+    (b"lightning", b"bolt"),
+    (bytes(range(256)) * 300, bytes(reversed(range(256))) * 700),
+])
+def test_adler32_combine_matches_the_checksum_of_both(first, second):
+    assert adler32_combine(zlib.adler32(first), zlib.adler32(second), len(second)) == zlib.adler32(first + second)
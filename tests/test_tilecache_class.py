@@ -0,0 +1,48 @@
+from PIL import Image
+
+from scripts.tilecache_class import TileCache
+
+# An RGB tile of 10x10 pixels is counted as 300 bytes
+TILE_BYTES = 300
+
+
+def tile_factory(prepared: list):
+    def prepare(key: str):
+        def build() -> Image.Image:
+            prepared.append(key)
+            return Image.new("RGB", (10, 10))
+        return build
+    return prepare
+
+
+def test_each_tile_is_prepared_once():
+    prepared = []
+    prepare = tile_factory(prepared)
+    cache = TileCache(max_bytes=10 * TILE_BYTES)
+    first = cache.get("a", prepare("a"))
+    assert cache.get("a", prepare("a")) is first
+    assert prepared == ["a"]
+    assert (cache.hits, cache.misses, cache.bytes_held) == (1, 1, TILE_BYTES)
+
+
+def test_least_recently_used_tile_is_evicted():
+    prepared = []
+    prepare = tile_factory(prepared)
+    cache = TileCache(max_bytes=2 * TILE_BYTES)
+    cache.get("a", prepare("a"))
+    cache.get("b", prepare("b"))
+    cache.get("a", prepare("a"))
+    cache.get("c", prepare("c"))
+
+    assert list(cache.tiles) == ["a", "c"]
+    assert cache.bytes_held == 2 * TILE_BYTES
+    cache.get("b", prepare("b"))
+    assert prepared == ["a", "b", "c", "b"]
+
+
+def test_tile_over_the_cap_is_still_kept():
+    cache = TileCache(max_bytes=TILE_BYTES // 2)
+    cache.get("a", lambda: Image.new("RGB", (10, 10)))
+    cache.get("b", lambda: Image.new("RGB", (10, 10)))
+    assert list(cache.tiles) == ["b"]
+    assert cache.bytes_held == TILE_BYTES
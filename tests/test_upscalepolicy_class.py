@@ -0,0 +1,34 @@
+import pytest
+
+from scripts.upscalepolicy_class import PASSTHROUGH, RESIZE, UPSCALE, UpscalePolicy
+
+
+@pytest.mark.parametrize("width, score, image_quality, expected", [
+    (745, 90.0, "highres_scan", PASSTHROUGH),
+    (745, 5.0, "lowres", PASSTHROUGH),
+    (488, 90.0, "highres_scan", RESIZE),
+    (488, 50.0, "highres_scan", RESIZE),
+    (488, 49.9, "highres_scan", UPSCALE),
+    (488, 90.0, "lowres", UPSCALE),
+    (488, -1, "unknown", UPSCALE),
+    (488, None, "unknown", UPSCALE),
+])
+def test_auto_mode_picks_a_path_per_card(width, score, image_quality, expected):
+    policy = UpscalePolicy("auto", min_score=50.0, passthrough_width=700)
+    assert policy.choose(width, 680, score, image_quality) == expected
+
+
+def test_always_mode_upscales_every_card():
+    policy = UpscalePolicy("always", min_score=50.0, passthrough_width=700)
+    assert policy.choose(745, 1040, 90.0, "highres_scan") == UPSCALE
+
+
+def test_report_sums_up_every_tally():
+    policy = UpscalePolicy()
+    assert policy.report() is None
+
+    policy.tally({UPSCALE: 1, RESIZE: 2, PASSTHROUGH: 0}, cached=1)
+    policy.tally({UPSCALE: 0, RESIZE: 1, PASSTHROUGH: 3}, cached=0)
+    assert policy.report() == ("-INFO: Upscale policy: 1 upscaled, 3 resized, 3 passed through, 1 cached; "
+                               "model skipped for 6 cards")
+    assert policy.report(seconds_per_card=2.0).endswith("about 12s of model time avoided")